@@ -0,0 +1,205 @@
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+@dataclass(slots=True)
+class DjiConversion:
+    """道瓊轉換台指期貨的預測點位與各項調整"""
+    base_prediction: int
+    macd_adjustment: int
+    rsi_adjustment: int
+    seasonal_adjustment: int
+    final_prediction: int
+    confidence: float
+    historical_correlation: float
+    volatility_factor: float
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass(slots=True)
+class UsSentiment:
+    """美國期貨風氣評分與對台指的點位影響"""
+    sentiment_score: float
+    weighted_rsi: float
+    total_momentum: float
+    txf_impact: int
+    description: str
+    dji_weight: float
+    ndx_weight: float
+    soxx_weight: float
+    volatility_adjustment: float
+    historical_effectiveness: float
+
+    def to_dict(self) -> Dict:
+        return {
+            "sentiment_score": self.sentiment_score,
+            "weighted_rsi": self.weighted_rsi,
+            "total_momentum": self.total_momentum,
+            "txf_impact": self.txf_impact,
+            "description": self.description,
+            "historical_weights": {
+                "dji_weight": self.dji_weight,
+                "ndx_weight": self.ndx_weight,
+                "soxx_weight": self.soxx_weight
+            },
+            "volatility_adjustment": self.volatility_adjustment,
+            "historical_effectiveness": self.historical_effectiveness
+        }
+
+@dataclass(slots=True)
+class TxfSentiment:
+    """台指期貨風氣評分（成交量、RSI、MACD）與歷史分布位置"""
+    sentiment_score: float
+    volume_sentiment: float
+    rsi_sentiment: float
+    macd_sentiment: float
+    volume: float
+    txf_impact: int
+    description: str
+    volume_z_score: float
+    rsi_percentile: float
+    macd_z_score: float
+    effectiveness: float
+
+    def to_dict(self) -> Dict:
+        return {
+            "sentiment_score": self.sentiment_score,
+            "volume_sentiment": self.volume_sentiment,
+            "rsi_sentiment": self.rsi_sentiment,
+            "macd_sentiment": self.macd_sentiment,
+            "volume": self.volume,
+            "txf_impact": self.txf_impact,
+            "description": self.description,
+            "historical_analysis": {
+                "volume_z_score": self.volume_z_score,
+                "rsi_percentile": self.rsi_percentile,
+                "macd_z_score": self.macd_z_score,
+                "effectiveness": self.effectiveness
+            }
+        }
+
+@dataclass(slots=True)
+class PatternValidation:
+    """歷史模式驗證"""
+    predicted_move: int
+    confidence: float
+    pattern_type: str
+    historical_matches: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass(slots=True)
+class TradingRecommendation:
+    """交易建議"""
+    direction: str
+    confidence: str
+    entry_strategy: str
+    expected_move: str
+    risk_level: str
+    historical_support: str
+    historical_confidence: str
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass(slots=True)
+class PredictionSummary:
+    """畫面顯示用的預測摘要"""
+    current_price: float
+    predicted_price: float
+    prediction_lower: float
+    prediction_upper: float
+    price_difference: float
+    direction: str
+    confidence: float
+    risk_level: str
+
+@dataclass(slots=True)
+class PredictionResult:
+    """增強版預測引擎的綜合預測結果"""
+    current_price: float
+    dji: DjiConversion
+    us_sentiment: UsSentiment
+    txf_sentiment: TxfSentiment
+    historical_validation: PatternValidation
+    final_prediction: int
+    prediction_lower: int
+    prediction_upper: int
+    price_difference: int
+    recommendation: TradingRecommendation
+
+    @property
+    def confidence(self) -> float:
+        """預測信心度（道瓊轉換的信心度）"""
+        return self.dji.confidence
+
+    def summary(self) -> PredictionSummary:
+        return PredictionSummary(
+            current_price=self.current_price,
+            predicted_price=self.final_prediction,
+            prediction_lower=self.prediction_lower,
+            prediction_upper=self.prediction_upper,
+            price_difference=self.price_difference,
+            direction=self.recommendation.direction,
+            confidence=self.confidence,
+            risk_level=self.recommendation.risk_level
+        )
+
+    def to_dict(self) -> Dict:
+        """巢狀字典格式（generate_comprehensive_prediction_enhanced 的回傳格式）"""
+        return {
+            "current_price": self.current_price,
+            "dji_based_prediction": self.dji.to_dict(),
+            "us_futures_sentiment": self.us_sentiment.to_dict(),
+            "txf_sentiment": self.txf_sentiment.to_dict(),
+            "historical_validation": self.historical_validation.to_dict(),
+            "final_prediction": self.final_prediction,
+            "prediction_range": {
+                "lower": self.prediction_lower,
+                "upper": self.prediction_upper
+            },
+            "price_difference": self.price_difference,
+            "recommendation": self.recommendation.to_dict(),
+            "confidence_metrics": {
+                "historical_accuracy": self.historical_validation.confidence,
+                "correlation_strength": self.dji.historical_correlation,
+                "volatility_adjustment": self.us_sentiment.volatility_adjustment
+            }
+        }
+
+@dataclass(slots=True)
+class BacktestSummary:
+    """相似歷史情況的次日表現"""
+    similar_scenarios: int
+    average_next_day_move: float
+    success_rate: float
+    max_gain: float
+    max_loss: float
+    confidence: float
+    analysis_period: str
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+@dataclass(slots=True)
+class UltimateAnalysis:
+    """終極版策略分析結果（文字報告由 render_ultimate_report 產生）"""
+    market_data: Dict
+    prediction: PredictionResult
+    backtest: BacktestSummary
+    zone_analysis: str
+    risk_warnings: List[str]
+    strategy_summary: str
+
+    def summary(self) -> PredictionSummary:
+        return self.prediction.summary()
+
+    def to_dict(self) -> Dict:
+        return {
+            "prediction": self.prediction.to_dict(),
+            "backtest": self.backtest.to_dict(),
+            "zone_analysis": self.zone_analysis,
+            "risk_warnings": list(self.risk_warnings),
+            "strategy_summary": self.strategy_summary
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from historical_database import HistoricalDatabase
+
+# 預設的查詢執行緒數（每個執行緒各有一條讀取連線，寫入仍由單一寫入連線序列化）
+DEFAULT_MAX_WORKERS = 4
+
+# 以 async 包裝的 HistoricalDatabase 方法（名稱與同步 API 相同）
+ASYNC_METHODS = (
+    'get_historical_data',
+    'get_historical_window',
+    'get_trading_calendar',
+    'get_rolling_stats',
+    'get_aligned_history',
+    'get_intraday_bars',
+    'get_historical_arrays',
+    'get_snapshot',
+    'get_data_version',
+    'get_derived_version',
+    'get_database_stats',
+    'get_query_stats',
+    'load_indicator_state',
+    'compute_live_indicators',
+    'calculate_correlation_matrix',
+    'get_optimal_prediction_ratios',
+    'append_bars',
+    'insert_intraday_bars',
+    'bulk_insert'
+)
+
+class _PendingCall:
+    """追蹤一次查詢目前在哪條連線上執行，取消時可中斷該連線的 SQL"""
+
+    def __init__(self):
+        self.cancelled = False
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.connection is not None:
+                self.connection.interrupt()
+
+class AsyncHistoricalDatabase:
+    """HistoricalDatabase 的 async 介面：以有上限的執行緒池執行查詢，可同時 await 多個讀取
+
+    方法名稱與同步 API 相同（await db.get_historical_data(...)）。
+    await 中的工作被取消時，尚未開始的查詢直接略過，執行中的讀取以 sqlite3 interrupt 中斷；
+    寫入交易不會被中斷，會完成後才丟棄結果。
+    """
+
+    def __init__(self, db: Optional[HistoricalDatabase] = None, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.db = db or HistoricalDatabase()
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="historical-db")
+
+    def __getattr__(self, name: str):
+        if name not in ASYNC_METHODS:
+            raise AttributeError(f"{type(self).__name__} 沒有 {name} 方法")
+        method = getattr(self.db, name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self._run(method, *args, **kwargs)
+        return call
+
+    async def run(self, func, *args, **kwargs) -> Any:
+        """在查詢執行緒池執行任意以此資料庫為基礎的同步函式（例如組合多個查詢的計算）"""
+        return await self._run(func, *args, **kwargs)
+    
+    async def _run(self, method, *args, **kwargs) -> Any:
+        """在執行緒池執行同步方法，取消時中斷該執行緒的讀取連線"""
+        pending = _PendingCall()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(self._invoke, pending, method, args, kwargs))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+
+    def _invoke(self, pending: _PendingCall, method, args, kwargs) -> Any:
+        with pending.lock:
+            if pending.cancelled:
+                raise asyncio.CancelledError()
+            pending.connection = self.db._connections.reader()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            with pending.lock:
+                pending.connection = None
+
+    async def gather_history(self, requests: List[tuple]) -> Dict[tuple, Any]:
+        """同時查詢多段歷史數據，requests 為 (symbol, start_date, end_date) 串列"""
+        results = await asyncio.gather(*(self.get_historical_data(*request) for request in requests))
+        return dict(zip(requests, results))
+
+    def close(self, wait: bool = True):
+        """關閉執行緒池（取消尚未開始的查詢）"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self) -> 'AsyncHistoricalDatabase':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close(wait=False)
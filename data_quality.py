@@ -0,0 +1,162 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# 相鄰K棒收盤價變動超過此比例視為異常跳動
+MAX_PRICE_JUMP = 0.5
+
+# 驗證失敗原因（位元旗標，一筆可同時有多個原因）
+DUPLICATE = 1
+MISSING_PRICE = 2
+WEEKEND = 4
+NEGATIVE_VOLUME = 8
+PRICE_JUMP = 16
+RSI_OUT_OF_RANGE = 32
+OHLC_INCONSISTENT = 64
+# 匯入時早於已匯入最後日期、且與資料庫中已存數據不符的列（亂序或事後更正），由匯入端判定
+OUT_OF_ORDER = 128
+
+REASON_NAMES = {
+    DUPLICATE: 'duplicate',
+    MISSING_PRICE: 'missing_price',
+    WEEKEND: 'weekend',
+    NEGATIVE_VOLUME: 'negative_volume',
+    PRICE_JUMP: 'price_jump',
+    RSI_OUT_OF_RANGE: 'rsi_out_of_range',
+    OHLC_INCONSISTENT: 'ohlc_inconsistent',
+    OUT_OF_ORDER: 'out_of_order'
+}
+
+@dataclass
+class ValidationResult:
+    """批次驗證結果：通過的列索引（依鍵值排序）、被隔離的列索引與原因"""
+    accepted: np.ndarray
+    rejected: np.ndarray
+    flags: np.ndarray
+    summary: Dict = field(default_factory=dict)
+
+    def reasons(self) -> List[str]:
+        """被隔離各列的原因字串（多個原因以 | 連接）"""
+        return [describe_flags(flag) for flag in self.flags[self.rejected]]
+
+def describe_flags(flag: int) -> str:
+    return "|".join(name for bit, name in REASON_NAMES.items() if flag & bit)
+
+def _float_column(columns: Dict, name: str, length: int) -> Optional[np.ndarray]:
+    values = columns.get(name)
+    if values is None:
+        return None
+    array = np.asarray(values)
+    if array.dtype == object:
+        array = np.array([np.nan if value is None else value for value in array], dtype=float)
+    return array.astype(float, copy=False).reshape(length)
+
+def validate_bars(keys: np.ndarray, columns: Dict[str, np.ndarray], previous_close: Optional[float] = None,
+                  utc_offset_seconds: Optional[int] = None) -> ValidationResult:
+    """以向量化方式驗證一整批K棒
+
+    keys 為日線的整數日序，或盤中的 UTC epoch 秒（此時需給 utc_offset_seconds）。
+    檢查：批次內重複鍵值（保留最後一筆）、缺少或非正收盤價、週末、負成交量、
+    RSI 超出 0~100、OHLC 高低價矛盾，以及相鄰收盤價跳動超過 MAX_PRICE_JUMP。
+    跳動只標記異常的那一根（單根尖刺後回到原水準的下一根不算）。
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    count = len(keys)
+    flags = np.zeros(count, dtype=np.int64)
+    if count == 0:
+        return ValidationResult(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), flags, _summary(flags))
+
+    # 穩定排序下相同鍵值維持原順序，只保留每組最後一筆
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    duplicated = np.zeros(count, dtype=bool)
+    duplicated[:-1] = sorted_keys[:-1] == sorted_keys[1:]
+    flags[order[duplicated]] |= DUPLICATE
+
+    close = _float_column(columns, 'close', count)
+    if close is None:
+        close = np.full(count, np.nan)
+    with np.errstate(invalid='ignore'):
+        flags[~(close > 0)] |= MISSING_PRICE
+
+    # 1970-01-01 為星期四：(日序 + 3) % 7 得到 星期一=0 ... 星期日=6
+    if utc_offset_seconds is None:
+        weekday = (keys + 3) % 7
+        weekend = weekday >= 5
+    else:
+        local = keys + utc_offset_seconds
+        weekday = (local // 86400 + 3) % 7
+        hour = (local % 86400) // 3600
+        # 夜盤延續到星期六清晨
+        weekend = (weekday == 6) | ((weekday == 5) & (hour >= 6))
+    flags[weekend] |= WEEKEND
+
+    with np.errstate(invalid='ignore'):
+        volume = _float_column(columns, 'volume', count)
+        if volume is not None:
+            flags[volume < 0] |= NEGATIVE_VOLUME
+
+        rsi = _float_column(columns, 'rsi', count)
+        if rsi is not None:
+            flags[(rsi < 0) | (rsi > 100)] |= RSI_OUT_OF_RANGE
+
+        high = _float_column(columns, 'high', count)
+        low = _float_column(columns, 'low', count)
+        open_ = _float_column(columns, 'open', count)
+        if high is not None and low is not None:
+            inconsistent = (high < low) | (high < close) | (low > close)
+            if open_ is not None:
+                inconsistent |= (high < open_) | (low > open_)
+            flags[inconsistent] |= OHLC_INCONSISTENT
+
+        # 只在其餘檢查都通過的列之間比較收盤價
+        candidates = order[flags[order] == 0]
+        prices = close[candidates]
+        if len(prices):
+            previous = np.concatenate(([np.nan if previous_close is None else previous_close], prices[:-1]))
+            following = np.concatenate((prices[1:], [np.nan]))
+            jump_in = np.abs(prices / previous - 1) > MAX_PRICE_JUMP
+            jump_out = np.abs(following / prices - 1) > MAX_PRICE_JUMP
+            spike = jump_in & jump_out
+            recovered = np.concatenate(([False], spike[:-1]))
+            flags[candidates[jump_in & ~recovered]] |= PRICE_JUMP
+
+    accepted = order[flags[order] == 0]
+    rejected = np.flatnonzero(flags)
+    return ValidationResult(accepted, rejected, flags, _summary(flags))
+
+def flagged_result(flags: np.ndarray) -> ValidationResult:
+    """由呼叫端判定的旗標建立驗證結果（旗標為0的列依原順序通過）"""
+    flags = np.asarray(flags, dtype=np.int64)
+    return ValidationResult(np.flatnonzero(flags == 0), np.flatnonzero(flags), flags, _summary(flags))
+
+def _summary(flags: np.ndarray) -> Dict:
+    """各原因的筆數統計"""
+    return {
+        'rows': int(len(flags)),
+        'accepted': int((flags == 0).sum()),
+        'rejected': int((flags != 0).sum()),
+        'by_reason': {
+            name: int(np.count_nonzero(flags & bit))
+            for bit, name in REASON_NAMES.items() if np.any(flags & bit)
+        }
+    }
+
+def benchmark_validation(rows: int = 2_500_000) -> Dict:
+    """量測驗證吞吐量（預設約10年分K筆數）"""
+    import time
+    rng = np.random.default_rng(0)
+    keys = 1_420_000_000 + np.arange(rows, dtype=np.int64) * 60
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 0.0005, rows)))
+    columns = {
+        'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+        'volume': rng.integers(0, 500, rows)
+    }
+    started = time.perf_counter()
+    result = validate_bars(keys, columns, utc_offset_seconds=8 * 3600)
+    elapsed = time.perf_counter() - started
+    print(f"🧹 驗證 {rows:,} 筆分K，耗時 {elapsed:.3f} 秒（{round(rows / elapsed):,} 筆/秒）")
+    return {'rows': rows, 'seconds': round(elapsed, 4), 'summary': result.summary}
+
+if __name__ == "__main__":
+    benchmark_validation()
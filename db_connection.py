@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 每個連線快取的預編譯語句數量
+CACHED_STATEMENTS = 256
+
+# 連線層級的 PRAGMA（WAL 讓讀取不會被寫入阻塞）
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536"
+)
+
+class ConnectionManager:
+    """SQLite 連線管理器：每個執行緒一條讀取連線，單一序列化寫入連線"""
+
+    _instances: Dict[str, 'ConnectionManager'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str, timeout: float = 30.0, cached_statements: int = CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        self._after_commit: List[Callable[[], None]] = []
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, db_path: str) -> 'ConnectionManager':
+        """同一程序內相同資料庫共用一個管理器（確保只有一個寫入者）"""
+        key = str(Path(db_path).resolve())
+        with cls._instances_lock:
+            manager = cls._instances.get(key)
+            if manager is None:
+                manager = cls(db_path)
+                cls._instances[key] = manager
+            return manager
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=check_same_thread
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """取得目前執行緒的讀取連線（自動提交模式，每次查詢讀到最新提交）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def read(self, label: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+        """讀取連線的 context manager，指定 label 時累計查詢耗時"""
+        conn = self.reader()
+        started = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            if label:
+                self.record(label, time.perf_counter() - started)
+
+    @contextmanager
+    def write(self, label: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+        """取得序列化的寫入連線並開啟 IMMEDIATE 交易，結束時提交（例外時回滾）
+
+        巢狀呼叫沿用外層交易，after_commit 登記的回呼在最外層交易提交後才執行。
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(check_same_thread=False)
+                self._writer.isolation_level = None
+            conn = self._writer
+
+            # 巢狀呼叫沿用外層交易
+            if conn.in_transaction:
+                yield conn
+                return
+
+            started = time.perf_counter()
+            callbacks: List[Callable[[], None]] = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+                callbacks = self._after_commit
+            finally:
+                self._after_commit = []
+                if label:
+                    self.record(label, time.perf_counter() - started)
+
+            # 仍持有寫入鎖，回呼看到的是剛提交的狀態
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"⚠️ 提交後回呼失敗: {e}")
+
+    def after_commit(self, callback: Callable[[], None]):
+        """（在 write() 內呼叫）登記最外層交易提交後執行的回呼，交易回滾時捨棄"""
+        with self._writer_lock:
+            self._after_commit.append(callback)
+
+    def record(self, label: str, seconds: float):
+        """累計查詢次數與耗時"""
+        with self._stats_lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def get_query_stats(self) -> Dict[str, Dict[str, float]]:
+        """取得各查詢的次數、總耗時、平均與最大耗時（秒）"""
+        with self._stats_lock:
+            return {
+                label: {
+                    'count': int(stats['count']),
+                    'total_seconds': round(stats['total_seconds'], 6),
+                    'avg_seconds': round(stats['total_seconds'] / stats['count'], 6) if stats['count'] else 0.0,
+                    'max_seconds': round(stats['max_seconds'], 6)
+                }
+                for label, stats in self._stats.items()
+            }
+
+    def reset_query_stats(self):
+        """清除查詢耗時統計"""
+        with self._stats_lock:
+            self._stats.clear()
+
+    def close(self):
+        """關閉寫入連線與目前執行緒的讀取連線"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -1,45 +1,167 @@
 import math
+import threading
+import contextvars
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, Optional
 from datetime import datetime, timedelta
-from historical_database import HistoricalDatabase
+from historical_database import HistoricalDatabase, RefreshingValue
+from rolling_correlation import DERIVED_NAME as CORRELATION_DERIVED_NAME, RollingCorrelationEngine
+from seasonal_effects import SeasonalEffectsEngine
+from walk_forward import WalkForwardEvaluator
+from parameter_optimizer import load_optimized_parameters
+from async_historical_database import AsyncHistoricalDatabase
+from feature_context import FeatureContext, get_feature_context
+from analysis_results import (DjiConversion, PatternValidation, PredictionResult, TradingRecommendation,
+                              TxfSentiment, UsSentiment)
+
+# 本次預測共用的歷史特徵（僅在該次呼叫的 context 內有效）
+_active_features: contextvars.ContextVar = contextvars.ContextVar('active_features', default=None)
+
+# 無法載入歷史數據時的預設轉換比例與相關性
+DEFAULT_OPTIMAL_RATIOS = {
+    'dji_txf_ratio': 0.508,
+    'ndx_txf_ratio': 1.0,
+    'soxx_txf_ratio': 100.0,
+    'dji_txf_correlation': 0.75,
+    'ndx_txf_correlation': 0.65,
+    'soxx_txf_correlation': 0.55
+}
+
+# 最佳轉換比例、歷史特徵與衍生表格的快取秒數（過期或數據版本改變後先沿用舊值，並在背景重新計算）
+OPTIMAL_RATIOS_TTL = 3600
+
+# 尚無 walk-forward 實測結果時的預設有效性
+DEFAULT_COMPONENT_ACCURACY = {
+    'US_SENTIMENT': 0.75,
+    'TXF_SENTIMENT': 0.80,
+    'DJI_CONVERSION': 0.85
+}
+
+# 權重與點數換算倍數的預設值（parameter_optimizer 可產生優化後的數值）
+DEFAULT_ENGINE_PARAMETERS = {
+    'us_futures_weight': 0.4,
+    'txf_sentiment_weight': 0.6,
+    'historical_accuracy_weight': 0.2,
+    'macd_adjustment_multiplier': 2,
+    'rsi_adjustment_multiplier': 3,
+    'us_impact_scale': 50,
+    'txf_impact_scale': 80
+}
+
+# 風氣評分描述（由高到低比對門檻，最後一項為其餘情況）
+US_SENTIMENT_DESCRIPTIONS = (
+    (8, "🔥 極度樂觀 - 強勁上漲動能"),
+    (7, "📈 樂觀 - 上漲趨勢明確"),
+    (6, "🟢 偏樂觀 - 溫和上漲"),
+    (4, "😐 中性 - 方向不明"),
+    (3, "🟡 偏悲觀 - 溫和下跌"),
+    (2, "📉 悲觀 - 下跌壓力明顯"),
+    (None, "❄️ 極度悲觀 - 恐慌性拋售")
+)
+
+TXF_SENTIMENT_DESCRIPTIONS = (
+    (8, "🚀 瘋狂追高 - 散戶FOMO情緒"),
+    (7, "💪 積極做多 - 買盤踴躍"),
+    (6, "👍 偏多氣氛 - 逢低承接"),
+    (4, "😶 觀望氣氛 - 量縮整理"),
+    (3, "😟 偏空氣氛 - 賣壓出現"),
+    (2, "😰 恐慌拋售 - 殺盤湧現"),
+    (None, "💀 絕望性拋售 - 無量下跌")
+)
+
+# 批次預測需要的輸入欄位（<市場>_<欄位>，每列一個時間點的市場快照）
+BATCH_INPUT_COLUMNS = (
+    'DJI_close', 'DJI_rsi', 'DJI_histogram',
+    'NDX_rsi', 'NDX_histogram',
+    'SOXX_rsi', 'SOXX_histogram',
+    'TXF1_close', 'TXF1_volume', 'TXF1_rsi', 'TXF1_histogram'
+)
 
 class EnhancedPredictionEngine:
-    def __init__(self):
+    # 綜合預測會讀取的歷史數據（指數, 回溯交易日數）
+    HISTORY_WINDOWS = (('DJI', 30), ('NDX', 30), ('SOXX', 30), ('TXF', 30), ('TXF', 60), ('TXF', 252))
+    
+    # 各資料庫共用的背景更新數值（網頁每次重新執行都會建立新引擎，比例、特徵與衍生表格不需要重算）
+    _shared_values: Dict[Tuple[str, str, float], RefreshingValue] = {}
+    _shared_values_lock = threading.Lock()
+    
+    def __init__(self, ratios_ttl: float = OPTIMAL_RATIOS_TTL):
         # 初始化歷史資料庫
         self.historical_db = HistoricalDatabase()
         
-        # 動態載入歷史優化參數
-        self.optimal_ratios = self._load_optimal_ratios()
+        # 由歷史數據計算的季節性效應（預測時只讀取已建好的表格）
+        self.seasonal_effects = SeasonalEffectsEngine(self.historical_db)
+        
+        # 各預測元件的 walk-forward 實測有效性（預測時只讀取已建好的表格）
+        self.effectiveness = WalkForwardEvaluator(self.historical_db)
+        
+        # 數據版本改變時在背景重建滾動相關性、季節性效應與 walk-forward 有效性，重建完成前沿用上次的結果
+        self._derived_tables = self._shared_value('derived_tables', ratios_ttl, _derived_tables_value)
+        
+        # 歷史優化的轉換比例（首次使用時才載入，過期或相關性表格重建後在背景更新）
+        self._optimal_ratios = self._shared_value('optimal_ratios', ratios_ttl, _optimal_ratios_value)
+        
+        # 日線歷史特徵（數據版本改變時在背景重新載入與匯出快照）
+        self._daily_features = self._shared_value('features', ratios_ttl, _daily_features_value)
+        
+        # 權重與倍數（有優化結果時使用 data/optimized_parameters.json）
+        parameters = self._load_engine_parameters()
         
         # 美國期貨風氣權重
-        self.us_futures_weight = 0.4
+        self.us_futures_weight = parameters['us_futures_weight']
         
         # 台指期貨風氣權重  
-        self.txf_sentiment_weight = 0.6
+        self.txf_sentiment_weight = parameters['txf_sentiment_weight']
         
         # 歷史回測準確性權重
-        self.historical_accuracy_weight = 0.2
+        self.historical_accuracy_weight = parameters['historical_accuracy_weight']
         
-    def _load_optimal_ratios(self) -> Dict:
-        """載入基於10年歷史數據的最佳預測比例"""
+        # 道瓊MACD柱狀體、RSI超買超賣每點換算的台指點數
+        self.macd_adjustment_multiplier = parameters['macd_adjustment_multiplier']
+        self.rsi_adjustment_multiplier = parameters['rsi_adjustment_multiplier']
+        
+        # 風氣評分每偏離中性1分換算的台指點數
+        self.us_impact_scale = parameters['us_impact_scale']
+        self.txf_impact_scale = parameters['txf_impact_scale']
+        
+    def _load_engine_parameters(self) -> Dict:
+        """載入參數優化結果（沒有結果或無法讀取時使用預設值）"""
+        parameters = dict(DEFAULT_ENGINE_PARAMETERS)
         try:
-            ratios = self.historical_db.get_optimal_prediction_ratios(lookback_days=252)
-            print(f"📊 載入歷史優化參數: DJI相關性={ratios['dji_txf_correlation']:.3f}")
-            return ratios
+            optimized = load_optimized_parameters()
+            if optimized:
+                parameters.update({name: float(value) for name, value in optimized.items() if name in parameters})
+                print(f"🎯 載入優化參數: 美國權重={parameters['us_futures_weight']:.2f}, 台指權重={parameters['txf_sentiment_weight']:.2f}")
         except Exception as e:
-            print(f"⚠️ 無法載入歷史數據，使用預設參數: {e}")
-            return {
-                'dji_txf_ratio': 0.508,
-                'ndx_txf_ratio': 1.0,
-                'soxx_txf_ratio': 100.0,
-                'dji_txf_correlation': 0.75,
-                'ndx_txf_correlation': 0.65,
-                'soxx_txf_correlation': 0.55
-            }
-    
-    def analyze_dji_to_txf_conversion_enhanced(self, dji_data: Dict) -> Dict:
+            print(f"⚠️ 無法載入優化參數，使用預設值: {e}")
+        return parameters
+    
+    @property
+    def optimal_ratios(self) -> Dict:
+        """歷史優化的轉換比例與相關性（首次取用時載入，超過 TTL 後先回傳舊值並在背景更新）"""
+        # 滾動相關性由衍生表格的背景重建建立，確保已啟動
+        self._derived_tables.get()
+        return self._optimal_ratios.get()
+    
+    @optimal_ratios.setter
+    def optimal_ratios(self, ratios: Dict):
+        """固定使用指定的比例（此引擎不再自動更新）"""
+        self._optimal_ratios = RefreshingValue(lambda: ratios, float('inf'))
+    
+    def _shared_value(self, kind: str, ttl: float,
+                      factory: Callable[[HistoricalDatabase, float], RefreshingValue]) -> RefreshingValue:
+        """同一資料庫與 TTL 的引擎共用一份背景更新的數值"""
+        db = self.historical_db
+        key = (db._cache_namespace, kind, ttl)
+        with self._shared_values_lock:
+            value = self._shared_values.get(key)
+            if value is None:
+                value = factory(db, ttl)
+                self._shared_values[key] = value
+        return value
+    
+    def analyze_dji_to_txf_conversion_enhanced(self, dji_data: Dict) -> DjiConversion:
         """基於歷史數據的增強版道瓊轉換台指期貨"""
         dji_close = dji_data["close"]
         dji_macd = dji_data["macd"]
@@ -56,9 +178,9 @@ class EnhancedPredictionEngine:
         # 技術指標調整（基於歷史有效性）
         macd_adjustment = 0
         if dji_histogram > 0:  # MACD金叉
-            macd_adjustment = abs(dji_histogram) * 2 * correlation_weight
+            macd_adjustment = abs(dji_histogram) * self.macd_adjustment_multiplier * correlation_weight
         else:  # MACD死叉
-            macd_adjustment = -abs(dji_histogram) * 2 * correlation_weight
+            macd_adjustment = -abs(dji_histogram) * self.macd_adjustment_multiplier * correlation_weight
             
         # RSI調整（加入歷史波動度）
         rsi_adjustment = 0
@@ -66,9 +188,9 @@ class EnhancedPredictionEngine:
         volatility_factor = min(historical_volatility / 0.02, 2.0)  # 限制在2倍內
         
         if dji_rsi > 70:  # 超買
-            rsi_adjustment = -(dji_rsi - 70) * 3 * volatility_factor
+            rsi_adjustment = -(dji_rsi - 70) * self.rsi_adjustment_multiplier * volatility_factor
         elif dji_rsi < 30:  # 超賣
-            rsi_adjustment = (30 - dji_rsi) * 3 * volatility_factor
+            rsi_adjustment = (30 - dji_rsi) * self.rsi_adjustment_multiplier * volatility_factor
             
         # 季節性調整（基於歷史同期表現）
         seasonal_adjustment = self._get_seasonal_adjustment('DJI', 'TXF')
@@ -76,18 +198,18 @@ class EnhancedPredictionEngine:
         # 最終預測點位
         predicted_txf = base_txf_prediction + macd_adjustment + rsi_adjustment + seasonal_adjustment
         
-        return {
-            "base_prediction": round(base_txf_prediction),
-            "macd_adjustment": round(macd_adjustment),
-            "rsi_adjustment": round(rsi_adjustment),
-            "seasonal_adjustment": round(seasonal_adjustment),
-            "final_prediction": round(predicted_txf),
-            "confidence": self._calculate_enhanced_confidence(dji_data),
-            "historical_correlation": self.optimal_ratios['dji_txf_correlation'],
-            "volatility_factor": volatility_factor
-        }
+        return DjiConversion(
+            base_prediction=round(base_txf_prediction),
+            macd_adjustment=round(macd_adjustment),
+            rsi_adjustment=round(rsi_adjustment),
+            seasonal_adjustment=round(seasonal_adjustment),
+            final_prediction=round(predicted_txf),
+            confidence=self._calculate_enhanced_confidence(dji_data),
+            historical_correlation=self.optimal_ratios['dji_txf_correlation'],
+            volatility_factor=volatility_factor
+        )
     
-    def analyze_us_futures_sentiment_enhanced(self, market_data: Dict) -> Dict:
+    def analyze_us_futures_sentiment_enhanced(self, market_data: Dict) -> UsSentiment:
         """基於歷史數據的增強版美國期貨風氣分析"""
         dji_data = market_data["DJI"]
         ndx_data = market_data["NDX"]
@@ -142,24 +264,22 @@ class EnhancedPredictionEngine:
         
         # 轉換為台指期貨點位影響（基於歷史有效性）
         historical_effectiveness = self._get_historical_prediction_accuracy('US_SENTIMENT')
-        sentiment_impact = (sentiment_score - 5) * 50 * historical_effectiveness
-        
-        return {
-            "sentiment_score": round(sentiment_score, 2),
-            "weighted_rsi": round(weighted_rsi, 2),
-            "total_momentum": round(total_momentum, 2),
-            "txf_impact": round(sentiment_impact),
-            "description": self._get_us_sentiment_description(sentiment_score),
-            "historical_weights": {
-                "dji_weight": round(dji_weight, 3),
-                "ndx_weight": round(ndx_weight, 3),
-                "soxx_weight": round(soxx_weight, 3)
-            },
-            "volatility_adjustment": round(volatility_multiplier, 2),
-            "historical_effectiveness": round(historical_effectiveness, 2)
-        }
+        sentiment_impact = (sentiment_score - 5) * self.us_impact_scale * historical_effectiveness
+        
+        return UsSentiment(
+            sentiment_score=float(np.round(sentiment_score, 2)),
+            weighted_rsi=float(np.round(weighted_rsi, 2)),
+            total_momentum=float(np.round(total_momentum, 2)),
+            txf_impact=round(sentiment_impact),
+            description=self._get_us_sentiment_description(sentiment_score),
+            dji_weight=round(dji_weight, 3),
+            ndx_weight=round(ndx_weight, 3),
+            soxx_weight=round(soxx_weight, 3),
+            volatility_adjustment=round(volatility_multiplier, 2),
+            historical_effectiveness=round(historical_effectiveness, 2)
+        )
     
-    def analyze_txf_sentiment_enhanced(self, txf_data: Dict) -> Dict:
+    def analyze_txf_sentiment_enhanced(self, txf_data: Dict) -> TxfSentiment:
         """基於歷史數據的增強版台指期貨風氣分析"""
         close = txf_data["close"]
         volume = txf_data["volume"] 
@@ -199,26 +319,35 @@ class EnhancedPredictionEngine:
         
         # 轉換為點位影響（基於歷史有效性）
         historical_effectiveness = self._get_historical_prediction_accuracy('TXF_SENTIMENT')
-        sentiment_impact = (overall_sentiment - 5) * 80 * historical_effectiveness
-        
-        return {
-            "sentiment_score": round(overall_sentiment, 2),
-            "volume_sentiment": round(volume_sentiment, 2),
-            "rsi_sentiment": round(rsi_sentiment, 2),
-            "macd_sentiment": round(macd_sentiment, 2),
-            "volume": volume,
-            "txf_impact": round(sentiment_impact),
-            "description": self._get_txf_sentiment_description(overall_sentiment),
-            "historical_analysis": {
-                "volume_z_score": round(volume_z_score, 2),
-                "rsi_percentile": self._calculate_percentile(rsi, 'TXF', 'rsi', 252),
-                "macd_z_score": round(macd_z_score, 2),
-                "effectiveness": round(historical_effectiveness, 2)
-            }
-        }
+        sentiment_impact = (overall_sentiment - 5) * self.txf_impact_scale * historical_effectiveness
+        
+        return TxfSentiment(
+            sentiment_score=float(np.round(overall_sentiment, 2)),
+            volume_sentiment=float(np.round(volume_sentiment, 2)),
+            rsi_sentiment=float(np.round(rsi_sentiment, 2)),
+            macd_sentiment=float(np.round(macd_sentiment, 2)),
+            volume=volume,
+            txf_impact=round(sentiment_impact),
+            description=self._get_txf_sentiment_description(overall_sentiment),
+            volume_z_score=float(np.round(volume_z_score, 2)),
+            rsi_percentile=self._calculate_percentile(rsi, 'TXF', 'rsi', 252),
+            macd_z_score=float(np.round(macd_z_score, 2)),
+            effectiveness=round(historical_effectiveness, 2)
+        )
+    
+    def predict(self, market_data: Dict) -> PredictionResult:
+        """生成基於歷史數據的增強版綜合預測（歷史統計共用同一份特徵上下文）"""
+        token = _active_features.set(_active_features.get() or self._load_features())
+        try:
+            return self._generate_prediction(market_data)
+        finally:
+            _active_features.reset(token)
     
     def generate_comprehensive_prediction_enhanced(self, market_data: Dict) -> Dict:
-        """生成基於歷史數據的增強版綜合預測"""
+        """生成增強版綜合預測（巢狀字典格式，即 predict(market_data).to_dict()）"""
+        return self.predict(market_data).to_dict()
+    
+    def _generate_prediction(self, market_data: Dict) -> PredictionResult:
         # 1. 增強版道瓊轉換預測
         dji_prediction = self.analyze_dji_to_txf_conversion_enhanced(market_data["DJI"])
         
@@ -232,10 +361,10 @@ class EnhancedPredictionEngine:
         historical_validation = self._validate_with_historical_patterns(market_data)
         
         # 5. 綜合計算最終預測點位（加入歷史驗證權重）
-        base_prediction = dji_prediction["final_prediction"]
-        us_impact = us_sentiment["txf_impact"] * self.us_futures_weight
-        txf_impact = txf_sentiment["txf_impact"] * self.txf_sentiment_weight
-        historical_impact = historical_validation["predicted_move"] * self.historical_accuracy_weight
+        base_prediction = dji_prediction.final_prediction
+        us_impact = us_sentiment.txf_impact * self.us_futures_weight
+        txf_impact = txf_sentiment.txf_impact * self.txf_sentiment_weight
+        historical_impact = historical_validation.predicted_move * self.historical_accuracy_weight
         
         final_prediction = base_prediction + us_impact + txf_impact + historical_impact
         
@@ -244,69 +373,125 @@ class EnhancedPredictionEngine:
             dji_prediction, us_sentiment, txf_sentiment, historical_validation
         )
         
-        return {
-            "current_price": market_data["TXF1"]["close"],
-            "dji_based_prediction": dji_prediction,
-            "us_futures_sentiment": us_sentiment,
-            "txf_sentiment": txf_sentiment,
-            "historical_validation": historical_validation,
-            "final_prediction": round(final_prediction),
-            "prediction_range": {
-                "lower": round(final_prediction - confidence_range),
-                "upper": round(final_prediction + confidence_range)
-            },
-            "price_difference": round(final_prediction - market_data["TXF1"]["close"]),
-            "recommendation": self._generate_enhanced_trading_recommendation(
+        return PredictionResult(
+            current_price=market_data["TXF1"]["close"],
+            dji=dji_prediction,
+            us_sentiment=us_sentiment,
+            txf_sentiment=txf_sentiment,
+            historical_validation=historical_validation,
+            final_prediction=round(final_prediction),
+            prediction_lower=round(final_prediction - confidence_range),
+            prediction_upper=round(final_prediction + confidence_range),
+            price_difference=round(final_prediction - market_data["TXF1"]["close"]),
+            recommendation=self._generate_enhanced_trading_recommendation(
                 final_prediction, market_data["TXF1"]["close"], us_sentiment, txf_sentiment, historical_validation
-            ),
-            "confidence_metrics": {
-                "historical_accuracy": historical_validation["confidence"],
-                "correlation_strength": dji_prediction["historical_correlation"],
-                "volatility_adjustment": us_sentiment["volatility_adjustment"]
-            }
+            )
+        )
+    
+    async def generate_comprehensive_prediction_enhanced_async(self, market_data: Dict, async_db=None) -> Dict:
+        """非同步版綜合預測（巢狀字典格式）"""
+        return (await self.predict_async(market_data, async_db)).to_dict()
+    
+    async def predict_async(self, market_data: Dict, async_db=None) -> PredictionResult:
+        """非同步版綜合預測：在執行緒池載入歷史特徵（不阻塞事件迴圈），再以同一套計算產生預測"""
+        owns_db = async_db is None
+        async_db = async_db or AsyncHistoricalDatabase(self.historical_db)
+        try:
+            features = await async_db.run(self._load_features)
+        finally:
+            if owns_db:
+                async_db.close(wait=False)
+        
+        token = _active_features.set(features)
+        try:
+            return self.predict(market_data)
+        finally:
+            _active_features.reset(token)
+    
+    def predict_batch(self, snapshots: pd.DataFrame) -> pd.DataFrame:
+        """批次預測：snapshots 每列為一個時間點的市場快照（欄位見 BATCH_INPUT_COLUMNS）
+        
+        每列結果與逐筆呼叫 generate_comprehensive_prediction_enhanced 相同；
+        歷史統計（波動度、成交量分布、RSI 極值等）取自目前的特徵上下文，全部列共用。
+        """
+        token = _active_features.set(_active_features.get() or self._load_features())
+        try:
+            parameters = self._batch_parameters()
+        finally:
+            _active_features.reset(token)
+        return predict_snapshots(snapshots, parameters)
+    
+    def _batch_parameters(self) -> Dict:
+        """批次預測共用的純量參數（與逐筆預測使用相同的輔助方法取得）"""
+        historical_vol = [self._get_historical_volatility(symbol, 30) for symbol in ('DJI', 'NDX', 'SOXX')]
+        try:
+            rsi_index = self._features().percentile_index('TXF', 'rsi', 252)
+        except Exception:
+            rsi_index = None
+        
+        return {
+            'optimal_ratios': self.optimal_ratios,
+            'dji_volatility_factor': min(self._get_historical_volatility('DJI', 30) / 0.02, 2.0),
+            'us_volatility_multiplier': min(np.mean(historical_vol) / 0.02, 2.0),
+            'seasonal_adjustment': self._get_seasonal_adjustment('DJI', 'TXF'),
+            'us_effectiveness': self._get_historical_prediction_accuracy('US_SENTIMENT'),
+            'txf_effectiveness': self._get_historical_prediction_accuracy('TXF_SENTIMENT'),
+            'volume_stats': self._get_historical_volume_stats(30),
+            'rsi_extremes': self._get_historical_rsi_extremes('TXF', 252),
+            'macd_stats': self._get_historical_macd_stats('TXF', 60),
+            'rsi_index': rsi_index,
+            **{name: getattr(self, name) for name in DEFAULT_ENGINE_PARAMETERS}
         }
     
     # 歷史數據分析輔助方法
+    def _load_features(self) -> Optional[FeatureContext]:
+        """載入各指數所需的最大歷史視窗（同一數據版本與日期只載入一次）
+        
+        日線為各引擎共用、數據版本改變時在背景更新的特徵；盤中週期直接查詢。
+        載入失敗時回傳 None，各項統計改用預設值。
+        """
+        try:
+            if self.historical_db.default_timeframe == '1d':
+                return self._daily_features.get()
+            return get_feature_context(self.historical_db, self.HISTORY_WINDOWS)
+        except Exception as e:
+            print(f"⚠️ 載入歷史特徵失敗: {e}")
+            return None
+    
+    def _features(self) -> FeatureContext:
+        """本次預測的歷史特徵（單獨呼叫輔助方法時即時載入）"""
+        features = _active_features.get() or self._load_features()
+        if features is None:
+            raise LookupError("歷史特徵不可用")
+        return features
+    
     def _get_historical_volatility(self, symbol: str, days: int) -> float:
         """計算歷史波動度"""
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
-            data = self.historical_db.get_historical_data(symbol, start_date, end_date)
+            volatility = self._features().volatility(symbol, days)  # 年化波動度
             
-            if len(data) > 1:
-                returns = data['close'].pct_change().dropna()
-                return float(returns.std() * np.sqrt(252))  # 年化波動度
+            if volatility is not None:
+                return volatility
             return 0.02  # 預設2%
         except:
             return 0.02
     
     def _get_seasonal_adjustment(self, source_symbol: str, target_symbol: str) -> float:
-        """計算季節性調整"""
+        """計算季節性調整（目標指數下一個交易日在月份、星期、結算週期上的顯著歷史超額漲跌）"""
         try:
-            current_month = datetime.now().month
-            # 簡化的季節性效應（實際應基於歷史數據分析）
-            seasonal_factors = {
-                1: 20, 2: 10, 3: 15, 4: 5, 5: -10, 6: -5,
-                7: 0, 8: -15, 9: -20, 10: 15, 11: 25, 12: 30
-            }
-            return seasonal_factors.get(current_month, 0)
-        except:
+            self._derived_tables.get()
+            return self.seasonal_effects.adjustment(symbol=target_symbol, refresh=False)['points']
+        except Exception as e:
+            print(f"⚠️ 無法計算季節性效應: {e}")
             return 0
     
     def _get_historical_volume_stats(self, days: int) -> Dict:
         """獲取歷史成交量統計"""
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
-            data = self.historical_db.get_historical_data('TXF', start_date, end_date)
+            stats = self._features().volume_stats(days)
             
-            if len(data) > 0:
-                return {
-                    'mean': float(data['volume'].mean()),
-                    'std': float(data['volume'].std()),
-                    'median': float(data['volume'].median())
-                }
+            if stats is not None:
+                return stats
         except:
             pass
         return {'mean': 60000, 'std': 15000, 'median': 60000}
@@ -314,16 +499,10 @@ class EnhancedPredictionEngine:
     def _get_historical_rsi_extremes(self, symbol: str, days: int) -> Dict:
         """獲取歷史RSI極值"""
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
-            data = self.historical_db.get_historical_data(symbol, start_date, end_date)
+            extremes = self._features().rsi_extremes(symbol, days)
             
-            if len(data) > 0:
-                return {
-                    'upper_80pct': float(data['rsi'].quantile(0.8)),
-                    'lower_20pct': float(data['rsi'].quantile(0.2)),
-                    'median': float(data['rsi'].median())
-                }
+            if extremes is not None:
+                return extremes
         except:
             pass
         return {'upper_80pct': 75, 'lower_20pct': 25, 'median': 50}
@@ -331,15 +510,10 @@ class EnhancedPredictionEngine:
     def _get_historical_macd_stats(self, symbol: str, days: int) -> Dict:
         """獲取歷史MACD統計"""
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
-            data = self.historical_db.get_historical_data(symbol, start_date, end_date)
+            stats = self._features().macd_stats(symbol, days)
             
-            if len(data) > 0:
-                return {
-                    'mean': float(data['histogram'].mean()),
-                    'std': float(data['histogram'].std())
-                }
+            if stats is not None:
+                return stats
         except:
             pass
         return {'mean': 0, 'std': 20}
@@ -347,27 +521,26 @@ class EnhancedPredictionEngine:
     def _calculate_percentile(self, value: float, symbol: str, column: str, days: int) -> float:
         """計算當前值在歷史數據中的百分位"""
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
-            data = self.historical_db.get_historical_data(symbol, start_date, end_date)
+            percentile = self._features().percentile(value, symbol, column, days)
             
-            if len(data) > 0 and column in data.columns:
-                return float((data[column] < value).mean() * 100)
+            if percentile is not None:
+                return percentile
         except:
             pass
         return 50.0
     
     def _get_historical_prediction_accuracy(self, model_type: str) -> float:
-        """獲取歷史預測準確性（模擬）"""
-        # 實際實現中應基於回測結果
-        accuracy_map = {
-            'US_SENTIMENT': 0.75,
-            'TXF_SENTIMENT': 0.80,
-            'DJI_CONVERSION': 0.85
-        }
-        return accuracy_map.get(model_type, 0.70)
+        """獲取歷史預測準確性（walk-forward 重播至今日的252筆滾動方向命中率，尚無結果時用預設值）"""
+        try:
+            self._derived_tables.get()
+            measured = self.effectiveness.get_asof(model_type, refresh=False)
+            if measured is not None and measured['hit_rate'] is not None:
+                return measured['hit_rate']
+        except Exception as e:
+            print(f"⚠️ 無法讀取 {model_type} 實測有效性: {e}")
+        return DEFAULT_COMPONENT_ACCURACY.get(model_type, 0.70)
     
-    def _validate_with_historical_patterns(self, market_data: Dict) -> Dict:
+    def _validate_with_historical_patterns(self, market_data: Dict) -> PatternValidation:
         """歷史模式驗證"""
         # 簡化的歷史模式匹配
         current_rsi = market_data["TXF1"]["rsi"]
@@ -391,12 +564,12 @@ class EnhancedPredictionEngine:
             confidence = 0.5
             pattern = "常態整理模式"
         
-        return {
-            "predicted_move": predicted_move,
-            "confidence": confidence,
-            "pattern_type": pattern,
-            "historical_matches": 85  # 模擬歷史匹配數量
-        }
+        return PatternValidation(
+            predicted_move=predicted_move,
+            confidence=confidence,
+            pattern_type=pattern,
+            historical_matches=85  # 模擬歷史匹配數量
+        )
     
     def _calculate_enhanced_confidence(self, dji_data: Dict) -> float:
         """計算增強版信心度"""
@@ -418,29 +591,31 @@ class EnhancedPredictionEngine:
         
         return min(base_confidence + correlation_bonus + rsi_bonus + macd_bonus, 0.95)
     
-    def _calculate_enhanced_prediction_range(self, dji_pred: Dict, us_sentiment: Dict, txf_sentiment: Dict, historical_val: Dict) -> int:
+    def _calculate_enhanced_prediction_range(self, dji_pred: DjiConversion, us_sentiment: UsSentiment,
+                                             txf_sentiment: TxfSentiment, historical_val: PatternValidation) -> int:
         """計算增強版預測區間"""
         base_range = 80
         
         # 信心度調整
-        confidence_factor = (1 - dji_pred["confidence"]) * 80
+        confidence_factor = (1 - dji_pred.confidence) * 80
         
         # 歷史驗證調整
-        historical_factor = (1 - historical_val["confidence"]) * 60
+        historical_factor = (1 - historical_val.confidence) * 60
         
         # 波動度調整
-        volatility_factor = us_sentiment.get("volatility_adjustment", 1) * 30
+        volatility_factor = us_sentiment.volatility_adjustment * 30
         
         total_range = base_range + confidence_factor + historical_factor + volatility_factor
         return round(total_range)
     
     def _generate_enhanced_trading_recommendation(self, predicted_price: float, current_price: float, 
-                                               us_sentiment: Dict, txf_sentiment: Dict, historical_val: Dict) -> Dict:
+                                               us_sentiment: UsSentiment, txf_sentiment: TxfSentiment,
+                                               historical_val: PatternValidation) -> TradingRecommendation:
         """生成增強版交易建議"""
         price_diff = predicted_price - current_price
         
         # 歷史模式調整
-        historical_confidence = historical_val["confidence"]
+        historical_confidence = historical_val.confidence
         
         # 基本方向判斷
         if price_diff > 50:
@@ -464,47 +639,240 @@ class EnhancedPredictionEngine:
             confidence = "高" if historical_confidence > 0.7 else "中"
             entry_strategy = "積極放空" if historical_confidence > 0.8 else "分批放空"
             
-        return {
-            "direction": direction,
-            "confidence": confidence,
-            "entry_strategy": entry_strategy,
-            "expected_move": f"{price_diff:+.0f}點",
-            "risk_level": "高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低",
-            "historical_support": historical_val["pattern_type"],
-            "historical_confidence": f"{historical_confidence:.1%}"
-        }
+        return TradingRecommendation(
+            direction=direction,
+            confidence=confidence,
+            entry_strategy=entry_strategy,
+            expected_move=f"{price_diff:+.0f}點",
+            risk_level="高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低",
+            historical_support=historical_val.pattern_type,
+            historical_confidence=f"{historical_confidence:.1%}"
+        )
     
     # 從原有引擎繼承的方法
     def _get_us_sentiment_description(self, score: float) -> str:
         """美國期貨風氣描述"""
-        if score >= 8:
-            return "🔥 極度樂觀 - 強勁上漲動能"
-        elif score >= 7:
-            return "📈 樂觀 - 上漲趨勢明確"
-        elif score >= 6:
-            return "🟢 偏樂觀 - 溫和上漲"
-        elif score >= 4:
-            return "😐 中性 - 方向不明"
-        elif score >= 3:
-            return "🟡 偏悲觀 - 溫和下跌"
-        elif score >= 2:
-            return "📉 悲觀 - 下跌壓力明顯"
-        else:
-            return "❄️ 極度悲觀 - 恐慌性拋售"
+        return _describe_score(score, US_SENTIMENT_DESCRIPTIONS)
     
     def _get_txf_sentiment_description(self, score: float) -> str:
         """台指期貨風氣描述"""
-        if score >= 8:
-            return "🚀 瘋狂追高 - 散戶FOMO情緒"
-        elif score >= 7:
-            return "💪 積極做多 - 買盤踴躍"
-        elif score >= 6:
-            return "👍 偏多氣氛 - 逢低承接"
-        elif score >= 4:
-            return "😶 觀望氣氛 - 量縮整理"
-        elif score >= 3:
-            return "😟 偏空氣氛 - 賣壓出現"
-        elif score >= 2:
-            return "😰 恐慌拋售 - 殺盤湧現"
-        else:
-            return "💀 絕望性拋售 - 無量下跌" 
\ No newline at end of file
+        return _describe_score(score, TXF_SENTIMENT_DESCRIPTIONS)
+
+
+def compute_optimal_ratios(db: HistoricalDatabase, refresh: bool = True) -> Dict:
+    """最佳轉換比例與相關性：優先查詢預先計算的滾動相關性（as-of 今日），沒有資料才即時計算
+
+    refresh=False 時不重建滾動相關性，直接讀取上次建好的結果。
+    """
+    ratios = RollingCorrelationEngine(db).get_asof(window=252, refresh=refresh)
+    if ratios is None or any(ratios.get(key) is None for key in DEFAULT_OPTIMAL_RATIOS):
+        ratios = db.get_optimal_prediction_ratios(lookback_days=252)
+    print(f"📊 載入歷史優化參數: DJI相關性={ratios['dji_txf_correlation']:.3f}")
+    return ratios
+
+def _derived_tables_value(db: HistoricalDatabase, ttl: float) -> RefreshingValue:
+    """數據版本改變時在背景重建的衍生表格（數值為重建時的數據版本）
+
+    首次取用時不等待重建，立即在背景檢查；從未建立過的表格在建好前由讀取端使用預設值。
+    """
+    def rebuild() -> int:
+        data_version = db.get_data_version()
+        RollingCorrelationEngine(db).rebuild()
+        SeasonalEffectsEngine(db).rebuild()
+        # 背景重建，年度間以程序池平行計算（預設程序數）
+        WalkForwardEvaluator(db).rebuild()
+        return data_version
+
+    return RefreshingValue(rebuild, ttl, name="衍生表格", version=db.get_data_version, initial=lambda: None)
+
+def _optimal_ratios_value(db: HistoricalDatabase, ttl: float) -> RefreshingValue:
+    """最佳轉換比例（讀取已建好的滾動相關性，相關性表格重建後在背景重新載入；從未建立時先用預設值）"""
+    def load() -> Dict:
+        return compute_optimal_ratios(db, refresh=False)
+
+    def initial() -> Dict:
+        if db.get_derived_version(CORRELATION_DERIVED_NAME) is None:
+            return dict(DEFAULT_OPTIMAL_RATIOS)
+        return load()
+    return RefreshingValue(load, ttl,
+                           fallback=lambda: dict(DEFAULT_OPTIMAL_RATIOS), name="最佳轉換比例",
+                           version=lambda: db.get_derived_version(CORRELATION_DERIVED_NAME), initial=initial)
+
+def _daily_features_value(db: HistoricalDatabase, ttl: float) -> RefreshingValue:
+    """日線歷史特徵（使用獨立的資料庫物件，不受個別引擎切換盤中週期影響）"""
+    daily_db = HistoricalDatabase(db.db_path, str(db.snapshot_dir))
+    return RefreshingValue(lambda: get_feature_context(daily_db, EnhancedPredictionEngine.HISTORY_WINDOWS), ttl,
+                           name="歷史特徵", version=daily_db.get_data_version)
+
+def _describe_score(score: float, levels: Tuple) -> str:
+    for threshold, description in levels[:-1]:
+        if score >= threshold:
+            return description
+    return levels[-1][1]
+
+def _describe_scores(scores: np.ndarray, levels: Tuple) -> np.ndarray:
+    return np.select([scores >= threshold for threshold, _ in levels[:-1]],
+                     [description for _, description in levels[:-1]], default=levels[-1][1])
+
+def snapshots_to_frame(snapshots: List[Dict]) -> pd.DataFrame:
+    """將多筆 market_data 字典攤平成批次預測的輸入表格（欄位為 <市場>_<欄位>）"""
+    return pd.DataFrame([
+        {f"{market}_{field}": value for market, fields in snapshot.items() for field, value in fields.items()}
+        for snapshot in snapshots
+    ])
+
+def predict_snapshots(snapshots: pd.DataFrame, parameters: Dict) -> pd.DataFrame:
+    """以 NumPy 一次計算所有市場快照的道瓊轉換、美國/台指風氣與最終預測
+    
+    parameters 為 EnhancedPredictionEngine._batch_parameters() 的結果（重播時 seasonal_adjustment
+    可為與快照等長的陣列）；計算順序與逐筆路徑完全相同，以確保浮點結果一致。
+    """
+    if isinstance(snapshots.columns, pd.MultiIndex):
+        snapshots = snapshots.set_axis(["_".join(map(str, column)) for column in snapshots.columns], axis=1)
+    missing = [column for column in BATCH_INPUT_COLUMNS if column not in snapshots]
+    if missing:
+        raise ValueError(f"批次預測缺少欄位: {missing}")
+    col = {column: snapshots[column].to_numpy(dtype=float) for column in BATCH_INPUT_COLUMNS}
+    ratios = parameters['optimal_ratios']
+    
+    # 1. 道瓊轉換預測
+    correlation_weight = abs(ratios['dji_txf_correlation'])
+    dji_histogram = col['DJI_histogram']
+    dji_rsi = col['DJI_rsi']
+    volatility_factor = parameters['dji_volatility_factor']
+    macd_multiplier = parameters['macd_adjustment_multiplier']
+    rsi_multiplier = parameters['rsi_adjustment_multiplier']
+    base_txf_prediction = col['DJI_close'] * ratios['dji_txf_ratio']
+    macd_adjustment = np.where(dji_histogram > 0,
+                               np.abs(dji_histogram) * macd_multiplier * correlation_weight,
+                               -np.abs(dji_histogram) * macd_multiplier * correlation_weight)
+    rsi_adjustment = np.select(
+        [dji_rsi > 70, dji_rsi < 30],
+        [-(dji_rsi - 70) * rsi_multiplier * volatility_factor, (30 - dji_rsi) * rsi_multiplier * volatility_factor],
+        default=0.0
+    )
+    seasonal_adjustment = parameters['seasonal_adjustment']
+    predicted_txf = base_txf_prediction + macd_adjustment + rsi_adjustment + seasonal_adjustment
+    dji_final = np.rint(predicted_txf)
+    
+    rsi_bonus = np.where((dji_rsi >= 30) & (dji_rsi <= 70), 0.1, 0)
+    macd_bonus = np.minimum(np.abs(dji_histogram) / 50, 0.1)
+    dji_confidence = np.minimum(0.7 + correlation_weight * 0.2 + rsi_bonus + macd_bonus, 0.95)
+    
+    # 2. 美國期貨風氣
+    dji_weight = abs(ratios['dji_txf_correlation'])
+    ndx_weight = abs(ratios['ndx_txf_correlation'])
+    soxx_weight = abs(ratios['soxx_txf_correlation'])
+    total_weight = dji_weight + ndx_weight + soxx_weight
+    weighted_rsi = (
+        col['DJI_rsi'] * dji_weight + col['NDX_rsi'] * ndx_weight + col['SOXX_rsi'] * soxx_weight
+    ) / total_weight
+    total_momentum = (
+        col['DJI_histogram'] * dji_weight + col['NDX_histogram'] * ndx_weight + col['SOXX_histogram'] * soxx_weight
+    ) / total_weight
+    volatility_multiplier = parameters['us_volatility_multiplier']
+    
+    us_score = np.select(
+        [weighted_rsi > 70, weighted_rsi < 30],
+        [5 + (weighted_rsi - 70) / 10 * volatility_multiplier, 5 - (30 - weighted_rsi) / 10 * volatility_multiplier],
+        default=5.0
+    )
+    us_score = us_score + np.clip(total_momentum / 5, -2, 2)
+    us_score = np.maximum(1, np.minimum(10, us_score))
+    us_impact = np.rint((us_score - 5) * parameters['us_impact_scale'] * parameters['us_effectiveness'])
+    
+    # 3. 台指期貨風氣
+    volume_stats = parameters['volume_stats']
+    volume_z_score = (
+        (col['TXF1_volume'] - volume_stats['mean']) / volume_stats['std']
+        if volume_stats['std'] > 0 else np.zeros(len(snapshots))
+    )
+    volume_sentiment = 5 + np.clip(volume_z_score, -2, 2)
+    
+    txf_rsi = col['TXF1_rsi']
+    extremes = parameters['rsi_extremes']
+    rsi_sentiment = np.select(
+        [txf_rsi > extremes['upper_80pct'], txf_rsi > 70, txf_rsi < extremes['lower_20pct'], txf_rsi < 30],
+        [5 + (txf_rsi - extremes['upper_80pct']) / 5, 5 + (txf_rsi - 70) / 10,
+         5 - (extremes['lower_20pct'] - txf_rsi) / 5, 5 - (30 - txf_rsi) / 10],
+        default=5.0
+    )
+    
+    macd_stats = parameters['macd_stats']
+    macd_z_score = (
+        (col['TXF1_histogram'] - macd_stats['mean']) / macd_stats['std']
+        if macd_stats['std'] > 0 else np.zeros(len(snapshots))
+    )
+    macd_sentiment = 5 + np.clip(macd_z_score, -2, 2)
+    
+    txf_score = (volume_sentiment + rsi_sentiment + macd_sentiment) / 3
+    txf_score = np.maximum(1, np.minimum(10, txf_score))
+    txf_impact = np.rint((txf_score - 5) * parameters['txf_impact_scale'] * parameters['txf_effectiveness'])
+    
+    rsi_index = parameters.get('rsi_index')
+    rsi_percentile = rsi_index.ranks(txf_rsi) if rsi_index is not None and len(rsi_index) else np.full(len(snapshots), 50.0)
+    
+    # 4. 歷史模式驗證（與 _validate_with_historical_patterns 相同的規則）
+    pattern_conditions = [txf_rsi > 80, txf_rsi < 20, col['TXF1_volume'] > 80000]
+    predicted_move = np.select(pattern_conditions, [-30, 40, 15], default=0)
+    historical_confidence = np.select(pattern_conditions, [0.7, 0.7, 0.6], default=0.5)
+    pattern_type = np.select(pattern_conditions, ["極度超買回調模式", "極度超賣反彈模式", "高量突破模式"], default="常態整理模式")
+    
+    # 5. 最終預測與區間
+    final_prediction = (
+        dji_final + us_impact * parameters['us_futures_weight'] + txf_impact * parameters['txf_sentiment_weight']
+        + predicted_move * parameters['historical_accuracy_weight']
+    )
+    confidence_range = np.rint(
+        80 + (1 - dji_confidence) * 80 + (1 - historical_confidence) * 60
+        + round(volatility_multiplier, 2) * 30
+    )
+    current_price = col['TXF1_close']
+    price_diff = final_prediction - current_price
+    
+    # 6. 交易建議（與 _generate_enhanced_trading_recommendation 相同的規則）
+    direction_conditions = [price_diff > 50, price_diff > 20, price_diff > -20, price_diff > -50]
+    strong_confidence = np.where(historical_confidence > 0.7, "高", "中")
+    direction = np.select(direction_conditions, ["做多", "偏多", "觀望", "偏空"], default="做空")
+    confidence = np.select(direction_conditions, [strong_confidence, "中", "低", "中"], default=strong_confidence)
+    entry_strategy = np.select(
+        direction_conditions,
+        [np.where(historical_confidence > 0.8, "積極進場", "分批進場"), "分批進場", "等待明確信號", "分批放空"],
+        default=np.where(historical_confidence > 0.8, "積極放空", "分批放空")
+    )
+    risk_level = np.select([np.abs(price_diff) > 100, np.abs(price_diff) > 50], ["高", "中"], default="低")
+    
+    return pd.DataFrame({
+        'current_price': current_price,
+        'dji_base_prediction': np.rint(base_txf_prediction),
+        'dji_macd_adjustment': np.rint(macd_adjustment),
+        'dji_rsi_adjustment': np.rint(rsi_adjustment),
+        'dji_seasonal_adjustment': np.rint(seasonal_adjustment),
+        'dji_final_prediction': dji_final,
+        'dji_confidence': dji_confidence,
+        'us_sentiment_score': np.round(us_score, 2),
+        'us_weighted_rsi': np.round(weighted_rsi, 2),
+        'us_total_momentum': np.round(total_momentum, 2),
+        'us_txf_impact': us_impact,
+        'us_description': _describe_scores(us_score, US_SENTIMENT_DESCRIPTIONS),
+        'txf_sentiment_score': np.round(txf_score, 2),
+        'txf_volume_sentiment': np.round(volume_sentiment, 2),
+        'txf_rsi_sentiment': np.round(rsi_sentiment, 2),
+        'txf_macd_sentiment': np.round(macd_sentiment, 2),
+        'txf_impact': txf_impact,
+        'txf_description': _describe_scores(txf_score, TXF_SENTIMENT_DESCRIPTIONS),
+        'volume_z_score': np.round(volume_z_score, 2),
+        'rsi_percentile': rsi_percentile,
+        'macd_z_score': np.round(macd_z_score, 2),
+        'historical_predicted_move': predicted_move,
+        'historical_confidence': historical_confidence,
+        'historical_pattern': pattern_type,
+        'final_prediction': np.rint(final_prediction),
+        'prediction_lower': np.rint(final_prediction - confidence_range),
+        'prediction_upper': np.rint(final_prediction + confidence_range),
+        'price_difference': np.rint(price_diff),
+        'direction': direction,
+        'recommendation_confidence': confidence,
+        'entry_strategy': entry_strategy,
+        'risk_level': risk_level
+    }, index=snapshots.index)
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+from historical_database import HistoricalDatabase
+from percentile_index import SlidingPercentileIndex
+
+# 預測會用到的歷史欄位
+FEATURE_COLUMNS = ('close', 'volume', 'rsi', 'histogram')
+
+class FeatureContext:
+    """單次分析共用的歷史特徵
+
+    每個指數只載入一次所需的最大交易日視窗（由快照零複製取得），
+    各統計量再以交易日曆切出對應的區段，以 NumPy 計算。
+    日線視窗與 rolling_stats 的物化視窗相同、且滾動統計列不早於視窗起日時，直接使用 as-of 的滾動統計列。
+    """
+
+    def __init__(self, arrays: Dict[str, Dict[str, np.ndarray]], bounds: Dict[Tuple[str, int], slice],
+                 as_of: str, data_version: int, rolling: Optional[Dict[str, Dict]] = None,
+                 starts: Optional[Dict[Tuple[str, int], str]] = None):
+        self.arrays = arrays
+        self.bounds = bounds
+        self.starts = starts or {}
+        self.as_of = as_of
+        self.data_version = data_version
+        self.rolling = rolling or {}
+        self._percentile_indexes: Dict[Tuple[str, str, int], SlidingPercentileIndex] = {}
+        # 日線上下文可沿用資料庫持續更新的百分位索引（由 load 設定）
+        self.db: Optional[HistoricalDatabase] = None
+
+    @classmethod
+    def load(cls, db: HistoricalDatabase, windows: Iterable[Tuple[str, int]],
+             as_of: Optional[str] = None) -> 'FeatureContext':
+        """依 (指數, 交易日數) 清單載入各指數的最大視窗"""
+        as_of = as_of or date.today().isoformat()
+        windows = sorted(set((symbol.upper(), days) for symbol, days in windows))
+        longest: Dict[str, int] = {}
+        for symbol, days in windows:
+            longest[symbol] = max(longest.get(symbol, 0), days)
+
+        arrays = {}
+        for symbol, days in longest.items():
+            start, end = db.get_trading_calendar(symbol).window(days, as_of)
+            arrays[symbol] = _load_arrays(db, symbol, start, end, days)
+
+        # 每個視窗在最大視窗中的位置（依交易日曆的起日切分）
+        bounds, starts = {}, {}
+        for symbol, days in windows:
+            start, _ = db.get_trading_calendar(symbol).window(days, as_of)
+            dates = arrays[symbol]['date']
+            lower = int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+            bounds[(symbol, days)] = slice(lower, len(dates))
+            starts[(symbol, days)] = start
+
+        rolling = {}
+        if db.default_timeframe == '1d':
+            for symbol in longest:
+                stats = db.get_rolling_stats(symbol, as_of)
+                if stats is not None:
+                    rolling[symbol] = stats
+
+        context = cls(arrays, bounds, as_of, db.get_data_version(), rolling, starts)
+        if db.default_timeframe == '1d':
+            context.db = db
+        return context
+
+    def _materialized(self, symbol: str, stat: str, days: int) -> Optional[Dict]:
+        """視窗長度與物化統計相同時回傳 as-of 的滾動統計列
+
+        統計列早於視窗起日（數據中斷）時不使用，改由視窗內的數據計算，與未物化的統計一致。
+        """
+        symbol = symbol.upper()
+        stats = self.rolling.get(symbol)
+        if stats is None or stats['windows'].get(stat) != days:
+            return None
+        start = self.starts.get((symbol, days))
+        if start is not None and stats['date'] < start:
+            return None
+        return stats
+
+    def series(self, symbol: str, days: int, column: str) -> np.ndarray:
+        """取得視窗內的欄位數值（未載入的欄位回傳空陣列）"""
+        symbol = symbol.upper()
+        values = self.arrays[symbol].get(column)
+        if values is None:
+            return np.empty(0)
+        return values[self.bounds[(symbol, days)]]
+
+    def volatility(self, symbol: str, days: int) -> Optional[float]:
+        """年化報酬率標準差（不足兩筆時回傳 None）"""
+        stats = self._materialized(symbol, 'volatility', days)
+        if stats is not None:
+            return stats['volatility']
+        close = self.series(symbol, days, 'close')
+        if len(close) <= 1:
+            return None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(close) / close[:-1]
+        return _std(returns[np.isfinite(returns)]) * np.sqrt(252)
+
+    def volume_stats(self, days: int, symbol: str = 'TXF') -> Optional[Dict]:
+        """成交量平均、標準差與中位數（視窗內無數據時回傳 None）"""
+        stats = self._materialized(symbol, 'volume', days)
+        if stats is not None:
+            return {'mean': stats['volume_mean'], 'std': stats['volume_std'], 'median': stats['volume_median']}
+        volume = self.series(symbol, days, 'volume')
+        if len(volume) == 0:
+            return None
+        volume = volume[~np.isnan(volume)]
+        return {'mean': _mean(volume), 'std': _std(volume), 'median': _quantile(volume, 0.5)}
+
+    def rsi_extremes(self, symbol: str, days: int) -> Optional[Dict]:
+        stats = self._materialized(symbol, 'rsi', days)
+        if stats is not None:
+            return {'upper_80pct': stats['rsi_q80'], 'lower_20pct': stats['rsi_q20'], 'median': stats['rsi_median']}
+        rsi = self.series(symbol, days, 'rsi')
+        if len(rsi) == 0:
+            return None
+        rsi = rsi[~np.isnan(rsi)]
+        return {
+            'upper_80pct': _quantile(rsi, 0.8),
+            'lower_20pct': _quantile(rsi, 0.2),
+            'median': _quantile(rsi, 0.5)
+        }
+
+    def macd_stats(self, symbol: str, days: int) -> Optional[Dict]:
+        stats = self._materialized(symbol, 'macd', days)
+        if stats is not None:
+            return {'mean': stats['macd_mean'], 'std': stats['macd_std']}
+        histogram = self.series(symbol, days, 'histogram')
+        if len(histogram) == 0:
+            return None
+        histogram = histogram[~np.isnan(histogram)]
+        return {'mean': _mean(histogram), 'std': _std(histogram)}
+
+    def percentile_index(self, symbol: str, column: str, days: int) -> SlidingPercentileIndex:
+        """視窗數值的百分位索引（首次使用時建立，之後查詢為二分搜尋）
+        
+        視窗與資料庫持續更新的索引（最近 days 根K棒）內容相同時複製該索引，不重新排序；
+        as-of 過去日期或視窗內有缺漏時由視窗數值建立。
+        索引隨上下文快取共用；盤中需要持續 push 新數值時請先 copy()。
+        """
+        key = (symbol.upper(), column, days)
+        index = self._percentile_indexes.get(key)
+        if index is None:
+            values = self.series(symbol, days, column)
+            live = self._live_index(symbol, column, days)
+            if live is not None and np.array_equal(live.values(), values, equal_nan=True):
+                index = live.copy()
+            else:
+                index = SlidingPercentileIndex(days, values)
+            self._percentile_indexes[key] = index
+        return index
+
+    def _live_index(self, symbol: str, column: str, days: int) -> Optional[SlidingPercentileIndex]:
+        if self.db is None:
+            return None
+        try:
+            return self.db.get_percentile_index(symbol, column, days)
+        except Exception as e:
+            print(f"⚠️ 無法取得 {symbol} {column} 百分位索引: {e}")
+            return None
+
+    def percentile(self, value: float, symbol: str, column: str, days: int) -> Optional[float]:
+        """目前數值在視窗中的百分位（空值視為不小於目前數值，視窗無數據時回傳 None）"""
+        return self.percentile_index(symbol, column, days).rank(value)
+
+# 以下統計與 pandas 一致：已排除空值，無有效數值時為 NaN，標準差為樣本標準差
+def _mean(values: np.ndarray) -> float:
+    return float(values.mean()) if len(values) else float('nan')
+
+def _std(values: np.ndarray) -> float:
+    return float(values.std(ddof=1)) if len(values) > 1 else float('nan')
+
+def _quantile(values: np.ndarray, q: float) -> float:
+    return float(np.quantile(values, q)) if len(values) else float('nan')
+
+def _load_arrays(db: HistoricalDatabase, symbol: str, start: str, end: str, bars: int) -> Dict[str, np.ndarray]:
+    """載入指數的欄位陣列：日線優先使用快照，盤中週期或快照不可用時改用查詢"""
+    if db.default_timeframe == '1d':
+        try:
+            snapshot = db.get_snapshot(symbol)
+            columns = [column for column in FEATURE_COLUMNS if column in snapshot.columns]
+            return snapshot.slice(start, end, columns)
+        except OSError as e:
+            print(f"⚠️ {symbol} 快照不可用，改用資料庫查詢: {e}")
+
+    frame = db.get_historical_window(symbol, bars, end)
+    arrays = {'date': frame['date'].to_numpy().astype('datetime64[D]')}
+    for column in FEATURE_COLUMNS:
+        if column in frame:
+            arrays[column] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float)
+    return arrays
+
+def get_feature_context(db: HistoricalDatabase, windows: Iterable[Tuple[str, int]],
+                        as_of: Optional[str] = None) -> FeatureContext:
+    """取得特徵上下文（依數據版本、日期與週期快取，寫入新數據後自動失效）"""
+    as_of = as_of or date.today().isoformat()
+    windows = tuple(sorted(set((symbol.upper(), days) for symbol, days in windows)))
+    cache_key = (db._cache_namespace, 'features', db.get_data_version(), db.default_timeframe, as_of, windows)
+    context = db._result_cache.get(cache_key)
+    if context is None:
+        context = FeatureContext.load(db, windows, as_of)
+        db._result_cache.put(cache_key, context)
+    return context
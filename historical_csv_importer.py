@@ -0,0 +1,271 @@
+import hashlib
+import io
+import itertools
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from historical_database import HistoricalDatabase, SYMBOL_TABLES, TABLE_COLUMNS, _day_numbers
+from technical_indicators import IndicatorState, compute_indicators
+from data_quality import OUT_OF_ORDER, flagged_result, validate_bars
+
+# 專案內附的統一歷史資料（長格式：date,open,high,low,close,symbol）
+UNIFIED_CSV_PATH = str(Path(__file__).resolve().parent / "統一歷史資料庫（近10年）.csv")
+
+# CSV 中與已存數據比對的價格欄位
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+# 計算檔案雜湊時每次讀取的位元組數
+HASH_BLOCK_SIZE = 1 << 20
+
+# CSV 代號對應資料庫指數代號
+CSV_SYMBOL_MAP = {
+    'TXF1': 'TXF',
+    'TXF': 'TXF',
+    'DJI': 'DJI',
+    'NDX': 'NDX',
+    'SOX': 'SOXX',
+    'SOXX': 'SOXX'
+}
+
+CSV_DTYPES = {
+    'date': str,
+    'open': float,
+    'high': float,
+    'low': float,
+    'close': float,
+    'symbol': str
+}
+
+class UnifiedHistoryImporter:
+    """統一歷史CSV的分段串流匯入器（可續傳、可重複執行）"""
+
+    def __init__(self, db: HistoricalDatabase, csv_path: str = UNIFIED_CSV_PATH, chunk_size: int = 50000):
+        self.db = db
+        self.csv_path = csv_path
+        self.chunk_size = chunk_size
+        self.source = Path(csv_path).name
+
+    def run(self, force: bool = False) -> Dict:
+        """執行匯入；已完成且檔案內容未變動時直接略過，force=True 時清空後完整重新匯入
+
+        以 SHA-256 判斷檔案是否變動：只在尾端追加時從上次的列數續傳；內容被改寫（即使大小不變）時
+        從頭重新比對，與已存數據相同的列略過，不符的列（更正或亂序）寫入 quarantine_rows。
+        """
+        stat = os.stat(self.csv_path)
+        progress = self._load_progress()
+        file_hash, prefix_hash = _file_digests(self.csv_path, progress['file_size'] if progress else None)
+        summary = {'skipped': False, 'rows_read': 0, 'rows_written': 0, 'rows_skipped': 0,
+                   'rows_quarantined': 0, 'chunks': 0, 'seconds': 0.0, 'rows_per_second': 0}
+
+        if force:
+            self._reset()
+            progress = None
+        elif progress and progress['completed'] and progress['file_hash'] == file_hash:
+            print(f"✅ {self.source} 已匯入完成，略過")
+            summary['skipped'] = True
+            return summary
+        elif progress and prefix_hash != progress['file_hash']:
+            # 已匯入的部分被改寫，從頭比對（不清空既有數據）
+            print(f"⚠️ {self.source} 內容與上次匯入時不同，從頭重新比對")
+            progress = None
+
+        rows_done = progress['rows_done'] if progress else 0
+        byte_offset = progress['byte_offset'] if progress else None
+        if rows_done:
+            print(f"🔁 從第 {rows_done:,} 筆續傳匯入 {self.source}")
+        else:
+            print(f"📥 開始匯入 {self.source}")
+
+        states = {symbol: self.db.load_indicator_state(symbol) for symbol in SYMBOL_TABLES}
+        started = time.perf_counter()
+
+        for chunk, byte_offset in self._read_chunks(rows_done, byte_offset):
+            data, new_states, skipped, rejected = self._pivot_chunk(chunk, states)
+            rows_done += len(chunk)
+
+            def save_progress(conn: sqlite3.Connection, rows_done=rows_done, byte_offset=byte_offset,
+                              new_states=new_states, rejected=rejected):
+                for symbol, keys, arrays, result in rejected:
+                    self.db._handle_rejected(conn, self.source, symbol, 'day', keys, arrays, result)
+                for symbol, state in new_states.items():
+                    self.db._save_indicator_state(conn, symbol, state)
+                self._save_progress(conn, stat, file_hash, rows_done, byte_offset, completed=False)
+
+            if data:
+                # 已在計算指標前驗證過，寫入時不再重複驗證
+                ingest = self.db.bulk_insert(data, after_insert=save_progress, validate=False, source=self.source)
+                summary['rows_written'] += ingest['rows']
+            else:
+                with self.db._connections.write('import_progress') as conn:
+                    save_progress(conn)
+
+            states.update(new_states)
+            summary['rows_read'] += len(chunk)
+            summary['rows_skipped'] += skipped
+            summary['rows_quarantined'] += sum(len(result.rejected) for _, _, _, result in rejected)
+            summary['chunks'] += 1
+
+        with self.db._connections.write('import_progress') as conn:
+            self._save_progress(conn, stat, file_hash, rows_done, byte_offset, completed=True)
+
+        elapsed = time.perf_counter() - started
+        summary['seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['rows_read'] / elapsed) if elapsed > 0 else summary['rows_read']
+        print(f"✅ 匯入完成：讀取 {summary['rows_read']:,} 筆，寫入 {summary['rows_written']:,} 筆，"
+              f"略過 {summary['rows_skipped']:,} 筆，隔離 {summary['rows_quarantined']:,} 筆"
+              f"（{summary['rows_per_second']:,} 筆/秒）")
+        return summary
+
+    def _read_chunks(self, rows_done: int, byte_offset: Optional[int]) -> Iterator[Tuple[pd.DataFrame, int]]:
+        """逐段讀取 CSV，回傳 (分段, 分段結束的位元組位置)
+
+        續傳時直接 seek 到上次提交分段的結束位置；舊版進度只有列數時逐行略過（不保留內容，記憶體固定）。
+        """
+        with open(self.csv_path, 'rb') as f:
+            names = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns.tolist()
+            if byte_offset:
+                f.seek(byte_offset)
+            else:
+                for _ in range(rows_done):
+                    if not f.readline():
+                        break
+            while True:
+                lines = list(itertools.islice(f, self.chunk_size))
+                if not lines:
+                    return
+                chunk = pd.read_csv(io.BytesIO(b''.join(lines)), header=None, names=names, dtype=CSV_DTYPES)
+                yield chunk, f.tell()
+
+    def _pivot_chunk(self, chunk: pd.DataFrame, states: Dict[str, IndicatorState]) -> Tuple[Dict, Dict, int, List]:
+        """將長格式分段轉為各指數的欄位式數據，驗證後延續計算技術指標
+
+        回傳 (數據, 新指標狀態, 略過筆數, 未通過驗證的列)；未通過的列不參與指標計算。
+        不晚於已匯入最後日期的列與資料庫中的數據比對：相同時略過，不符或缺少時以 out_of_order 隔離。
+        """
+        chunk = chunk.assign(symbol=chunk['symbol'].str.strip().str.upper().map(CSV_SYMBOL_MAP))
+        valid = chunk.dropna(subset=['symbol', 'date'])
+        skipped = len(chunk) - len(valid)
+
+        data = {}
+        new_states = {}
+        rejected = []
+        for symbol, group in valid.groupby('symbol', sort=False):
+            group = group.assign(date=group['date'].str.slice(0, 10))
+
+            # 已匯入過的日期不再重算（重複執行時保持冪等），與已存數據不符的列隔離
+            state = states[symbol]
+            if state.last_date is not None:
+                fresh = group['date'] > state.last_date
+                older = group[~fresh]
+                if not older.empty:
+                    keys = _day_numbers(older['date'])
+                    arrays = {column: older[column].to_numpy() for column in PRICE_COLUMNS if column in older}
+                    matches = self._matches_stored(symbol, keys, arrays)
+                    skipped += int(matches.sum())
+                    if not matches.all():
+                        rejected.append((symbol, keys, arrays, flagged_result(np.where(matches, 0, OUT_OF_ORDER))))
+                group = group[fresh]
+            if group.empty:
+                continue
+
+            keys = _day_numbers(group['date'])
+            arrays = {column: group[column].to_numpy() for column in PRICE_COLUMNS if column in group}
+            result = validate_bars(keys, arrays, states[symbol].last_close)
+            if len(result.rejected):
+                rejected.append((symbol, keys, arrays, result))
+            group = group.iloc[result.accepted]
+            if group.empty:
+                continue
+
+            indicators, new_state = compute_indicators(group['close'].to_numpy(), state)
+            new_state.last_date = group['date'].iloc[-1]
+
+            frame = {'date': group['date'].to_numpy()}
+            for column in TABLE_COLUMNS[SYMBOL_TABLES[symbol]]:
+                if column in indicators:
+                    frame[column] = indicators[column]
+                elif column in group:
+                    frame[column] = group[column].to_numpy()
+            data[symbol] = frame
+            new_states[symbol] = new_state
+
+        return data, new_states, skipped, rejected
+
+    def _matches_stored(self, symbol: str, keys: np.ndarray, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+        """各列是否已存在於資料庫且價格欄位相同（空值視為相同）"""
+        table_name = SYMBOL_TABLES[symbol]
+        columns = [column for column in arrays if column in TABLE_COLUMNS[table_name]]
+        with self.db._connections.read('import_compare') as conn:
+            stored = pd.read_sql_query(
+                f"SELECT day, {', '.join(columns)} FROM {table_name} WHERE day BETWEEN ? AND ?",
+                conn, params=(int(keys.min()), int(keys.max())), index_col='day'
+            )
+        matches = np.isin(keys, stored.index.to_numpy())
+        stored = stored.reindex(keys)
+        for column in columns:
+            expected = stored[column].to_numpy(dtype=float)
+            matches &= np.isclose(arrays[column], expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+        return matches
+
+    def _load_progress(self) -> Optional[Dict]:
+        """讀取此來源檔案的匯入進度"""
+        with self.db._connections.read('import_progress') as conn:
+            row = conn.execute(
+                "SELECT file_size, file_mtime, file_hash, rows_done, byte_offset, completed "
+                "FROM import_progress WHERE source = ?",
+                (self.source,)
+            ).fetchone()
+        if not row:
+            return None
+        return {'file_size': row[0], 'file_mtime': row[1], 'file_hash': row[2], 'rows_done': row[3],
+                'byte_offset': row[4], 'completed': bool(row[5])}
+
+    def _save_progress(self, conn: sqlite3.Connection, stat: os.stat_result, file_hash: str, rows_done: int,
+                       byte_offset: Optional[int], completed: bool):
+        """在既有交易內保存匯入進度"""
+        conn.execute('''
+            INSERT OR REPLACE INTO import_progress
+            (source, file_size, file_mtime, file_hash, rows_done, byte_offset, completed, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (self.source, stat.st_size, stat.st_mtime, file_hash, rows_done, byte_offset, int(completed),
+              datetime.now().isoformat()))
+
+    def _reset(self):
+        """清空歷史表格、指標狀態與匯入進度，準備完整重新匯入"""
+        with self.db._connections.write('import_reset') as conn:
+            for table_name in SYMBOL_TABLES.values():
+                conn.execute(f"DELETE FROM {table_name}")
+                self.db._clear_table_statistics(conn, table_name)
+            conn.execute("DELETE FROM indicator_state")
+            conn.execute("DELETE FROM import_progress WHERE source = ?", (self.source,))
+
+def _file_digests(path: str, prefix_size: Optional[int]) -> Tuple[str, Optional[str]]:
+    """串流計算檔案的 SHA-256，以及前 prefix_size 位元組的 SHA-256（判斷是否只在尾端追加）"""
+    digest = hashlib.sha256()
+    prefix_hash = None
+    remaining = prefix_size
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE if remaining is None or remaining <= 0 else min(HASH_BLOCK_SIZE, remaining))
+            if remaining is not None and remaining > 0:
+                remaining -= len(block)
+            digest.update(block)
+            if remaining == 0 and prefix_hash is None:
+                prefix_hash = digest.hexdigest()
+            if not block:
+                break
+    return digest.hexdigest(), prefix_hash
+
+def import_unified_csv(db: Optional[HistoricalDatabase] = None, csv_path: str = UNIFIED_CSV_PATH,
+                       force: bool = False) -> Dict:
+    """匯入統一歷史CSV到歷史資料庫"""
+    db = db or HistoricalDatabase()
+    return UnifiedHistoryImporter(db, csv_path).run(force=force)
+
+if __name__ == "__main__":
+    import_unified_csv()
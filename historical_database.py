@@ -1,15 +1,212 @@
 import json
+import threading
+import time
+import uuid
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional, Union
 import sqlite3
+from collections import OrderedDict
 from pathlib import Path
+from technical_indicators import INDICATOR_COLUMNS, IndicatorState, compute_indicators
+from history_snapshot import HistorySnapshot, write_snapshot
+from db_connection import ConnectionManager
+from data_quality import ValidationResult, validate_bars
+from trading_calendar import SYMBOL_MARKETS, TradingCalendar
+from rolling_stats import LOOKBACK_ROWS, ROLLING_STAT_COLUMNS, STAT_WINDOWS, compute_rolling_stats
+from percentile_index import SlidingPercentileIndex
+
+# 指數代號與歷史表格對應
+SYMBOL_TABLES = {
+    'TXF': 'txf_history',
+    'DJI': 'dji_history',
+    'NDX': 'ndx_history',
+    'SOXX': 'soxx_history'
+}
+
+# 各歷史表格的數據欄位（不含日期）
+TABLE_COLUMNS = {
+    'txf_history': ['open', 'high', 'low', 'close', 'volume', 'macd', 'signal', 'histogram', 'rsi', 'rsi_ma'],
+    'dji_history': ['close', 'macd', 'signal', 'histogram', 'rsi', 'rsi_ma'],
+    'ndx_history': ['close', 'macd', 'signal', 'histogram', 'rsi', 'rsi_ma'],
+    'soxx_history': ['close', 'macd', 'signal', 'histogram', 'rsi', 'rsi_ma']
+}
+
+# 歷史表格的欄位型別（未列出者為 REAL）
+COLUMN_TYPES = {'volume': 'INTEGER'}
+
+# 歷史表格的覆蓋索引（day 之外的欄位投影）
+COVERING_INDEXES = {
+    'txf_history': [('close', 'volume')],
+    'dji_history': [('close',)],
+    'ndx_history': [('close',)],
+    'soxx_history': [('close',)]
+}
+
+# 資料庫結構版本（PRAGMA user_version）
+SCHEMA_VERSION = 13
+
+# 盤中K棒的時間週期（秒）
+TIMEFRAMES = {
+    '1m': 60,
+    '5m': 300,
+    '15m': 900,
+    '60m': 3600,
+    '1d': 86400
+}
+
+# 各指數交易所的 UTC 時差（小時，未處理夏令時間），用於日線與整點切分
+EXCHANGE_UTC_OFFSETS = {
+    'TXF': 8,
+    'DJI': -5,
+    'NDX': -5,
+    'SOXX': -5
+}
+
+ColumnarData = Union[pd.DataFrame, Dict[str, np.ndarray]]
+
+class LRUCache:
+    """執行緒安全的簡易LRU快取"""
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RefreshingValue:
+    """TTL 快取的單一數值：首次取用時同步載入，過期後先回傳舊值並在背景執行緒重新載入
+    
+    指定 version 時，版本（例如數據版本）與載入時不同也視為過期，同樣在背景重新載入；
+    指定 initial 時首次取用改以 initial 同步載入（例如只讀取上次建好的結果），並立即在背景以 loader 更新。
+    首次載入失敗時使用 fallback 的結果；背景重新載入失敗則保留舊值。兩者都在下一個 TTL 到期後重試。
+    """
+    
+    def __init__(self, loader: Callable[[], object], ttl: float, fallback: Optional[Callable[[], object]] = None,
+                 name: str = "refresh", version: Optional[Callable[[], object]] = None,
+                 initial: Optional[Callable[[], object]] = None):
+        self.loader = loader
+        self.ttl = ttl
+        self.fallback = fallback
+        self.name = name
+        self.version = version
+        self.initial = initial
+        self._value = None
+        self._version = None
+        self._loaded_at: Optional[float] = None
+        self._refreshing = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+    
+    def get(self):
+        current = self._current_version()
+        with self._lock:
+            loaded_at = self._loaded_at
+            if loaded_at is not None:
+                if time.monotonic() - loaded_at >= self.ttl or current != self._version:
+                    self._start_refresh()
+                return self._value
+        
+        # 首次取用：同一時間只載入一次，其他執行緒等待結果
+        with self._load_lock:
+            if self._loaded_at is None:
+                try:
+                    value = (self.initial or self.loader)()
+                except Exception as e:
+                    if self.fallback is None:
+                        raise
+                    print(f"⚠️ {self.name} 載入失敗，使用預設值: {e}")
+                    value = self.fallback()
+                self._store(value, current)
+                if self.initial is not None:
+                    with self._lock:
+                        self._start_refresh()
+            return self._value
+    
+    def set(self, value):
+        """直接設定數值（重新起算 TTL，視為目前版本）"""
+        self._store(value, self._current_version())
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待進行中的背景更新完成（批次作業或測試需要最新結果時使用），回傳是否已無進行中的更新"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self._refreshing
+    
+    def _current_version(self):
+        return self.version() if self.version is not None else None
+    
+    def _store(self, value, version):
+        with self._lock:
+            self._value = value
+            self._version = version
+            self._loaded_at = time.monotonic()
+    
+    def _start_refresh(self):
+        """（持有 _lock 時呼叫）尚未在更新時啟動背景更新"""
+        if not self._refreshing:
+            self._refreshing = True
+            self._thread = threading.Thread(target=self._refresh, name=f"{self.name}-refresh", daemon=True)
+            self._thread.start()
+    
+    def _refresh(self):
+        # 先取得版本再載入：載入期間數據又有變動時，下次取用會再更新一次
+        version = self._version
+        try:
+            version = self._current_version()
+            self._store(self.loader(), version)
+        except Exception as e:
+            print(f"⚠️ {self.name} 背景更新失敗，沿用舊值: {e}")
+            with self._lock:
+                # 同一版本不立即重試，等下一個 TTL 到期
+                self._version = version
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refreshing = False
 
 class HistoricalDatabase:
-    def __init__(self, db_path: str = "data/historical_futures.db"):
+    # 程序內共用的結果快取（鍵包含資料庫路徑與數據版本，寫入後自動失效）
+    _result_cache = LRUCache(maxsize=256)
+    
+    # 程序內共用的滑動百分位索引：(資料庫, 指數, 欄位, K棒數) -> (索引, 數據版本)，append_bars 追加尾段時直接更新
+    _percentile_indexes: Dict[Tuple[str, str, str, int], Tuple[SlidingPercentileIndex, int]] = {}
+    _percentile_lock = threading.Lock()
+    
+    def __init__(self, db_path: str = "data/historical_futures.db", snapshot_dir: Optional[str] = None):
         self.db_path = db_path
+        # 快照預設放在資料庫專屬目錄（<檔名>.snapshots），同目錄的多個資料庫互不共用
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else Path(db_path).with_name(f"{Path(db_path).stem}.snapshots")
+        self.last_ingest_stats: Optional[Dict] = None
+        self.last_validation_report: Dict[str, Dict] = {}
+        self._snapshots: Dict[str, HistorySnapshot] = {}
+        self._cache_namespace = str(Path(db_path).resolve())
+        # get_historical_data 未指定週期時使用（'1d' 為日線，可改為 '5m' 等盤中週期）
+        self.default_timeframe = '1d'
         self.ensure_database_exists()
+        self._connections = ConnectionManager.for_path(db_path)
+        self.database_id = self._read_database_id()
         
     def ensure_database_exists(self):
         """確保資料庫存在並創建必要的表格"""
@@ -18,77 +215,357 @@ class HistoricalDatabase:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            # 創建台指期貨歷史數據表
+            # 新資料庫在建表前套用較大的頁面大小
+            cursor.execute("PRAGMA page_size = 8192")
+            
+            # 創建相關性分析表
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS txf_history (
-                    date TEXT PRIMARY KEY,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume INTEGER,
-                    macd REAL,
-                    signal REAL,
-                    histogram REAL,
-                    rsi REAL,
-                    rsi_ma REAL
+                CREATE TABLE IF NOT EXISTS correlation_analysis (
+                    date_from TEXT,
+                    date_to TEXT,
+                    dji_txf_correlation REAL,
+                    ndx_txf_correlation REAL,
+                    soxx_txf_correlation REAL,
+                    created_at TEXT,
+                    PRIMARY KEY (date_from, date_to)
                 )
             ''')
             
-            # 創建道瓊指數歷史數據表
+            # 創建歷史數據版本表（每次寫入歷史表格時遞增，供快照與快取判斷是否過期）
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS dji_history (
-                    date TEXT PRIMARY KEY,
-                    close REAL,
-                    macd REAL,
-                    signal REAL,
-                    histogram REAL,
-                    rsi REAL,
-                    rsi_ma REAL
+                CREATE TABLE IF NOT EXISTS history_metadata (
+                    table_name TEXT PRIMARY KEY,
+                    data_version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT
                 )
             ''')
             
-            # 創建納指歷史數據表
+            # 創建指標延續狀態表（分段匯入與追加寫入用）
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS ndx_history (
-                    date TEXT PRIMARY KEY,
-                    close REAL,
-                    macd REAL,
-                    signal REAL,
-                    histogram REAL,
-                    rsi REAL,
-                    rsi_ma REAL
+                CREATE TABLE IF NOT EXISTS indicator_state (
+                    symbol TEXT PRIMARY KEY,
+                    last_date TEXT,
+                    state TEXT,
+                    updated_at TEXT
                 )
             ''')
             
-            # 創建半導體指數歷史數據表
+            # 創建匯入進度表（可續傳匯入用）
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS soxx_history (
-                    date TEXT PRIMARY KEY,
-                    close REAL,
-                    macd REAL,
-                    signal REAL,
-                    histogram REAL,
-                    rsi REAL,
-                    rsi_ma REAL
+                CREATE TABLE IF NOT EXISTS import_progress (
+                    source TEXT PRIMARY KEY,
+                    file_size INTEGER,
+                    file_mtime REAL,
+                    rows_done INTEGER,
+                    completed INTEGER,
+                    updated_at TEXT
                 )
             ''')
             
-            # 創建相關性分析表
+            # 創建衍生數據版本表（記錄衍生表格是由哪個數據版本計算而來）
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS correlation_analysis (
-                    date_from TEXT,
-                    date_to TEXT,
-                    dji_txf_correlation REAL,
-                    ndx_txf_correlation REAL,
-                    soxx_txf_correlation REAL,
-                    created_at TEXT,
-                    PRIMARY KEY (date_from, date_to)
+                CREATE TABLE IF NOT EXISTS derived_versions (
+                    name TEXT PRIMARY KEY,
+                    source_version INTEGER,
+                    built_at TEXT
                 )
             ''')
             
+            # 歷史表格結構版本遷移（舊資料庫保留數據轉換）
+            self._migrate_schema(conn)
+            
+            # 相關性快取欄位（舊資料庫補上）
+            existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(correlation_analysis)")}
+            for column, column_type in (('data_version', 'INTEGER'), ('data_points', 'INTEGER'), ('full_matrix', 'TEXT')):
+                if column not in existing_columns:
+                    cursor.execute(f"ALTER TABLE correlation_analysis ADD COLUMN {column} {column_type}")
+            
             conn.commit()
     
+    def _migrate_schema(self, conn: sqlite3.Connection):
+        """依 PRAGMA user_version 逐版套用歷史表格的結構遷移"""
+        conn.commit()
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None
+        try:
+            # 多個程序同時開啟時，只有取得寫入鎖的那個執行遷移
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < 1:
+                    self._migrate_integer_days(conn)
+                if version < 2:
+                    self._migrate_intraday_bars(conn)
+                if version < 3:
+                    self._migrate_table_statistics(conn)
+                if version < 4:
+                    self._migrate_quarantine(conn)
+                if version < 5:
+                    self._migrate_ingestion_log(conn)
+                if version < 6:
+                    self._migrate_rolling_stats(conn)
+                if version < 7:
+                    self._migrate_seasonal_effects(conn)
+                if version < 8:
+                    self._migrate_component_effectiveness(conn)
+                if version < 9:
+                    self._migrate_database_id(conn)
+                if version < 10:
+                    self._migrate_ingestion_generation(conn)
+                if version < 11:
+                    self._migrate_rolling_correlations(conn)
+                if version < 12:
+                    self._migrate_import_hash(conn)
+                if version < 13:
+                    self._migrate_import_offset(conn)
+                if version < SCHEMA_VERSION:
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.isolation_level = isolation_level
+    
+    @staticmethod
+    def _migrate_integer_days(conn: sqlite3.Connection):
+        """版本1：日期由 TEXT 主鍵改為整數日序（1970-01-01 起算），並建立覆蓋索引"""
+        for table_name, columns in TABLE_COLUMNS.items():
+            existing_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+            legacy = 'date' in existing_columns
+            if legacy:
+                conn.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_legacy")
+            
+            column_definitions = ",\n".join(
+                f"                    {column} {COLUMN_TYPES.get(column, 'REAL')}" for column in columns
+            )
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table_name} (
+                    day INTEGER PRIMARY KEY,
+{column_definitions}
+                )
+            ''')
+            
+            if legacy:
+                copied = [column for column in columns if column in existing_columns]
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO {table_name} (day, {', '.join(copied)})
+                    SELECT CAST(ROUND(julianday(substr(date, 1, 10)) - 2440587.5) AS INTEGER), {', '.join(copied)}
+                    FROM {table_name}_legacy
+                    WHERE julianday(substr(date, 1, 10)) IS NOT NULL
+                ''')
+                conn.execute(f"DROP TABLE {table_name}_legacy")
+                print(f"🔧 {table_name} 已遷移為整數日期主鍵")
+            
+            # 常用欄位投影（對齊查詢、收盤價序列）只需讀取索引頁
+            for projection in COVERING_INDEXES.get(table_name, ()):
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table_name}_day_{'_'.join(projection)} "
+                    f"ON {table_name} (day, {', '.join(projection)})"
+                )
+    
+    @staticmethod
+    def _migrate_intraday_bars(conn: sqlite3.Connection):
+        """版本2：新增盤中分K表（UTC epoch 秒，指數+時間為叢集主鍵，區間查詢免回表）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS intraday_bars (
+                symbol TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume INTEGER,
+                PRIMARY KEY (symbol, ts)
+            ) WITHOUT ROWID
+        ''')
+    
+    @staticmethod
+    def _migrate_table_statistics(conn: sqlite3.Connection):
+        """版本3：history_metadata 增加筆數與鍵值範圍，寫入時同步維護（統計查詢免掃表）"""
+        existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(history_metadata)")}
+        for column in ('row_count', 'min_key', 'max_key'):
+            if column not in existing_columns:
+                conn.execute(f"ALTER TABLE history_metadata ADD COLUMN {column} INTEGER")
+        
+        # 既有數據一次性回填
+        now = datetime.now().isoformat()
+        for table_name in TABLE_COLUMNS:
+            count, min_key, max_key = conn.execute(f"SELECT COUNT(*), MIN(day), MAX(day) FROM {table_name}").fetchone()
+            conn.execute('''
+                INSERT INTO history_metadata (table_name, data_version, updated_at, row_count, min_key, max_key)
+                VALUES (?, 0, ?, ?, ?, ?)
+                ON CONFLICT(table_name) DO UPDATE SET
+                    row_count = excluded.row_count, min_key = excluded.min_key, max_key = excluded.max_key
+            ''', (table_name, now, count, min_key, max_key))
+        
+        # 盤中分K改為每個指數一筆（版本與統計皆以 intraday_bars:<指數> 為鍵）
+        conn.execute("DELETE FROM history_metadata WHERE table_name = 'intraday_bars'")
+        for symbol, count, min_key, max_key in conn.execute(
+            "SELECT symbol, COUNT(*), MIN(ts), MAX(ts) FROM intraday_bars GROUP BY symbol"
+        ).fetchall():
+            conn.execute('''
+                INSERT OR REPLACE INTO history_metadata (table_name, data_version, updated_at, row_count, min_key, max_key)
+                VALUES (?, 1, ?, ?, ?, ?)
+            ''', (_intraday_metadata_key(symbol), now, count, min_key, max_key))
+    
+    @staticmethod
+    def _migrate_quarantine(conn: sqlite3.Connection):
+        """版本4：新增資料驗證隔離表（未通過驗證的原始列與原因）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS quarantine_rows (
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                symbol TEXT,
+                key_type TEXT,
+                row_key INTEGER,
+                reason TEXT,
+                payload TEXT,
+                created_at TEXT
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_quarantine_rows_symbol ON quarantine_rows (symbol, reason)")
+    
+    @staticmethod
+    def _migrate_ingestion_log(conn: sqlite3.Connection):
+        """版本5：新增寫入佇列進度表（各暫存佇列已寫入的最大批次編號）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_log (
+                spool TEXT PRIMARY KEY,
+                last_batch_id INTEGER NOT NULL,
+                updated_at TEXT
+            )
+        ''')
+    
+    @classmethod
+    def _migrate_rolling_stats(cls, conn: sqlite3.Connection):
+        """版本6：新增每日滾動統計表（情緒分析輸入的 as-of 查詢），並由既有歷史回填"""
+        stat_columns = ",\n".join(f"                {column} REAL" for column in ROLLING_STAT_COLUMNS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS rolling_stats (
+                symbol TEXT NOT NULL,
+                day INTEGER NOT NULL,
+{stat_columns},
+                PRIMARY KEY (symbol, day)
+            ) WITHOUT ROWID
+        ''')
+        for symbol in SYMBOL_TABLES:
+            cls._update_rolling_stats(conn, symbol)
+    
+    @staticmethod
+    def _migrate_seasonal_effects(conn: sqlite3.Connection):
+        """版本7：新增季節性效應表（月份、星期、距結算日的平均漲跌與顯著性，依數據版本重建）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS seasonal_effects (
+                symbol TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                sample_count INTEGER,
+                mean_move REAL,
+                std_move REAL,
+                excess_move REAL,
+                t_stat REAL,
+                p_value REAL,
+                PRIMARY KEY (symbol, dimension, bucket)
+            ) WITHOUT ROWID
+        ''')
+    
+    @staticmethod
+    def _migrate_component_effectiveness(conn: sqlite3.Connection):
+        """版本8：新增預測元件有效性表（walk-forward 重播的滾動方向命中率與誤差）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS component_effectiveness (
+                component TEXT NOT NULL,
+                window_size INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                samples INTEGER,
+                hit_rate REAL,
+                mean_abs_error REAL,
+                PRIMARY KEY (component, window_size, day)
+            ) WITHOUT ROWID
+        ''')
+    
+    @staticmethod
+    def _migrate_database_id(conn: sqlite3.Connection):
+        """版本9：history_metadata 增加 value 欄位並寫入資料庫識別碼（UUID，快照據此判斷來源資料庫）"""
+        existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(history_metadata)")}
+        if 'value' not in existing_columns:
+            conn.execute("ALTER TABLE history_metadata ADD COLUMN value TEXT")
+        conn.execute(
+            "INSERT OR IGNORE INTO history_metadata (table_name, data_version, updated_at, value) VALUES (?, 0, ?, ?)",
+            ('database_id', datetime.now().isoformat(), uuid.uuid4().hex)
+        )
+    
+    @staticmethod
+    def _migrate_ingestion_generation(conn: sqlite3.Connection):
+        """版本10：寫入佇列進度改以佇列世代（暫存檔內的 UUID）為鍵，暫存檔重建後批次編號重新起算也不會誤判
+
+        舊版以路徑記錄的進度轉為 'path:<路徑>' 世代，由升級前既有的暫存檔沿用。
+        """
+        conn.execute("ALTER TABLE ingestion_log RENAME TO ingestion_log_v5")
+        conn.execute('''
+            CREATE TABLE ingestion_log (
+                generation TEXT PRIMARY KEY,
+                spool TEXT,
+                last_batch_id INTEGER NOT NULL,
+                updated_at TEXT
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO ingestion_log (generation, spool, last_batch_id, updated_at)
+            SELECT 'path:' || spool, spool, last_batch_id, updated_at FROM ingestion_log_v5
+        ''')
+        conn.execute("DROP TABLE ingestion_log_v5")
+    
+    @staticmethod
+    def _migrate_rolling_correlations(conn: sqlite3.Connection):
+        """版本11：滾動相關性表的日期由 TEXT 改為整數日序（與歷史表格相同），保留已計算的結果"""
+        existing_columns = [row[1] for row in conn.execute("PRAGMA table_info(rolling_correlations)")]
+        legacy = 'date' in existing_columns
+        if legacy:
+            conn.execute("ALTER TABLE rolling_correlations RENAME TO rolling_correlations_legacy")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rolling_correlations (
+                day INTEGER NOT NULL,
+                window_size INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                correlation REAL,
+                beta REAL,
+                ratio REAL,
+                PRIMARY KEY (window_size, symbol, day)
+            ) WITHOUT ROWID
+        ''')
+        if legacy:
+            conn.execute('''
+                INSERT OR REPLACE INTO rolling_correlations (day, window_size, symbol, correlation, beta, ratio)
+                SELECT CAST(ROUND(julianday(substr(date, 1, 10)) - 2440587.5) AS INTEGER),
+                       window_size, symbol, correlation, beta, ratio
+                FROM rolling_correlations_legacy
+                WHERE julianday(substr(date, 1, 10)) IS NOT NULL
+            ''')
+            conn.execute("DROP TABLE rolling_correlations_legacy")
+            print("🔧 rolling_correlations 已遷移為整數日期主鍵")
+    
+    @staticmethod
+    def _migrate_import_hash(conn: sqlite3.Connection):
+        """版本12：匯入進度記錄來源檔案的 SHA-256（以內容而非大小與修改時間判斷檔案是否改寫）"""
+        existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(import_progress)")}
+        if 'file_hash' not in existing_columns:
+            conn.execute("ALTER TABLE import_progress ADD COLUMN file_hash TEXT")
+    
+    @staticmethod
+    def _migrate_import_offset(conn: sqlite3.Connection):
+        """版本13：匯入進度記錄最後提交分段的結束位元組位置（續傳時直接 seek，不逐列略過）"""
+        existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(import_progress)")}
+        if 'byte_offset' not in existing_columns:
+            conn.execute("ALTER TABLE import_progress ADD COLUMN byte_offset INTEGER")
+    
+    def _read_database_id(self) -> str:
+        """讀取資料庫識別碼（建立資料庫時產生，刪除後重新匯入即為新的識別碼）"""
+        with self._connections.read('database_id') as conn:
+            row = conn.execute("SELECT value FROM history_metadata WHERE table_name = 'database_id'").fetchone()
+        return row[0]
+    
     def insert_sample_data(self):
         """插入樣本歷史數據（模擬近10年數據）"""
         print("📊 正在生成近10年歷史數據樣本...")
@@ -120,31 +597,6 @@ class HistoricalDatabase:
             ndx_price = ndx_base * trend_factor * (1 + daily_volatility * 1.2)
             soxx_price = soxx_base * trend_factor * (1 + daily_volatility * 1.5)
             
-            # 生成技術指標（模擬）
-            rsi_txf = 50 + np.random.normal(0, 20)
-            rsi_dji = 50 + np.random.normal(0, 15)
-            rsi_ndx = 50 + np.random.normal(0, 18)
-            rsi_soxx = 50 + np.random.normal(0, 25)
-            
-            # 限制RSI範圍
-            rsi_txf = max(10, min(90, rsi_txf))
-            rsi_dji = max(10, min(90, rsi_dji))
-            rsi_ndx = max(10, min(90, rsi_ndx))
-            rsi_soxx = max(10, min(90, rsi_soxx))
-            
-            # MACD指標
-            macd_txf = np.random.normal(0, 50)
-            histogram_txf = np.random.normal(0, 20)
-            
-            macd_dji = np.random.normal(0, 200)
-            histogram_dji = np.random.normal(0, 50)
-            
-            macd_ndx = np.random.normal(0, 300)
-            histogram_ndx = np.random.normal(0, 80)
-            
-            macd_soxx = np.random.normal(0, 5)
-            histogram_soxx = np.random.normal(0, 2)
-            
             # 成交量（TXF）
             volume = int(np.random.normal(60000, 15000))
             volume = max(20000, volume)
@@ -156,36 +608,16 @@ class HistoricalDatabase:
                     'high': round(txf_price * 1.01, 0),
                     'low': round(txf_price * 0.99, 0),
                     'close': round(txf_price, 0),
-                    'volume': volume,
-                    'macd': round(macd_txf, 2),
-                    'signal': round(macd_txf - histogram_txf, 2),
-                    'histogram': round(histogram_txf, 2),
-                    'rsi': round(rsi_txf, 2),
-                    'rsi_ma': round(rsi_txf, 2)
+                    'volume': volume
                 },
                 'dji': {
-                    'close': round(dji_price, 1),
-                    'macd': round(macd_dji, 2),
-                    'signal': round(macd_dji - histogram_dji, 2),
-                    'histogram': round(histogram_dji, 2),
-                    'rsi': round(rsi_dji, 2),
-                    'rsi_ma': round(rsi_dji, 2)
+                    'close': round(dji_price, 1)
                 },
                 'ndx': {
-                    'close': round(ndx_price, 2),
-                    'macd': round(macd_ndx, 2),
-                    'signal': round(macd_ndx - histogram_ndx, 2),
-                    'histogram': round(histogram_ndx, 2),
-                    'rsi': round(rsi_ndx, 2),
-                    'rsi_ma': round(rsi_ndx, 2)
+                    'close': round(ndx_price, 2)
                 },
                 'soxx': {
-                    'close': round(soxx_price, 2),
-                    'macd': round(macd_soxx, 2),
-                    'signal': round(macd_soxx - histogram_soxx, 2),
-                    'histogram': round(histogram_soxx, 2),
-                    'rsi': round(rsi_soxx, 2),
-                    'rsi_ma': round(rsi_soxx, 2)
+                    'close': round(soxx_price, 2)
                 }
             }
             
@@ -196,100 +628,716 @@ class HistoricalDatabase:
             if current_date.weekday() >= 5:
                 current_date += timedelta(days=2)
         
-        # 批次插入數據
-        self._batch_insert_data(data_points)
+        # 批次插入數據（技術指標由收盤價推導）
+        self._batch_insert_data(data_points, derive_indicators=True)
         print(f"✅ 已生成 {len(data_points)} 個交易日的歷史數據")
     
-    def _batch_insert_data(self, data_points: List[Dict]):
-        """批次插入歷史數據"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+    def _batch_insert_data(self, data_points: List[Dict], derive_indicators: bool = False):
+        """批次插入歷史數據（轉為欄位式後交由大量寫入，可由收盤價推導技術指標）"""
+        if not data_points:
+            return
+        
+        dates = [data['date'] for data in data_points]
+        columnar = {}
+        for symbol, table_name in SYMBOL_TABLES.items():
+            key = symbol.lower()
+            columnar[symbol] = {'date': dates}
+            for column in TABLE_COLUMNS[table_name]:
+                columnar[symbol][column] = [data[key].get(column) for data in data_points]
+        
+        states = {}
+        if derive_indicators:
+            for symbol, frame in columnar.items():
+                indicators, state = compute_indicators(np.asarray(frame['close'], dtype=float))
+                state.last_date = dates[-1]
+                frame.update({column: np.round(values, 2) for column, values in indicators.items()})
+                states[symbol] = state
+        
+        def save_states(conn: sqlite3.Connection):
+            for symbol, state in states.items():
+                self._save_indicator_state(conn, symbol, state)
+        
+        self.bulk_insert(columnar, after_insert=save_states if states else None)
+    
+    def bulk_insert(self, data: Dict[str, ColumnarData],
+                    after_insert: Optional[Callable[[sqlite3.Connection], None]] = None,
+                    validate: bool = True, source: str = 'bulk_insert') -> Dict:
+        """以單一交易大量寫入多個指數的欄位式歷史數據
+        
+        data 的鍵為指數代號（TXF/DJI/NDX/SOXX），值為含 date 欄位的 DataFrame
+        或「欄位名稱 -> NumPy 陣列」字典；缺少的欄位以 NULL 寫入。
+        validate 為 True 時先經資料驗證，未通過的列寫入 quarantine_rows（呼叫端已驗證時可關閉）。
+        after_insert 會在同一交易內執行，用於一併保存匯入進度或指標狀態。
+        回傳寫入筆數、耗時與每秒寫入筆數。
+        """
+        started = time.perf_counter()
+        per_symbol = {}
+        
+        with self._connections.write('bulk_insert') as conn:
+            for symbol, frame in data.items():
+                per_symbol[symbol.upper()] = self._insert_columnar(conn, symbol, frame, validate, source)
+            if after_insert is not None:
+                after_insert(conn)
+        
+        elapsed = time.perf_counter() - started
+        total_rows = sum(per_symbol.values())
+        stats = {
+            'rows': total_rows,
+            'seconds': round(elapsed, 4),
+            'rows_per_second': round(total_rows / elapsed) if elapsed > 0 else total_rows,
+            'per_symbol': per_symbol
+        }
+        self.last_ingest_stats = stats
+        print(f"⚡ 大量寫入 {total_rows:,} 筆，耗時 {elapsed:.3f} 秒（{stats['rows_per_second']:,} 筆/秒）")
+        return stats
+    
+    def _insert_columnar(self, conn: sqlite3.Connection, symbol: str, frame: ColumnarData,
+                         validate: bool = True, source: str = 'bulk_insert') -> int:
+        """以 executemany 寫入單一指數的欄位式數據（可先經資料驗證），回傳寫入筆數"""
+        table_name = SYMBOL_TABLES.get(symbol.upper())
+        if not table_name:
+            raise ValueError(f"不支持的指數: {symbol}")
+        if 'day' in frame:
+            days = np.asarray(frame['day'], dtype=np.int64)
+        elif 'date' in frame:
+            days = _day_numbers(frame['date'])
+        else:
+            raise ValueError(f"{symbol} 數據缺少 date 欄位")
+        if len(days) == 0:
+            return 0
+        
+        columns = TABLE_COLUMNS[table_name]
+        arrays = {column: _as_array(frame[column]) for column in columns if column in frame}
+        if validate:
+            result = validate_bars(days, arrays, self._previous_close(conn, table_name, int(days.min())))
+            self._handle_rejected(conn, source, symbol, 'day', days, arrays, result)
+            days = days[result.accepted]
+            arrays = {column: values[result.accepted] for column, values in arrays.items()}
+        
+        row_count = len(days)
+        if row_count == 0:
+            return 0
+        days = days.tolist()
+        values = [days] + [_column_values(arrays.get(column), row_count) for column in columns]
+        
+        # 以寫入前後鍵值區間內的筆數差維護總筆數（走覆蓋索引，只掃受影響區間）
+        min_key, max_key = min(days), max(days)
+        count_query = f"SELECT COUNT(*) FROM {table_name} WHERE day BETWEEN ? AND ?"
+        before = conn.execute(count_query, (min_key, max_key)).fetchone()[0]
+        
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table_name} (day, {', '.join(columns)}) VALUES ({placeholders})",
+            zip(*values)
+        )
+        after = conn.execute(count_query, (min_key, max_key)).fetchone()[0]
+        self._bump_data_version(conn, table_name, after - before, min_key, max_key)
+        self._update_rolling_stats(conn, symbol, min_key)
+        return row_count
+    
+    @staticmethod
+    def _previous_close(conn: sqlite3.Connection, table_name: str, day: int) -> Optional[float]:
+        """指定日序之前最後一筆收盤價（驗證價格跳動的基準）"""
+        row = conn.execute(
+            f"SELECT close FROM {table_name} WHERE day < ? ORDER BY day DESC LIMIT 1", (day,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def _handle_rejected(self, conn: sqlite3.Connection, source: str, symbol: str, key_type: str,
+                         keys: np.ndarray, arrays: Dict[str, np.ndarray], result: ValidationResult):
+        """在既有交易內將未通過驗證的列寫入 quarantine_rows，並更新驗證報告"""
+        symbol = symbol.upper()
+        summary = dict(result.summary, source=source)
+        self.last_validation_report[symbol] = summary
+        if not len(result.rejected):
+            return
+        
+        now = datetime.now().isoformat()
+        rejected = result.rejected
+        payload_columns = {column: _column_values(values[rejected], len(rejected)) for column, values in arrays.items()}
+        conn.executemany('''
+            INSERT INTO quarantine_rows (source, symbol, key_type, row_key, reason, payload, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            (source, symbol, key_type, int(keys[index]), reason,
+             json.dumps({column: values[position] for column, values in payload_columns.items()}), now)
+            for position, (index, reason) in enumerate(zip(rejected, result.reasons()))
+        ))
+        reasons = "、".join(f"{name} {count:,}" for name, count in summary['by_reason'].items())
+        print(f"🧹 {symbol} 資料驗證：{summary['accepted']:,}/{summary['rows']:,} 筆通過，隔離 {summary['rejected']:,} 筆（{reasons}）")
+    
+    def get_quarantine_report(self) -> Dict[str, Dict[str, int]]:
+        """各指數被隔離的筆數（依原因統計）"""
+        with self._connections.read('get_quarantine_report') as conn:
+            rows = conn.execute(
+                "SELECT symbol, reason, COUNT(*) FROM quarantine_rows GROUP BY symbol, reason ORDER BY symbol, reason"
+            ).fetchall()
+        report: Dict[str, Dict[str, int]] = {}
+        for symbol, reason, count in rows:
+            report.setdefault(symbol, {})[reason] = count
+        return report
+    
+    @staticmethod
+    def _bump_data_version(conn: sqlite3.Connection, table_name: str, added_rows: int = 0,
+                           min_key: Optional[int] = None, max_key: Optional[int] = None):
+        """在既有交易內遞增歷史表格的數據版本，並累計筆數與擴展鍵值範圍"""
+        conn.execute('''
+            INSERT INTO history_metadata (table_name, data_version, updated_at, row_count, min_key, max_key)
+            VALUES (?, 1, ?, ?, ?, ?)
+            ON CONFLICT(table_name) DO UPDATE SET
+                data_version = data_version + 1,
+                updated_at = excluded.updated_at,
+                row_count = COALESCE(row_count, 0) + excluded.row_count,
+                min_key = COALESCE(MIN(min_key, excluded.min_key), min_key, excluded.min_key),
+                max_key = COALESCE(MAX(max_key, excluded.max_key), max_key, excluded.max_key)
+        ''', (table_name, datetime.now().isoformat(), added_rows, min_key, max_key))
+    
+    @staticmethod
+    def _update_rolling_stats(conn: sqlite3.Connection, symbol: str, from_day: Optional[int] = None) -> int:
+        """在既有交易內重算 from_day（含）以後的滾動統計，回傳更新筆數
+        
+        只往前多讀最長視窗所需的K棒，追加新數據時成本與新增筆數成正比；
+        未指定 from_day 時重建該指數全部的滾動統計。
+        """
+        symbol = symbol.upper()
+        table_name = SYMBOL_TABLES[symbol]
+        if from_day is None:
+            conn.execute("DELETE FROM rolling_stats WHERE symbol = ?", (symbol,))
+            start_day = None
+        else:
+            row = conn.execute(
+                f"SELECT day FROM {table_name} WHERE day < ? ORDER BY day DESC LIMIT 1 OFFSET ?",
+                (from_day, LOOKBACK_ROWS - 1)
+            ).fetchone()
+            start_day = row[0] if row else None
+        
+        volume = 'volume' if 'volume' in TABLE_COLUMNS[table_name] else 'NULL'
+        rows = conn.execute(
+            f"SELECT day, close, {volume}, rsi, histogram FROM {table_name} WHERE day >= ? ORDER BY day",
+            (start_day if start_day is not None else np.iinfo(np.int64).min,)
+        ).fetchall()
+        if not rows:
+            return 0
+        
+        values = np.array(rows, dtype=float)
+        days = values[:, 0].astype(np.int64)
+        stats = compute_rolling_stats(values[:, 1], values[:, 2], values[:, 3], values[:, 4])
+        updated = days >= from_day if from_day is not None else np.ones(len(days), dtype=bool)
+        
+        placeholders = ", ".join("?" * (len(ROLLING_STAT_COLUMNS) + 2))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO rolling_stats (symbol, day, {', '.join(ROLLING_STAT_COLUMNS)}) VALUES ({placeholders})",
+            zip(
+                [symbol] * int(updated.sum()),
+                days[updated].tolist(),
+                *(_column_values(stats[column][updated], int(updated.sum())) for column in ROLLING_STAT_COLUMNS)
+            )
+        )
+        return int(updated.sum())
+    
+    @staticmethod
+    def _clear_table_statistics(conn: sqlite3.Connection, table_name: str):
+        """在既有交易內清空表格後呼叫：筆數歸零、鍵值範圍清除並遞增數據版本"""
+        symbol = next(symbol for symbol, name in SYMBOL_TABLES.items() if name == table_name)
+        conn.execute("DELETE FROM rolling_stats WHERE symbol = ?", (symbol,))
+        conn.execute('''
+            INSERT INTO history_metadata (table_name, data_version, updated_at, row_count, min_key, max_key)
+            VALUES (?, 1, ?, 0, NULL, NULL)
+            ON CONFLICT(table_name) DO UPDATE SET
+                data_version = data_version + 1,
+                updated_at = excluded.updated_at,
+                row_count = 0, min_key = NULL, max_key = NULL
+        ''', (table_name, datetime.now().isoformat()))
+    
+    def get_data_version(self, symbol: Optional[str] = None) -> int:
+        """取得指數（未指定時為全部歷史表格合計）的數據版本"""
+        with self._connections.read('get_data_version') as conn:
+            if symbol is None:
+                placeholders = ", ".join("?" * len(SYMBOL_TABLES))
+                row = conn.execute(
+                    f"SELECT COALESCE(SUM(data_version), 0) FROM history_metadata WHERE table_name IN ({placeholders})",
+                    tuple(SYMBOL_TABLES.values())
+                ).fetchone()
+            else:
+                table_name = SYMBOL_TABLES.get(symbol.upper())
+                if not table_name:
+                    raise ValueError(f"不支持的指數: {symbol}")
+                row = conn.execute(
+                    "SELECT data_version FROM history_metadata WHERE table_name = ?", (table_name,)
+                ).fetchone()
+        return int(row[0]) if row else 0
+    
+    def get_derived_version(self, name: str) -> Optional[int]:
+        """取得衍生表格計算時所依據的數據版本（尚未計算過為 None）"""
+        with self._connections.read('get_derived_version') as conn:
+            row = conn.execute(
+                "SELECT source_version FROM derived_versions WHERE name = ?", (name,)
+            ).fetchone()
+        return int(row[0]) if row else None
+    
+    @staticmethod
+    def _set_derived_version(conn: sqlite3.Connection, name: str, source_version: int):
+        """在既有交易內記錄衍生表格的來源數據版本"""
+        conn.execute(
+            "INSERT OR REPLACE INTO derived_versions (name, source_version, built_at) VALUES (?, ?, ?)",
+            (name, source_version, datetime.now().isoformat())
+        )
+    
+    def export_snapshot(self, symbol: str) -> HistorySnapshot:
+        """將指數完整歷史匯出為唯讀的 .npy 欄位式快照"""
+        table_name = SYMBOL_TABLES.get(symbol.upper())
+        if not table_name:
+            raise ValueError(f"不支持的指數: {symbol}")
+        
+        with self._connections.read('export_snapshot') as conn:
+            # 版本與數據在同一個讀取交易中取得，確保一致
+            conn.execute("BEGIN")
+            try:
+                version_row = conn.execute(
+                    "SELECT data_version FROM history_metadata WHERE table_name = ?", (table_name,)
+                ).fetchone()
+                frame = pd.read_sql_query(f"SELECT * FROM {table_name} ORDER BY day", conn)
+            finally:
+                conn.rollback()
+        frame.insert(0, 'date', _days_to_datetime(frame.pop('day'), 'D'))
+        
+        data_version = int(version_row[0]) if version_row else 0
+        write_snapshot(self.snapshot_dir, symbol, data_version, frame, self.database_id)
+        snapshot = HistorySnapshot.open(self.snapshot_dir, symbol, self.database_id)
+        self._snapshots[symbol.upper()] = snapshot
+        return snapshot
+    
+    def get_snapshot(self, symbol: str) -> HistorySnapshot:
+        """取得指數的最新快照；數據版本變動時自動重新匯出"""
+        symbol = symbol.upper()
+        current_version = self.get_data_version(symbol)
+        
+        snapshot = self._snapshots.get(symbol)
+        if snapshot is not None and snapshot.data_version == current_version:
+            return snapshot
+        
+        # 其他程序可能已匯出最新版本，直接映射即可（來自其他資料庫的快照不採用）
+        snapshot = HistorySnapshot.open(self.snapshot_dir, symbol, self.database_id)
+        if snapshot is not None and snapshot.data_version == current_version:
+            self._snapshots[symbol] = snapshot
+            return snapshot
+        
+        return self.export_snapshot(symbol)
+    
+    def refresh_snapshots(self) -> Dict[str, int]:
+        """更新所有過期的指數快照，回傳各指數的快照版本"""
+        return {symbol: self.get_snapshot(symbol).data_version for symbol in SYMBOL_TABLES}
+    
+    def get_historical_arrays(self, symbol: str, start_date: str, end_date: str,
+                              columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """由快照取得日期區間的欄位陣列（零複製，不經 SQL 與日期解析）"""
+        return self.get_snapshot(symbol).slice(start_date, end_date, columns)
+    
+    def get_percentile_index(self, symbol: str, column: str, bars: int) -> SlidingPercentileIndex:
+        """最近 bars 根日K某欄位的滑動百分位索引（程序內共用）
+        
+        append_bars 追加尾段時以 push 更新索引（每根 O(log n)）；其他寫入改變數據版本後於下次取用時重建。
+        回傳的索引會隨後續追加更新，需要固定內容時請先 copy()。
+        """
+        symbol = symbol.upper()
+        table_name = SYMBOL_TABLES.get(symbol)
+        if not table_name:
+            raise ValueError(f"不支持的指數: {symbol}")
+        if column not in TABLE_COLUMNS[table_name]:
+            raise ValueError(f"{symbol} 沒有 {column} 欄位")
+        
+        key = (self._cache_namespace, symbol, column, bars)
+        version = self.get_data_version(symbol)
+        with self._percentile_lock:
+            entry = self._percentile_indexes.get(key)
+            if entry is not None and entry[1] == version:
+                return entry[0]
+        
+        with self._connections.read('get_percentile_index') as conn:
+            version = self._read_data_version(conn, table_name)
+            rows = conn.execute(
+                f"SELECT {column} FROM (SELECT day, {column} FROM {table_name} ORDER BY day DESC LIMIT ?) ORDER BY day",
+                (bars,)
+            ).fetchall()
+        index = SlidingPercentileIndex(bars, np.array([row[0] for row in rows], dtype=float))
+        with self._percentile_lock:
+            self._percentile_indexes[key] = (index, version)
+        return index
+    
+    def _advance_percentile_indexes(self, symbol: str, previous_version: int, version: int,
+                                    columnar: Dict[str, np.ndarray]):
+        """追加尾段後把新K棒推入該指數的百分位索引（索引不是寫入前的版本時捨棄，下次取用重建）"""
+        with self._percentile_lock:
+            for key in [key for key in self._percentile_indexes if key[:2] == (self._cache_namespace, symbol)]:
+                index, index_version = self._percentile_indexes[key]
+                if index_version != previous_version:
+                    del self._percentile_indexes[key]
+                    continue
+                values = columnar.get(key[2])
+                for value in (values if values is not None else np.full(len(columnar['day']), np.nan)):
+                    index.push(np.nan if pd.isna(value) else value)
+                self._percentile_indexes[key] = (index, version)
+    
+    @staticmethod
+    def _read_data_version(conn: sqlite3.Connection, table_name: str) -> int:
+        row = conn.execute("SELECT data_version FROM history_metadata WHERE table_name = ?", (table_name,)).fetchone()
+        return int(row[0]) if row else 0
+    
+    def load_indicator_state(self, symbol: str) -> IndicatorState:
+        """讀取指數的指標延續狀態"""
+        with self._connections.read('load_indicator_state') as conn:
+            return self._read_indicator_state(conn, symbol)
+    
+    @staticmethod
+    def _read_indicator_state(conn: sqlite3.Connection, symbol: str) -> IndicatorState:
+        """以指定連線讀取指標延續狀態（寫入交易內使用以確保一致）"""
+        row = conn.execute(
+            "SELECT state FROM indicator_state WHERE symbol = ?", (symbol.upper(),)
+        ).fetchone()
+        return IndicatorState.from_dict(json.loads(row[0]) if row else None)
+    
+    def append_bars(self, symbol: str, bars: Union[pd.DataFrame, Dict, List[Dict]]) -> Dict:
+        """追加（或更新）K棒並只重算新增尾段的技術指標
+        
+        bars 需含 date 與 close，可另含 open/high/low/volume；技術指標欄位一律由收盤價推導。
+        K棒先經資料驗證（重複、週末、跳動等），未通過的列寫入 quarantine_rows 不參與計算。
+        新K棒皆晚於已保存狀態的 last_date 時，由保存的指標狀態延續計算（O(新增筆數)）；
+        若更正了舊日期或尚無指標狀態，則改以該指數全部歷史重新計算。
+        寫入、指標狀態與數據版本在同一交易內完成。
+        """
+        symbol = symbol.upper()
+        table_name = SYMBOL_TABLES.get(symbol)
+        if not table_name:
+            raise ValueError(f"不支持的指數: {symbol}")
+        
+        frame = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(bars)
+        if frame.empty:
+            return {'symbol': symbol, 'rows': 0, 'mode': 'none', 'last_date': None}
+        if 'date' not in frame or 'close' not in frame:
+            raise ValueError(f"{symbol} K棒缺少 date 或 close 欄位")
+        
+        price_columns = [column for column in TABLE_COLUMNS[table_name] if column not in INDICATOR_COLUMNS]
+        frame = frame.dropna(subset=['date'])
+        if frame.empty:
+            return {'symbol': symbol, 'rows': 0, 'mode': 'none', 'last_date': None}
+        frame = frame.assign(day=_day_numbers(frame['date']))
+        frame = frame[['day'] + [column for column in price_columns if column in frame]].reset_index(drop=True)
+        
+        with self._connections.write('append_bars') as conn:
+            # 驗證後只保留通過的列（已依日期排序且不重複）
+            days = frame['day'].to_numpy()
+            arrays = {column: frame[column].to_numpy() for column in frame.columns if column != 'day'}
+            result = validate_bars(days, arrays, self._previous_close(conn, table_name, int(days.min())))
+            self._handle_rejected(conn, 'append_bars', symbol, 'day', days, arrays, result)
+            frame = frame.iloc[result.accepted].reset_index(drop=True)
+            if frame.empty:
+                return {'symbol': symbol, 'rows': 0, 'mode': 'none', 'last_date': None}
             
-            for data in data_points:
-                date = data['date']
-                
-                # 插入TXF數據
-                cursor.execute('''
-                    INSERT OR REPLACE INTO txf_history 
-                    (date, open, high, low, close, volume, macd, signal, histogram, rsi, rsi_ma)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    date, data['txf']['open'], data['txf']['high'], data['txf']['low'],
-                    data['txf']['close'], data['txf']['volume'], data['txf']['macd'],
-                    data['txf']['signal'], data['txf']['histogram'], data['txf']['rsi'], data['txf']['rsi_ma']
-                ))
-                
-                # 插入DJI數據
-                cursor.execute('''
-                    INSERT OR REPLACE INTO dji_history 
-                    (date, close, macd, signal, histogram, rsi, rsi_ma)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    date, data['dji']['close'], data['dji']['macd'], data['dji']['signal'],
-                    data['dji']['histogram'], data['dji']['rsi'], data['dji']['rsi_ma']
-                ))
-                
-                # 插入NDX數據
-                cursor.execute('''
-                    INSERT OR REPLACE INTO ndx_history 
-                    (date, close, macd, signal, histogram, rsi, rsi_ma)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    date, data['ndx']['close'], data['ndx']['macd'], data['ndx']['signal'],
-                    data['ndx']['histogram'], data['ndx']['rsi'], data['ndx']['rsi_ma']
-                ))
-                
-                # 插入SOXX數據
-                cursor.execute('''
-                    INSERT OR REPLACE INTO soxx_history 
-                    (date, close, macd, signal, histogram, rsi, rsi_ma)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    date, data['soxx']['close'], data['soxx']['macd'], data['soxx']['signal'],
-                    data['soxx']['histogram'], data['soxx']['rsi'], data['soxx']['rsi_ma']
-                ))
+            previous_version = self._read_data_version(conn, table_name)
+            state = self._read_indicator_state(conn, symbol)
+            if state.last_date is not None and frame['day'].iloc[0] > _day_bound(state.last_date):
+                mode = 'tail'
+                rows = frame.reset_index(drop=True)
+            else:
+                # 更正舊資料或缺少延續狀態：合併既有歷史後整段重算
+                mode = 'full'
+                existing = pd.read_sql_query(
+                    f"SELECT day, {', '.join(price_columns)} FROM {table_name} ORDER BY day", conn
+                )
+                rows = pd.concat([existing, frame], ignore_index=True)
+                rows = rows.drop_duplicates('day', keep='last').sort_values('day', kind='stable')
+                rows = rows.reset_index(drop=True)
+                state = IndicatorState()
             
-            conn.commit()
+            indicators, new_state = compute_indicators(rows['close'].to_numpy(dtype=float), state)
+            new_state.last_date = _day_to_string(rows['day'].iloc[-1])
+            
+            columnar = {column: rows[column].to_numpy() for column in rows.columns}
+            columnar.update(indicators)
+            written = self._insert_columnar(conn, symbol, columnar, validate=False)
+            self._save_indicator_state(conn, symbol, new_state)
+            version = self._read_data_version(conn, table_name)
+            if mode == 'tail':
+                # 巢狀於外層交易（例如寫入佇列）時，外層提交後才更新；外層回滾則不更新
+                self._connections.after_commit(
+                    lambda: self._advance_percentile_indexes(symbol, previous_version, version, columnar)
+                )
+        
+        print(f"➕ {symbol} 追加 {len(frame):,} 根K棒（{'尾段延續' if mode == 'tail' else '全段重算'} {written:,} 筆）")
+        return {'symbol': symbol, 'rows': written, 'mode': mode, 'last_date': new_state.last_date}
     
-    def get_historical_data(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
-        """獲取指定期間的歷史數據"""
-        table_map = {
-            'TXF': 'txf_history',
-            'DJI': 'dji_history', 
-            'NDX': 'ndx_history',
-            'SOXX': 'soxx_history'
-        }
+    def compute_live_indicators(self, symbol: str, close: float,
+                                high: Optional[float] = None, low: Optional[float] = None) -> Dict[str, float]:
+        """以最新已保存的指標狀態，計算即時報價（尚未收盤K棒）的技術指標，不寫入資料庫"""
+        state = self.load_indicator_state(symbol)
+        indicators, _ = compute_indicators(
+            np.array([close], dtype=float),
+            state,
+            high=None if high is None else np.array([high], dtype=float),
+            low=None if low is None else np.array([low], dtype=float)
+        )
+        return {column: round(float(values[0]), 2) for column, values in indicators.items()}
+    
+    @staticmethod
+    def _save_indicator_state(conn: sqlite3.Connection, symbol: str, state: IndicatorState):
+        """在既有交易內保存指數的指標延續狀態"""
+        conn.execute('''
+            INSERT OR REPLACE INTO indicator_state (symbol, last_date, state, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', (symbol.upper(), state.last_date, json.dumps(state.to_dict()), datetime.now().isoformat()))
+    
+    def get_query_stats(self) -> Dict[str, Dict[str, float]]:
+        """取得各類查詢的次數與耗時統計（秒），用於分析SQLite耗時比例"""
+        return self._connections.get_query_stats()
+    
+    def reset_query_stats(self):
+        """清除查詢耗時統計"""
+        self._connections.reset_query_stats()
+    
+    def get_historical_data(self, symbol: str, start_date: str, end_date: str,
+                            timeframe: Optional[str] = None) -> pd.DataFrame:
+        """獲取指定期間的歷史數據
         
-        table_name = table_map.get(symbol.upper())
+        timeframe 未指定時使用 default_timeframe；'1d' 讀取日線表格，
+        其他週期（5m/15m/60m…）由盤中分K重新取樣並推導技術指標，欄位格式相同。
+        """
+        table_name = SYMBOL_TABLES.get(symbol.upper())
         if not table_name:
             raise ValueError(f"不支持的指數: {symbol}")
         
+        timeframe = timeframe or self.default_timeframe
+        if timeframe != '1d':
+            bars = self.get_intraday_bars(symbol, start_date, end_date, timeframe)
+            if bars.empty:
+                return bars.assign(**{column: pd.Series(dtype=float) for column in INDICATOR_COLUMNS})
+            indicators, _ = compute_indicators(bars['close'].to_numpy(dtype=float))
+            return bars.assign(**indicators)
+        
         query = f"""
             SELECT * FROM {table_name} 
-            WHERE date >= ? AND date <= ?
-            ORDER BY date
+            WHERE day >= ? AND day <= ?
+            ORDER BY day
         """
         
-        with sqlite3.connect(self.db_path) as conn:
-            df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-            df['date'] = pd.to_datetime(df['date'])
-            return df
-    
-    def calculate_correlation_matrix(self, start_date: str, end_date: str) -> Dict:
-        """計算指定期間的相關性矩陣"""
-        # 獲取各指數數據
-        txf_data = self.get_historical_data('TXF', start_date, end_date)
-        dji_data = self.get_historical_data('DJI', start_date, end_date)
-        ndx_data = self.get_historical_data('NDX', start_date, end_date)
-        soxx_data = self.get_historical_data('SOXX', start_date, end_date)
-        
-        # 創建價格變化率數據框
-        price_changes = pd.DataFrame({
-            'TXF': txf_data['close'].pct_change(),
-            'DJI': dji_data['close'].pct_change(),
-            'NDX': ndx_data['close'].pct_change(),
-            'SOXX': soxx_data['close'].pct_change()
-        }).dropna()
+        with self._connections.read('get_historical_data') as conn:
+            df = pd.read_sql_query(query, conn, params=(_day_bound(start_date), _day_bound(end_date)))
+        # 整欄皆為 NULL 時（如CSV未提供成交量）pandas 讀成 object 的 None，統一轉為 NaN 浮點數
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+        df.insert(0, 'date', _days_to_datetime(df.pop('day')))
+        return df
+    
+    def get_trading_calendar(self, symbol: str) -> TradingCalendar:
+        """取得指數所屬市場的交易日曆（同市場各表格實際交易日的聯集，數據版本改變時重建）"""
+        market = SYMBOL_MARKETS.get(symbol.upper())
+        if market is None:
+            raise ValueError(f"不支持的指數: {symbol}")
+        
+        tables = [SYMBOL_TABLES[name] for name, name_market in SYMBOL_MARKETS.items() if name_market == market]
+        cache_key = (self._cache_namespace, 'calendar', market, self.get_data_version())
+        calendar = self._result_cache.get(cache_key)
+        if calendar is None:
+            query = " UNION ".join(f"SELECT day FROM {table_name}" for table_name in tables)
+            with self._connections.read('get_trading_calendar') as conn:
+                observed = [row[0] for row in conn.execute(query)]
+            calendar = TradingCalendar(market, observed)
+            self._result_cache.put(cache_key, calendar)
+        return calendar
+    
+    def get_historical_window(self, symbol: str, bars: int, end_date: Optional[str] = None,
+                              timeframe: Optional[str] = None) -> pd.DataFrame:
+        """取得結束於 end_date（預設今天）、恰好 bars 個交易日的歷史數據
+        
+        以交易日曆換算起訖日，不再用日曆天數粗估；盤中週期則取同樣交易日數內的最後 bars 根K棒。
+        """
+        start, end = self.get_trading_calendar(symbol).window(bars, end_date)
+        data = self.get_historical_data(symbol, start, end, timeframe)
+        if (timeframe or self.default_timeframe) != '1d':
+            data = data.tail(bars).reset_index(drop=True)
+        return data
+    
+    def get_rolling_stats(self, symbol: str, as_of_date: Optional[str] = None) -> Optional[Dict]:
+        """查詢指定日期（含）以前最後一根K棒的滾動統計（單列主鍵查詢）
+        
+        回傳 date、windows（各統計的回溯K棒數）與 ROLLING_STAT_COLUMNS 各欄位（無數值為 NaN）；
+        尚無數據時回傳 None。
+        """
+        symbol = symbol.upper()
+        if symbol not in SYMBOL_TABLES:
+            raise ValueError(f"不支持的指數: {symbol}")
+        as_of_day = _day_bound(as_of_date or datetime.now().strftime('%Y-%m-%d'))
+        with self._connections.read('get_rolling_stats') as conn:
+            row = conn.execute(f'''
+                SELECT day, {', '.join(ROLLING_STAT_COLUMNS)} FROM rolling_stats
+                WHERE symbol = ? AND day <= ? ORDER BY day DESC LIMIT 1
+            ''', (symbol, as_of_day)).fetchone()
+        if row is None:
+            return None
+        
+        stats = {'date': _day_to_string(row[0]), 'windows': dict(STAT_WINDOWS)}
+        for column, value in zip(ROLLING_STAT_COLUMNS, row[1:]):
+            stats[column] = float('nan') if value is None else value
+        return stats
+    
+    def insert_intraday_bars(self, symbol: str, bars: Union[pd.DataFrame, Dict, List[Dict]]) -> int:
+        """寫入盤中分K（ts 可為 epoch 秒或時間；無時區的時間視為交易所當地時間）"""
+        symbol = symbol.upper()
+        if symbol not in SYMBOL_TABLES:
+            raise ValueError(f"不支持的指數: {symbol}")
+        
+        frame = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(bars)
+        if frame.empty:
+            return 0
+        if 'ts' not in frame or 'close' not in frame:
+            raise ValueError(f"{symbol} 分K缺少 ts 或 close 欄位")
+        
+        columns = ['open', 'high', 'low', 'close', 'volume']
+        offset = int(EXCHANGE_UTC_OFFSETS[symbol] * 3600)
+        keys = _epoch_seconds(frame['ts'], offset)
+        arrays = {column: _as_array(frame[column]) for column in columns if column in frame}
+        
+        count_query = "SELECT COUNT(*) FROM intraday_bars WHERE symbol = ? AND ts BETWEEN ? AND ?"
+        with self._connections.write('insert_intraday_bars') as conn:
+            previous = conn.execute(
+                "SELECT close FROM intraday_bars WHERE symbol = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+                (symbol, int(keys.min()))
+            ).fetchone()
+            result = validate_bars(keys, arrays, previous[0] if previous else None, utc_offset_seconds=offset)
+            self._handle_rejected(conn, 'insert_intraday_bars', symbol, 'ts', keys, arrays, result)
+            
+            row_count = len(result.accepted)
+            if row_count == 0:
+                return 0
+            values = [[symbol] * row_count, keys[result.accepted].tolist()] + [
+                _column_values(arrays[column][result.accepted] if column in arrays else None, row_count)
+                for column in columns
+            ]
+            min_key, max_key = values[1][0], values[1][-1]
+            before = conn.execute(count_query, (symbol, min_key, max_key)).fetchone()[0]
+            conn.executemany(
+                f"INSERT OR REPLACE INTO intraday_bars (symbol, ts, {', '.join(columns)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(*values)
+            )
+            after = conn.execute(count_query, (symbol, min_key, max_key)).fetchone()[0]
+            self._bump_data_version(conn, _intraday_metadata_key(symbol), after - before, min_key, max_key)
+        return row_count
+    
+    def get_intraday_bars(self, symbol: str, start_date: str, end_date: str, timeframe: str = '5m',
+                          utc_offset_hours: Optional[float] = None) -> pd.DataFrame:
+        """在 SQL 內將分K重新取樣為指定週期的 OHLCV（不先把原始分K載入 pandas）
+        
+        以 (ts + 時差) / 週期 分桶聚合高低量，再以每桶首末筆的主鍵回查開盤與收盤價。
+        date 欄位為各桶起點的交易所當地時間；end_date 只給日期時包含當天全部分K。
+        """
+        symbol = symbol.upper()
+        if symbol not in SYMBOL_TABLES:
+            raise ValueError(f"不支持的指數: {symbol}")
+        width = TIMEFRAMES.get(timeframe)
+        if width is None:
+            raise ValueError(f"不支持的時間週期: {timeframe}")
+        
+        offset = int(round((EXCHANGE_UTC_OFFSETS[symbol] if utc_offset_hours is None else utc_offset_hours) * 3600))
+        start_ts = _epoch_bound(start_date, offset)
+        end_ts = _epoch_bound(end_date, offset, end=True)
+        
+        query = """
+            SELECT g.bucket, o.open, g.high, g.low, c.close, g.volume
+            FROM (
+                SELECT (ts + ?) / ? AS bucket, MIN(ts) AS first_ts, MAX(ts) AS last_ts,
+                       MAX(high) AS high, MIN(low) AS low, SUM(volume) AS volume
+                FROM intraday_bars
+                WHERE symbol = ? AND ts >= ? AND ts < ?
+                GROUP BY bucket
+            ) g
+            JOIN intraday_bars o ON o.symbol = ? AND o.ts = g.first_ts
+            JOIN intraday_bars c ON c.symbol = ? AND c.ts = g.last_ts
+            ORDER BY g.bucket
+        """
+        with self._connections.read('get_intraday_bars') as conn:
+            rows = conn.execute(query, (offset, width, symbol, start_ts, end_ts, symbol, symbol)).fetchall()
+        
+        matrix = np.array(rows, dtype=float).reshape(-1, 6)
+        frame = pd.DataFrame({
+            'date': (matrix[:, 0].astype(np.int64) * width).astype('datetime64[s]').astype('datetime64[ns]'),
+            'open': matrix[:, 1],
+            'high': matrix[:, 2],
+            'low': matrix[:, 3],
+            'close': matrix[:, 4],
+            'volume': matrix[:, 5]
+        })
+        return frame
+    
+    def get_aligned_history(self, symbols: List[str], start_date: str, end_date: str,
+                            columns: Tuple[str, ...] = ('close',)) -> pd.DataFrame:
+        """以單一日期聯結查詢取得多個指數對齊後的歷史矩陣
+        
+        只保留所有指數都有交易的日期；回傳以日期為索引、欄位為
+        (欄位名稱, 指數代號) 的 DataFrame，例如 aligned['close']['TXF']。
+        """
+        symbols = [symbol.upper() for symbol in symbols]
+        if not symbols:
+            raise ValueError("至少需要一個指數")
+        
+        tables = []
+        for symbol in symbols:
+            table_name = SYMBOL_TABLES.get(symbol)
+            if not table_name:
+                raise ValueError(f"不支持的指數: {symbol}")
+            for column in columns:
+                if column not in TABLE_COLUMNS[table_name]:
+                    raise ValueError(f"{symbol} 沒有 {column} 欄位")
+            tables.append(table_name)
+        
+        select_list = ", ".join(
+            f"t{index}.{column}" for column in columns for index in range(len(tables))
+        )
+        joins = " ".join(
+            f"JOIN {table_name} t{index} ON t{index}.day = t0.day"
+            for index, table_name in enumerate(tables) if index > 0
+        )
+        query = f"""
+            SELECT t0.day, {select_list}
+            FROM {tables[0]} t0 {joins}
+            WHERE t0.day >= ? AND t0.day <= ?
+            ORDER BY t0.day
+        """
+        
+        with self._connections.read('get_aligned_history') as conn:
+            rows = conn.execute(query, (_day_bound(start_date), _day_bound(end_date))).fetchall()
+        
+        column_index = pd.MultiIndex.from_product([list(columns), symbols], names=['column', 'symbol'])
+        if not rows:
+            return pd.DataFrame(columns=column_index, index=pd.DatetimeIndex([], name='date'), dtype=float)
+        
+        matrix = np.array(rows, dtype=float)
+        dates = pd.DatetimeIndex(_days_to_datetime(matrix[:, 0]), name='date')
+        return pd.DataFrame(matrix[:, 1:], index=dates, columns=column_index)
+    
+    def calculate_correlation_matrix(self, start_date: str, end_date: str,
+                                     closes: Optional[pd.DataFrame] = None) -> Dict:
+        """計算指定期間的相關性矩陣（以日期對齊後的收盤價計算）
+        
+        結果依 (起始日, 結束日, 數據版本) 快取：先查程序內LRU，再查
+        correlation_analysis 表，都沒有才重新計算；歷史數據寫入後版本改變即失效。
+        """
+        data_version = self.get_data_version()
+        cache_key = (self._cache_namespace, 'correlation', start_date, end_date, data_version)
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        result = self._load_correlation_analysis(start_date, end_date, data_version)
+        if result is not None:
+            self._result_cache.put(cache_key, result)
+            return dict(result)
+        
+        if closes is None:
+            closes = self.get_aligned_history(list(SYMBOL_TABLES), start_date, end_date)['close']
+        
+        # 創建價格變化率數據框（同一交易日對齊）
+        price_changes = closes[['TXF', 'DJI', 'NDX', 'SOXX']].pct_change().dropna()
+        price_changes.columns = list(price_changes.columns)
         
         # 計算相關性
         correlation_matrix = price_changes.corr()
@@ -304,41 +1352,72 @@ class HistoricalDatabase:
         }
         
         # 儲存相關性分析結果
-        self._save_correlation_analysis(start_date, end_date, result)
+        self._save_correlation_analysis(start_date, end_date, result, data_version)
+        self._result_cache.put(cache_key, result)
         
-        return result
+        return dict(result)
     
-    def _save_correlation_analysis(self, start_date: str, end_date: str, result: Dict):
-        """儲存相關性分析結果"""
-        with sqlite3.connect(self.db_path) as conn:
+    def _load_correlation_analysis(self, start_date: str, end_date: str, data_version: int) -> Optional[Dict]:
+        """讀取與目前數據版本相符的相關性分析結果"""
+        with self._connections.read('load_correlation_analysis') as conn:
+            row = conn.execute('''
+                SELECT dji_txf_correlation, ndx_txf_correlation, soxx_txf_correlation, data_points, full_matrix
+                FROM correlation_analysis
+                WHERE date_from = ? AND date_to = ? AND data_version = ?
+            ''', (start_date, end_date, data_version)).fetchone()
+        
+        if row is None or row[4] is None:
+            return None
+        return {
+            'dji_txf_correlation': row[0] if row[0] is not None else np.nan,
+            'ndx_txf_correlation': row[1] if row[1] is not None else np.nan,
+            'soxx_txf_correlation': row[2] if row[2] is not None else np.nan,
+            'period': f"{start_date} to {end_date}",
+            'data_points': row[3],
+            'full_matrix': json.loads(row[4])
+        }
+    
+    def _save_correlation_analysis(self, start_date: str, end_date: str, result: Dict, data_version: int):
+        """儲存相關性分析結果（連同數據版本，供之後讀取快取）"""
+        with self._connections.write('save_correlation_analysis') as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO correlation_analysis 
-                (date_from, date_to, dji_txf_correlation, ndx_txf_correlation, soxx_txf_correlation, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (date_from, date_to, dji_txf_correlation, ndx_txf_correlation, soxx_txf_correlation, created_at,
+                 data_version, data_points, full_matrix)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 start_date, end_date,
-                result['dji_txf_correlation'],
-                result['ndx_txf_correlation'], 
-                result['soxx_txf_correlation'],
-                datetime.now().isoformat()
+                _float_or_none(result['dji_txf_correlation']),
+                _float_or_none(result['ndx_txf_correlation']), 
+                _float_or_none(result['soxx_txf_correlation']),
+                datetime.now().isoformat(),
+                data_version,
+                result['data_points'],
+                json.dumps(result['full_matrix'])
             ))
-            conn.commit()
     
     def get_optimal_prediction_ratios(self, lookback_days: int = 252) -> Dict:
-        """基於歷史數據計算最佳預測比例"""
-        end_date = datetime.now().strftime('%Y-%m-%d')
-        start_date = (datetime.now() - timedelta(days=lookback_days * 2)).strftime('%Y-%m-%d')
+        """基於歷史數據計算最佳預測比例（最近 lookback_days 個台指交易日）"""
+        start_date, end_date = self.get_trading_calendar('TXF').window(lookback_days)
+        
+        cache_key = (self._cache_namespace, 'ratios', start_date, end_date, self.get_data_version())
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
+        # 一次取得四個指數對齊後的收盤價，相關性與比例都由同一矩陣計算
+        closes = self.get_aligned_history(list(SYMBOL_TABLES), start_date, end_date)['close']
         
         # 獲取歷史相關性
-        correlation_data = self.calculate_correlation_matrix(start_date, end_date)
+        correlation_data = self.calculate_correlation_matrix(start_date, end_date, closes=closes)
         
         # 計算動態轉換比例
-        dji_txf_ratio = self._calculate_dynamic_ratio('DJI', 'TXF', start_date, end_date)
-        ndx_txf_ratio = self._calculate_dynamic_ratio('NDX', 'TXF', start_date, end_date)
-        soxx_txf_ratio = self._calculate_dynamic_ratio('SOXX', 'TXF', start_date, end_date)
+        dji_txf_ratio = self._calculate_dynamic_ratio('DJI', 'TXF', start_date, end_date, closes=closes)
+        ndx_txf_ratio = self._calculate_dynamic_ratio('NDX', 'TXF', start_date, end_date, closes=closes)
+        soxx_txf_ratio = self._calculate_dynamic_ratio('SOXX', 'TXF', start_date, end_date, closes=closes)
         
-        return {
+        result = {
             'dji_txf_ratio': dji_txf_ratio,
             'ndx_txf_ratio': ndx_txf_ratio,
             'soxx_txf_ratio': soxx_txf_ratio,
@@ -348,13 +1427,16 @@ class HistoricalDatabase:
             'lookback_period': lookback_days,
             'calculated_at': datetime.now().isoformat()
         }
+        self._result_cache.put(cache_key, result)
+        return dict(result)
     
-    def _calculate_dynamic_ratio(self, source_symbol: str, target_symbol: str, start_date: str, end_date: str) -> float:
-        """計算兩個指數之間的動態比例"""
-        source_data = self.get_historical_data(source_symbol, start_date, end_date)
-        target_data = self.get_historical_data(target_symbol, start_date, end_date)
+    def _calculate_dynamic_ratio(self, source_symbol: str, target_symbol: str, start_date: str, end_date: str,
+                                 closes: Optional[pd.DataFrame] = None) -> float:
+        """計算兩個指數之間的動態比例（僅使用兩者都有交易的日期）"""
+        if closes is None:
+            closes = self.get_aligned_history([source_symbol, target_symbol], start_date, end_date)['close']
         
-        if len(source_data) == 0 or len(target_data) == 0:
+        if len(closes) == 0:
             # 如果沒有歷史數據，使用預設比例
             default_ratios = {
                 ('DJI', 'TXF'): 0.508,
@@ -364,26 +1446,125 @@ class HistoricalDatabase:
             return default_ratios.get((source_symbol, target_symbol), 1.0)
         
         # 計算平均比例
-        ratios = target_data['close'] / source_data['close']
+        ratios = closes[target_symbol] / closes[source_symbol]
         return float(ratios.mean())
     
     def get_database_stats(self) -> Dict:
-        """獲取資料庫統計信息"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            stats = {}
-            tables = ['txf_history', 'dji_history', 'ndx_history', 'soxx_history']
-            
-            for table in tables:
-                cursor.execute(f"SELECT COUNT(*), MIN(date), MAX(date) FROM {table}")
-                count, min_date, max_date = cursor.fetchone()
-                stats[table] = {
-                    'record_count': count,
-                    'date_range': f"{min_date} to {max_date}" if min_date else "No data"
-                }
-            
-            return stats
+        """獲取資料庫統計信息（讀取寫入時維護的 history_metadata，不掃描歷史表格）"""
+        with self._connections.read('get_database_stats') as conn:
+            rows = conn.execute(
+                "SELECT table_name, data_version, updated_at, row_count, min_key, max_key FROM history_metadata"
+            ).fetchall()
+        metadata = {row[0]: row[1:] for row in rows}
+        
+        stats = {}
+        for table in SYMBOL_TABLES.values():
+            data_version, updated_at, count, min_key, max_key = metadata.get(table, (0, None, 0, None, None))
+            stats[table] = {
+                'record_count': count or 0,
+                'date_range': f"{_day_to_string(min_key)} to {_day_to_string(max_key)}" if count else "No data",
+                'data_version': data_version,
+                'last_update': updated_at
+            }
+        
+        # 盤中分K（有數據的指數才列出）
+        for symbol in SYMBOL_TABLES:
+            key = _intraday_metadata_key(symbol)
+            if key not in metadata or not metadata[key][2]:
+                continue
+            data_version, updated_at, count, min_key, max_key = metadata[key]
+            stats[key] = {
+                'record_count': count,
+                'date_range': f"{_ts_to_string(min_key)} to {_ts_to_string(max_key)} UTC",
+                'data_version': data_version,
+                'last_update': updated_at
+            }
+        
+        return stats
+
+def _day_numbers(values) -> np.ndarray:
+    """將日期欄位轉為整數日序（1970-01-01 為 0）"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    array = np.asarray(values)
+    if array.dtype.kind in ('U', 'O') and len(array) > 0 and isinstance(array[0], str) and len(array[0]) == 10:
+        array = array.astype('datetime64[D]')
+    elif array.dtype.kind != 'M':
+        array = pd.to_datetime(array).to_numpy()
+    return array.astype('datetime64[D]').astype(np.int64)
+
+def _day_bound(value) -> int:
+    """查詢區間端點（日期字串或 datetime）轉為整數日序"""
+    if isinstance(value, str):
+        return int(np.datetime64(value[:10], 'D').astype(np.int64))
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+def _days_to_datetime(days, unit: str = 'ns') -> np.ndarray:
+    """整數日序轉為 datetime64 陣列（不經字串解析）"""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(f'datetime64[{unit}]')
+
+def _day_to_string(day: int) -> str:
+    """整數日序轉為 YYYY-MM-DD"""
+    return str(np.datetime64(int(day), 'D'))
+
+def _intraday_metadata_key(symbol: str) -> str:
+    """盤中分K在 history_metadata 中的鍵"""
+    return f"intraday_bars:{symbol.upper()}"
+
+def _epoch_seconds(values, offset_seconds: int) -> np.ndarray:
+    """時間欄位轉為 UTC epoch 秒；整數視為 epoch 秒，無時區時間視為交易所當地時間"""
+    if isinstance(values, pd.Index):
+        values = pd.Series(values)
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if series.dtype.kind in ('i', 'u'):
+        return series.to_numpy(dtype=np.int64)
+    stamps = pd.to_datetime(series)
+    if stamps.dt.tz is not None:
+        return stamps.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+    return stamps.to_numpy().astype('datetime64[s]').astype(np.int64) - offset_seconds
+
+def _epoch_bound(value, offset_seconds: int, end: bool = False) -> int:
+    """盤中查詢區間端點轉為 UTC epoch 秒；結束端只給日期時延伸到隔日零時（不含）"""
+    stamp = pd.Timestamp(value)
+    if end and isinstance(value, str) and len(value) <= 10:
+        stamp += pd.Timedelta(days=1)
+    elif end:
+        stamp += pd.Timedelta(seconds=1)
+    if stamp.tzinfo is not None:
+        return int(stamp.tz_convert('UTC').timestamp())
+    return int(stamp.tz_localize('UTC').timestamp()) - offset_seconds
+
+def _ts_to_string(ts: int) -> str:
+    """UTC epoch 秒轉為 YYYY-MM-DD HH:MM"""
+    return str(np.datetime64(int(ts), 's'))[:16].replace('T', ' ')
+
+def _as_array(values) -> np.ndarray:
+    """欄位轉為 NumPy 陣列（串列中的 None 保留為物件）"""
+    if isinstance(values, (pd.Series, pd.Index)):
+        return values.to_numpy()
+    return np.asarray(values)
+
+def _float_or_none(value) -> Optional[float]:
+    """NaN 轉為 NULL，其餘轉為 float"""
+    if value is None or pd.isna(value):
+        return None
+    return float(value)
+
+def _column_values(values, length: int) -> List:
+    """將欄位轉為 Python 原生值串列，NaN 轉為 NULL"""
+    if values is None:
+        return [None] * length
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.to_numpy()
+    array = np.asarray(values)
+    if len(array) != length:
+        raise ValueError(f"欄位長度不一致: {len(array)} != {length}")
+    if array.dtype.kind == 'f':
+        missing = np.isnan(array)
+        if missing.any():
+            array = array.astype(object)
+            array[missing] = None
+    return array.tolist()
 
 # 使用範例和測試函數
 def initialize_historical_database():
@@ -391,11 +1572,16 @@ def initialize_historical_database():
     print("🗄️ 初始化歷史資料庫...")
     db = HistoricalDatabase()
     
-    # 檢查是否需要生成樣本數據
+    # 優先匯入專案內附的統一歷史CSV，沒有時才生成樣本數據
+    from historical_csv_importer import UNIFIED_CSV_PATH, import_unified_csv
+    if Path(UNIFIED_CSV_PATH).exists():
+        import_unified_csv(db, UNIFIED_CSV_PATH)
+    
     stats = db.get_database_stats()
     if stats['txf_history']['record_count'] == 0:
         print("📊 資料庫為空，生成歷史樣本數據...")
         db.insert_sample_data()
+        stats = db.get_database_stats()
     
     # 計算近期相關性
     print("📈 計算近期市場相關性...")
@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    import msvcrt
+    FCNTL_AVAILABLE = False
+
+MANIFEST_NAME = "manifest.json"
+
+# 快照版本目錄名稱：v<數據版本>-<資料庫識別碼>
+VERSION_DIR_PATTERN = re.compile(r"^v(\d+)-([0-9a-f]+)$")
+
+class HistorySnapshot:
+    """唯讀的欄位式歷史快照（np.load mmap，多個程序共享同一份頁面快取）"""
+
+    def __init__(self, snapshot_dir: Union[str, Path], manifest: Dict):
+        self.path = Path(snapshot_dir)
+        self.symbol = manifest['symbol']
+        self.data_version = manifest['data_version']
+        self.database_id = manifest.get('database_id')
+        self.columns: List[str] = manifest['columns']
+        self.row_count = manifest['row_count']
+        self.dates = np.load(self.path / "date.npy", mmap_mode='r')
+        self._arrays = {
+            column: np.load(self.path / f"{column}.npy", mmap_mode='r')
+            for column in self.columns
+        }
+
+    @classmethod
+    def open(cls, root: Union[str, Path], symbol: str,
+             database_id: Optional[str] = None) -> Optional['HistorySnapshot']:
+        """依 manifest 開啟指數目前的快照版本，不存在（或來自其他資料庫）時回傳 None"""
+        symbol_dir = Path(root) / symbol.upper()
+        manifest = read_manifest(symbol_dir)
+        if manifest is None:
+            return None
+        if database_id is not None and manifest.get('database_id') != database_id:
+            return None
+        snapshot_dir = symbol_dir / manifest['directory']
+        if not snapshot_dir.exists():
+            return None
+        return cls(snapshot_dir, manifest)
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column == 'date':
+            return self.dates
+        return self._arrays[column]
+
+    def _bounds(self, start_date: Optional[str], end_date: Optional[str]) -> slice:
+        """以二分搜尋取得日期區間的索引範圍"""
+        lower = 0 if start_date is None else int(np.searchsorted(self.dates, np.datetime64(start_date, 'D'), side='left'))
+        upper = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, np.datetime64(end_date, 'D'), side='right'))
+        return slice(lower, upper)
+
+    def slice(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """取得日期區間內各欄位的零複製視圖"""
+        bounds = self._bounds(start_date, end_date)
+        result = {'date': self.dates[bounds]}
+        for column in columns or self.columns:
+            result[column] = self._arrays[column][bounds]
+        return result
+
+    def to_frame(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """轉為與 get_historical_data 相同格式的 DataFrame（會複製數據）"""
+        arrays = self.slice(start_date, end_date)
+        return pd.DataFrame({
+            'date': arrays['date'].astype('datetime64[ns]'),
+            **{column: np.asarray(arrays[column]) for column in self.columns}
+        })
+
+def read_manifest(symbol_dir: Union[str, Path]) -> Optional[Dict]:
+    """讀取快照 manifest"""
+    manifest_path = Path(symbol_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _version_dirs(symbol_dir: Path) -> List[Tuple[Path, int, str]]:
+    """列出快照版本目錄：(目錄, 數據版本, 資料庫識別碼)"""
+    result = []
+    for path in symbol_dir.glob("v*"):
+        match = VERSION_DIR_PATTERN.match(path.name)
+        if match and path.is_dir():
+            result.append((path, int(match.group(1)), match.group(2)))
+    return result
+
+@contextmanager
+def _manifest_lock(symbol_dir: Path):
+    """跨程序的 manifest 更新鎖（比較版本與替換 manifest 之間不可被其他寫入者插入）"""
+    with open(symbol_dir / ".manifest.lock", 'a+') as lock_file:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def write_snapshot(root: Union[str, Path], symbol: str, data_version: int, frame: pd.DataFrame,
+                   database_id: str) -> Path:
+    """將歷史數據寫成 .npy 快照，並以原子替換 manifest 的方式切換版本
+
+    版本目錄以數據版本與資料庫識別碼命名，重新建立的資料庫即使版本號相同也不會沿用舊快照。
+    同一資料庫的 manifest 已指向更新的版本時不會被倒退，只清除比本次發布更舊的版本目錄。
+    """
+    symbol = symbol.upper()
+    symbol_dir = Path(root) / symbol
+    symbol_dir.mkdir(parents=True, exist_ok=True)
+    directory = f"v{data_version}-{database_id}"
+    target_dir = symbol_dir / directory
+
+    if not target_dir.exists():
+        # 先寫到暫存目錄再改名，避免讀取端看到寫到一半的檔案
+        staging_dir = Path(tempfile.mkdtemp(prefix=f".{directory}-", dir=symbol_dir))
+        columns = [column for column in frame.columns if column != 'date']
+        np.save(staging_dir / "date.npy", pd.to_datetime(frame['date']).to_numpy().astype('datetime64[D]'))
+        for column in columns:
+            np.save(staging_dir / f"{column}.npy", pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float))
+        try:
+            os.rename(staging_dir, target_dir)
+        except OSError:
+            # 其他程序已寫好同一版本
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    manifest = {
+        'symbol': symbol,
+        'data_version': data_version,
+        'database_id': database_id,
+        'directory': directory,
+        'columns': [column for column in frame.columns if column != 'date'],
+        'row_count': len(frame)
+    }
+    with _manifest_lock(symbol_dir):
+        current = read_manifest(symbol_dir)
+        if (current is not None and current.get('database_id') == database_id
+                and current['data_version'] > data_version):
+            # 其他程序已發布更新的版本，保留其 manifest 與目錄
+            return target_dir
+
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest-", dir=symbol_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, symbol_dir / MANIFEST_NAME)
+
+        # 清除同一資料庫較舊的版本與其他（已被取代的）資料庫的快照（已映射的程序在POSIX上仍可繼續讀取）
+        for old_dir, old_version, old_database_id in _version_dirs(symbol_dir):
+            if old_database_id != database_id or old_version < data_version:
+                shutil.rmtree(old_dir, ignore_errors=True)
+
+    return target_dir
@@ -0,0 +1,333 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from historical_database import HistoricalDatabase, SYMBOL_TABLES
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# 預設暫存佇列位置（與歷史資料庫同目錄）
+DEFAULT_SPOOL_PATH = "data/ingest_spool.db"
+
+# 佇列中待寫入的筆數上限，超過時生產者等待（背壓）
+MAX_PENDING_ROWS = 200_000
+
+# 寫入程序單次合併的最大筆數
+MAX_TRANSACTION_ROWS = 50_000
+
+BarsLike = Union[pd.DataFrame, Dict, List[Dict]]
+
+class IngestionQueueFull(Exception):
+    """佇列已滿且等待逾時"""
+
+def _spool_connect(spool_path: str) -> sqlite3.Connection:
+    """開啟暫存佇列（FULL 同步：提交即代表已確認，斷電也不遺失）"""
+    Path(spool_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(spool_path, timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = FULL")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _create_spool_tables(conn, spool_path)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return conn
+
+def _create_spool_tables(conn: sqlite3.Connection, spool_path: str):
+    """建立佇列表格與世代識別碼（暫存檔刪除重建後為新的世代，批次編號重新起算）"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'spool_meta' not in tables:
+        conn.execute("CREATE TABLE spool_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # 升級前已存在的暫存檔沿用以路徑記錄的寫入進度
+        generation = f"path:{Path(spool_path).resolve()}" if 'spool_batches' in tables else uuid.uuid4().hex
+        conn.execute("INSERT INTO spool_meta (key, value) VALUES ('generation', ?)", (generation,))
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS spool_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS failed_batches (
+            id INTEGER PRIMARY KEY,
+            kind TEXT,
+            symbol TEXT,
+            rows INTEGER,
+            payload TEXT,
+            error TEXT,
+            failed_at TEXT
+        )
+    ''')
+
+def _spool_generation(spool: sqlite3.Connection) -> str:
+    return spool.execute("SELECT value FROM spool_meta WHERE key = 'generation'").fetchone()[0]
+
+def _encode_frame(bars: BarsLike) -> Tuple[str, int]:
+    """K棒轉為 JSON（欄位 -> 串列），時間欄位轉為 ISO 字串"""
+    frame = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(bars)
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype.kind == 'M' or (values.dtype == object and len(values) and isinstance(values.iloc[0], datetime)):
+            values = pd.to_datetime(values).map(lambda stamp: stamp.isoformat())
+        elif values.dtype.kind == 'f':
+            values = values.astype(object).where(values.notna(), None)
+        columns[column] = values.tolist()
+    return json.dumps(columns, default=lambda value: value.item() if isinstance(value, np.generic) else str(value)), len(frame)
+
+def _decode_frame(payload: str) -> pd.DataFrame:
+    return pd.DataFrame(json.loads(payload))
+
+class IngestionQueue:
+    """多程序共用的寫入佇列（生產者端）
+
+    submit_* 把整批K棒寫入暫存佇列並提交後即回傳（已確認），實際寫入歷史資料庫
+    由單一 IngestionWriter 負責；待寫入筆數超過 max_pending_rows 時等待寫入程序消化。
+    """
+
+    def __init__(self, spool_path: str = DEFAULT_SPOOL_PATH, max_pending_rows: int = MAX_PENDING_ROWS,
+                 timeout: float = 60.0):
+        self.spool_path = spool_path
+        self.max_pending_rows = max_pending_rows
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = _spool_connect(self.spool_path)
+            self._local.conn = conn
+        return conn
+
+    def pending_rows(self) -> int:
+        """尚未寫入歷史資料庫的筆數"""
+        return int(self._conn().execute("SELECT COALESCE(SUM(rows), 0) FROM spool_batches").fetchone()[0])
+
+    def submit_bars(self, symbol: str, bars: BarsLike) -> int:
+        """提交日K（由寫入程序以 append_bars 寫入），回傳批次編號"""
+        return self._submit('bars', symbol, bars)
+
+    def submit_intraday(self, symbol: str, bars: BarsLike) -> int:
+        """提交盤中分K（由寫入程序以 insert_intraday_bars 寫入），回傳批次編號"""
+        return self._submit('intraday', symbol, bars)
+
+    def _submit(self, kind: str, symbol: str, bars: BarsLike) -> int:
+        symbol = symbol.upper()
+        if symbol not in SYMBOL_TABLES:
+            raise ValueError(f"不支持的指數: {symbol}")
+        payload, rows = _encode_frame(bars)
+
+        # 背壓：佇列已滿時等待，逾時丟出 IngestionQueueFull
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            batch_id, pending = self._try_insert(kind, symbol, rows, payload)
+            if batch_id is not None:
+                return batch_id
+            if time.monotonic() >= deadline:
+                raise IngestionQueueFull(f"寫入佇列已滿（待寫入 {pending:,} 筆），等待 {self.timeout} 秒逾時")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _try_insert(self, kind: str, symbol: str, rows: int, payload: str) -> Tuple[Optional[int], int]:
+        """在同一個寫入交易內檢查容量並寫入批次，回傳（批次編號, 待寫入筆數）；容量不足時批次編號為 None
+
+        容量檢查與寫入之間不會有其他生產者插入，多個生產者同時提交也不會超過上限。
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = int(conn.execute("SELECT COALESCE(SUM(rows), 0) FROM spool_batches").fetchone()[0])
+            # 佇列為空時即使單批超過上限也接受，避免永遠無法提交
+            if pending != 0 and pending + rows > self.max_pending_rows:
+                conn.execute("ROLLBACK")
+                return None, pending
+            cursor = conn.execute(
+                "INSERT INTO spool_batches (kind, symbol, rows, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, symbol, rows, payload, datetime.now().isoformat())
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return int(cursor.lastrowid), pending
+
+class IngestionWriter:
+    """單一寫入程序：合併佇列中的小批次，以一個交易寫入歷史資料庫
+
+    以檔案鎖確保同一佇列只有一個寫入程序。已寫入的最大批次編號與數據在同一交易內
+    記錄於 ingestion_log（以暫存檔的世代識別碼為鍵），重新啟動時從該編號之後重播，
+    已確認的批次不會遺失也不會重複寫入；暫存檔重建後為新的世代，從頭開始處理。
+    """
+
+    def __init__(self, db: Optional[HistoricalDatabase] = None, spool_path: str = DEFAULT_SPOOL_PATH,
+                 max_transaction_rows: int = MAX_TRANSACTION_ROWS, poll_interval: float = 0.5):
+        self.db = db or HistoricalDatabase()
+        self.spool_path = spool_path
+        self.spool_key = str(Path(spool_path).resolve())
+        self.max_transaction_rows = max_transaction_rows
+        self.poll_interval = poll_interval
+        self._lock_file = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def acquire(self):
+        """取得寫入程序檔案鎖，已有其他寫入程序（或平台不支援檔案鎖）時丟出 RuntimeError"""
+        if self._lock_file is not None:
+            return
+        if not FCNTL_AVAILABLE:
+            # 沒有檔案鎖無法保證單一寫入程序，兩個寫入程序會重複寫入同一批次
+            raise RuntimeError("此平台不支援 fcntl 檔案鎖，無法啟動寫入程序")
+        Path(self.spool_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(f"{self.spool_path}.lock", 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f"已有其他寫入程序在處理 {self.spool_path}")
+        self._lock_file = lock_file
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _last_applied(self, generation: str) -> int:
+        with self.db._connections.read('ingestion_log') as conn:
+            row = conn.execute("SELECT last_batch_id FROM ingestion_log WHERE generation = ?", (generation,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _log_applied(self, conn: sqlite3.Connection, generation: str, batch_id: int):
+        """在既有交易內記錄佇列世代已寫入的最大批次編號"""
+        conn.execute('''
+            INSERT INTO ingestion_log (generation, spool, last_batch_id, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(generation) DO UPDATE SET
+                last_batch_id = MAX(last_batch_id, excluded.last_batch_id),
+                spool = excluded.spool,
+                updated_at = excluded.updated_at
+        ''', (generation, self.spool_key, batch_id, datetime.now().isoformat()))
+
+    def _fetch_batches(self, spool: sqlite3.Connection, after_id: int) -> List[Tuple]:
+        """依序取出待寫入批次，累計到 max_transaction_rows 為止（至少一批）"""
+        batches = []
+        total = 0
+        cursor = spool.execute(
+            "SELECT id, kind, symbol, rows, payload FROM spool_batches WHERE id > ? ORDER BY id", (after_id,)
+        )
+        for batch in cursor:
+            if batches and total + batch[3] > self.max_transaction_rows:
+                break
+            batches.append(batch)
+            total += batch[3]
+        cursor.close()
+        return batches
+
+    def _apply(self, generation: str, batches: List[Tuple]):
+        """在同一交易內依（種類, 指數）合併後寫入，並記錄已寫入的批次編號"""
+        groups: Dict[Tuple[str, str], List[pd.DataFrame]] = {}
+        for _, kind, symbol, _, payload in batches:
+            groups.setdefault((kind, symbol), []).append(_decode_frame(payload))
+
+        with self.db._connections.write('ingestion_writer') as conn:
+            for (kind, symbol), frames in groups.items():
+                # 依提交順序串接，同一日期以較晚的批次為準
+                frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+                if kind == 'bars':
+                    self.db.append_bars(symbol, frame)
+                elif kind == 'intraday':
+                    self.db.insert_intraday_bars(symbol, frame)
+                else:
+                    raise ValueError(f"未知的批次種類: {kind}")
+            self._log_applied(conn, generation, batches[-1][0])
+
+    def run_once(self) -> Dict:
+        """處理一輪待寫入批次，回傳寫入批次數與筆數"""
+        self.acquire()
+        spool = _spool_connect(self.spool_path)
+        try:
+            generation = _spool_generation(spool)
+            last_applied = self._last_applied(generation)
+            # 上次提交後、清除暫存前中斷的批次已寫入，直接清除
+            spool.execute("DELETE FROM spool_batches WHERE id <= ?", (last_applied,))
+
+            batches = self._fetch_batches(spool, last_applied)
+            if not batches:
+                return {'batches': 0, 'rows': 0, 'failed': 0}
+
+            failed = 0
+            started = time.perf_counter()
+            try:
+                self._apply(generation, batches)
+            except Exception as e:
+                # 合併寫入失敗時逐批重試，仍失敗的批次移到 failed_batches，避免卡住整個佇列
+                print(f"⚠️ 合併寫入失敗，改為逐批寫入: {e}")
+                for batch in batches:
+                    try:
+                        self._apply(generation, [batch])
+                    except Exception as batch_error:
+                        failed += 1
+                        self._move_to_failed(spool, generation, batch, batch_error)
+
+            spool.execute("DELETE FROM spool_batches WHERE id <= ?", (batches[-1][0],))
+            rows = sum(batch[3] for batch in batches)
+            elapsed = time.perf_counter() - started
+            print(f"📦 寫入佇列：合併 {len(batches):,} 批、{rows:,} 筆，耗時 {elapsed:.3f} 秒")
+            return {'batches': len(batches), 'rows': rows, 'failed': failed, 'seconds': round(elapsed, 4)}
+        finally:
+            spool.close()
+
+    def _move_to_failed(self, spool: sqlite3.Connection, generation: str, batch: Tuple, error: Exception):
+        batch_id, kind, symbol, rows, payload = batch
+        spool.execute(
+            "INSERT OR REPLACE INTO failed_batches (id, kind, symbol, rows, payload, error, failed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (batch_id, kind, symbol, rows, payload, str(error), datetime.now().isoformat())
+        )
+        with self.db._connections.write('ingestion_writer') as conn:
+            self._log_applied(conn, generation, batch_id)
+        print(f"❌ 批次 {batch_id}（{symbol}）寫入失敗，已移至 failed_batches: {error}")
+
+    def run_forever(self):
+        """持續處理佇列直到 stop()"""
+        self.acquire()
+        print(f"🚚 寫入程序啟動：{self.spool_path}")
+        try:
+            while not self._stop.is_set():
+                result = self.run_once()
+                if result['batches'] == 0:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.release()
+
+    def start(self) -> threading.Thread:
+        """在背景執行緒中啟動寫入程序"""
+        self.acquire()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="ingestion-writer", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+if __name__ == "__main__":
+    IngestionWriter().run_forever()
@@ -0,0 +1,289 @@
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from historical_database import HistoricalDatabase
+from walk_forward import WalkForwardEvaluator, year_inputs
+
+# 優化結果檔（預測引擎啟動時載入 parameters）
+OPTIMIZED_PARAMETERS_PATH = "data/optimized_parameters.json"
+
+# 搜尋空間：參數 -> 網格候選值（隨機搜尋在最小值與最大值之間均勻取樣）
+# 美國/台指風氣的權重與點數換算倍數只以乘積影響最終預測，權重固定為預設值，只搜尋換算倍數
+PARAMETER_SPACE = {
+    'historical_accuracy_weight': (0.0, 0.2, 0.4),
+    'macd_adjustment_multiplier': (1, 2, 4),
+    'rsi_adjustment_multiplier': (1.5, 3, 6),
+    'us_impact_scale': (15, 50, 100, 150),
+    'txf_impact_scale': (20, 80, 160, 240)
+}
+
+# 結果檔保留的排名筆數
+RANKING_SIZE = 20
+
+# 各程序共用的重播數據（程序池 initializer 或逐一計算時設定）
+_shared: Dict = {}
+
+def grid_candidates(space: Dict[str, Sequence[float]]) -> List[Dict]:
+    """搜尋空間的完整網格"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_candidates(space: Dict[str, Sequence[float]], count: int, seed: int = 0) -> List[Dict]:
+    """在各參數的最小值與最大值之間均勻取樣"""
+    rng = np.random.default_rng(seed)
+    return [
+        {name: round(float(rng.uniform(min(values), max(values))), 3) for name, values in space.items()}
+        for _ in range(count)
+    ]
+
+def load_optimized_parameters(path: str = OPTIMIZED_PARAMETERS_PATH) -> Optional[Dict]:
+    """讀取優化結果中排名第一的參數（尚未執行優化時回傳 None）"""
+    if not Path(path).exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('parameters')
+
+def _effectiveness_asof(evaluator: WalkForwardEvaluator, as_of: str) -> Dict:
+    """指定日期已知的美國/台指風氣實測有效性（尚無結果時用預測引擎的預設值）"""
+    from enhanced_prediction_engine import DEFAULT_COMPONENT_ACCURACY
+
+    effectiveness = {}
+    for key, component in (('us_effectiveness', 'US_SENTIMENT'), ('txf_effectiveness', 'TXF_SENTIMENT')):
+        measured = evaluator.get_asof(component, as_of, refresh=False)
+        effectiveness[key] = measured['hit_rate'] if measured and measured['hit_rate'] is not None \
+            else DEFAULT_COMPONENT_ACCURACY[component]
+    return effectiveness
+
+def _attach(name: str, shape: Tuple[int, int], segments: List[Tuple[int, int, Dict]]):
+    """連接共享記憶體中的重播數據，並切成各年度的快照表格（不複製數據）"""
+    from enhanced_prediction_engine import BATCH_INPUT_COLUMNS
+
+    memory = shared_memory.SharedMemory(name=name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    _shared.clear()
+    _shared['memory'] = memory
+    _shared['segments'] = [
+        (pd.DataFrame(matrix[start:stop, :-1], columns=list(BATCH_INPUT_COLUMNS), copy=False),
+         matrix[start:stop, -1], parameters)
+        for start, stop, parameters in segments
+    ]
+
+def _evaluate_chunk(candidates: List[Dict], segment_ids: Tuple[int, ...]) -> List[Dict]:
+    """以批次預測重播指定年度，計算每組參數的績效
+
+    訊號為最終預測扣除道瓊換算基準後的點數（即可調參數產生的漲跌預測），
+    依訊號方向持有一個交易日，score 為平均每個交易日取得的點數。
+    """
+    from enhanced_prediction_engine import predict_snapshots
+
+    results = []
+    for candidate in candidates:
+        days = signals = hits = 0
+        points = abs_error = 0.0
+        for segment_id in segment_ids:
+            snapshots, realized_close, parameters = _shared['segments'][segment_id]
+            predictions = predict_snapshots(snapshots, {**parameters, **candidate})
+            signal = predictions['final_prediction'].to_numpy() - predictions['dji_base_prediction'].to_numpy()
+            realized_move = realized_close - snapshots['TXF1_close'].to_numpy()
+            valid = ~(np.isnan(signal) | np.isnan(realized_move))
+            signal, realized_move = signal[valid], realized_move[valid]
+            direction = np.sign(signal)
+
+            days += len(signal)
+            signals += int(np.count_nonzero(direction))
+            hits += int(np.count_nonzero((direction != 0) & (direction == np.sign(realized_move))))
+            points += float((direction * realized_move).sum())
+            abs_error += float(np.abs(signal - realized_move).sum())
+        results.append({
+            'parameters': candidate,
+            'score': points / days if days else float('nan'),
+            'hit_rate': hits / signals if signals else None,
+            'signals': signals,
+            'days': days,
+            'mean_abs_error': abs_error / days if days else None
+        })
+    return results
+
+class ParameterOptimizer:
+    """以 walk-forward 重播搜尋引擎權重與點數換算倍數
+
+    各年度使用年初已知的相關性、滾動統計與季節性效應（與 WalkForwardEvaluator 相同），
+    風氣影響點數再乘上年初已知的 walk-forward 實測有效性（與預測引擎相同），只替換搜尋中的參數。
+    重播數據放在共享記憶體，由程序池分批評估候選參數；評估為全部歷史的樣本內績效。
+    """
+
+    def __init__(self, db: HistoricalDatabase, space: Dict[str, Sequence[float]] = PARAMETER_SPACE,
+                 processes: Optional[int] = None):
+        self.db = db
+        self.space = dict(space)
+        self.processes = processes or min(os.cpu_count() or 1, 8)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._attach_args: Optional[Tuple] = None
+        self.segment_years: List[int] = []
+
+    def _load_segments(self) -> Tuple[np.ndarray, List[Tuple[int, int, Dict]]]:
+        """載入所有年度的重播輸入，合併為單一矩陣（快照欄位 + 次日實際收盤）"""
+        from enhanced_prediction_engine import BATCH_INPUT_COLUMNS
+
+        # walk-forward 重播前會先更新相關性
+        evaluator = WalkForwardEvaluator(self.db, processes=self.processes)
+        evaluator.rebuild()
+        blocks, segments, self.segment_years = [], [], []
+        start = 0
+        for year in evaluator._years():
+            inputs = year_inputs(self.db, year)
+            if inputs is None:
+                continue
+            inputs['parameters'].update(_effectiveness_asof(evaluator, f"{year - 1}-12-31"))
+            block = np.column_stack([
+                inputs['snapshots'][list(BATCH_INPUT_COLUMNS)].to_numpy(dtype=float),
+                inputs['realized_close'].astype(float)
+            ])
+            blocks.append(block)
+            segments.append((start, start + len(block), inputs['parameters']))
+            self.segment_years.append(year)
+            start += len(block)
+        if not blocks:
+            raise ValueError("沒有可重播的歷史數據")
+        return np.ascontiguousarray(np.vstack(blocks)), segments
+
+    def evaluate(self, candidates: List[Dict], segment_ids: Sequence[int]) -> List[Dict]:
+        """評估候選參數（程序池不可用時改在目前程序計算）"""
+        segment_ids = tuple(segment_ids)
+        workers = self._executor._max_workers if self._executor is not None else 1
+        size = max(1, math.ceil(len(candidates) / (workers * 4)))
+        chunks = [candidates[i:i + size] for i in range(0, len(candidates), size)]
+        if self._executor is not None:
+            try:
+                return [result for chunk in self._executor.map(_evaluate_chunk, chunks, [segment_ids] * len(chunks))
+                        for result in chunk]
+            except (OSError, BrokenExecutor) as e:
+                print(f"⚠️ 程序池無法使用，改為在目前程序計算: {e}")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                _attach(*self._attach_args)
+        return [result for chunk in chunks for result in _evaluate_chunk(chunk, segment_ids)]
+
+    def _start(self, memory: shared_memory.SharedMemory, shape: Tuple[int, int], segments: List) -> None:
+        self._attach_args = (memory.name, shape, segments)
+        if self.processes > 1:
+            try:
+                # 以 spawn 啟動，子程序不繼承父程序的 SQLite 連線；重播數據經由共享記憶體讀取
+                context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                                     initializer=_attach, initargs=self._attach_args)
+                return
+            except (OSError, NotImplementedError) as e:
+                print(f"⚠️ 無法啟動程序池，改為在目前程序計算: {e}")
+        _attach(*self._attach_args)
+
+    def _stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        memory = _shared.pop('memory', None)
+        _shared.clear()
+        if memory is not None:
+            memory.close()
+
+    def optimize(self, method: str = 'halving', samples: int = 81, eta: int = 3, seed: int = 0) -> Dict:
+        """執行搜尋並回傳排名結果
+
+        method: 'grid'（完整網格）、'random'（隨機取樣 samples 組）、
+        'halving'（successive halving：隨機取樣 samples 組，先以最近幾年評估，每輪保留 1/eta 並擴大年度數）
+        目前使用中的預設參數一律列入候選作為比較基準。
+        """
+        from enhanced_prediction_engine import DEFAULT_ENGINE_PARAMETERS
+
+        if method == 'grid':
+            candidates = grid_candidates(self.space)
+        elif method in ('random', 'halving'):
+            candidates = random_candidates(self.space, samples, seed)
+        else:
+            raise ValueError(f"不支援的搜尋方法: {method}")
+        baseline = {name: DEFAULT_ENGINE_PARAMETERS[name] for name in self.space}
+        if baseline not in candidates:
+            candidates.insert(0, baseline)
+
+        started = time.perf_counter()
+        matrix, segments = self._load_segments()
+        memory = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+        try:
+            np.ndarray(matrix.shape, dtype=np.float64, buffer=memory.buf)[:] = matrix
+            self._start(memory, matrix.shape, segments)
+            all_segments = list(range(len(segments)))
+            evaluated = len(candidates)
+            if method == 'halving':
+                results, evaluated = self._successive_halving(candidates, all_segments, eta)
+            else:
+                results = self.evaluate(candidates, all_segments)
+            baseline_result = next(result for result in results if result['parameters'] == baseline) \
+                if any(result['parameters'] == baseline for result in results) \
+                else self.evaluate([baseline], all_segments)[0]
+        finally:
+            self._stop()
+            memory.close()
+            memory.unlink()
+
+        ranking = sorted(results, key=_rank_key)
+        elapsed = time.perf_counter() - started
+        best = ranking[0]
+        print(f"🧪 參數優化完成（{method}）：評估 {evaluated:,} 次，{elapsed:.1f} 秒；"
+              f"最佳每日 {best['score']:+.2f} 點，基準 {baseline_result['score']:+.2f} 點")
+        return {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'method': method,
+            'objective': 'mean_points_per_day',
+            'data_version': self.db.get_data_version(),
+            'years': [self.segment_years[0], self.segment_years[-1]],
+            'evaluations': evaluated,
+            'seconds': round(elapsed, 2),
+            'parameters': best['parameters'],
+            'baseline': baseline_result,
+            'ranking': [{'rank': rank, **result} for rank, result in enumerate(ranking[:RANKING_SIZE], 1)]
+        }
+
+    def _successive_halving(self, candidates: List[Dict], segment_ids: List[int], eta: int) -> Tuple[List[Dict], int]:
+        """逐輪以最近的年度評估並保留前 1/eta，最後一輪使用全部年度（回傳最後一輪結果與總評估次數）"""
+        total = len(segment_ids)
+        rungs = max(0, min(int(math.log(len(candidates), eta)), int(math.log(total, eta))))
+        evaluated = 0
+        for rung in range(rungs + 1):
+            years = min(total, math.ceil(total * eta ** (rung - rungs)))
+            results = self.evaluate(candidates, segment_ids[total - years:])
+            evaluated += len(candidates)
+            if rung == rungs:
+                return results, evaluated
+            ranked = sorted(results, key=_rank_key)
+            candidates = [result['parameters'] for result in ranked[:max(1, len(ranked) // eta)]]
+        return results, evaluated
+
+def _rank_key(result: Dict) -> Tuple:
+    """依每日平均點數由高到低排序，再依命中率"""
+    score = result['score'] if not math.isnan(result['score']) else -math.inf
+    return (-score, -(result['hit_rate'] or 0))
+
+def save_optimized_parameters(result: Dict, path: str = OPTIMIZED_PARAMETERS_PATH) -> None:
+    """寫入優化結果（先寫暫存檔再取代，避免引擎讀到寫到一半的檔案）"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    staging = f"{path}.tmp"
+    with open(staging, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    os.replace(staging, path)
+    print(f"💾 已儲存優化參數: {path}")
+
+if __name__ == "__main__":
+    import sys
+    method = sys.argv[1] if len(sys.argv) > 1 else 'halving'
+    optimizer = ParameterOptimizer(HistoricalDatabase())
+    save_optimized_parameters(optimizer.optimize(method))
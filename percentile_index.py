@@ -0,0 +1,167 @@
+import bisect
+import math
+import numpy as np
+from collections import deque
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+# 分塊排序串列每塊的目標筆數（超過兩倍時分裂）
+BLOCK_SIZE = 64
+
+class SlidingPercentileIndex:
+    """固定長度滑動視窗的百分位索引：分塊排序串列 + 區塊筆數的 Fenwick 樹
+
+    數值依大小分散在多個長度不超過 2 × BLOCK_SIZE 的排序區塊中，以各區塊最大值二分搜尋定位區塊，
+    區塊前的累計筆數由 Fenwick 樹取得：rank 與 push 都是 O(log n)（區塊內搬移最多 2 × BLOCK_SIZE 筆）。
+    空值佔用視窗長度但不參與排序，百分位 = 小於查詢值的筆數 / 視窗內筆數 × 100。
+    """
+
+    def __init__(self, window: int, values: Iterable[float] = ()):
+        if window < 1:
+            raise ValueError(f"視窗長度需大於0: {window}")
+        self.window = window
+        recent = [float(value) for value in values][-window:]
+        self._values = deque(recent)
+        ordered = sorted(value for value in recent if not math.isnan(value))
+        self._blocks: List[List[float]] = [ordered[i:i + BLOCK_SIZE] for i in range(0, len(ordered), BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._build_tree()
+        self._array: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def values(self) -> np.ndarray:
+        """視窗內的數值（依加入順序）"""
+        return np.fromiter(self._values, dtype=float, count=len(self._values))
+
+    def push(self, value: float) -> Optional[float]:
+        """加入最新一筆數值，超出視窗時移除最舊的一筆（回傳被移除的數值）"""
+        value = float(value)
+        self._values.append(value)
+        if not math.isnan(value):
+            self._insert(value)
+        self._array = None
+
+        if len(self._values) <= self.window:
+            return None
+        oldest = self._values.popleft()
+        if not math.isnan(oldest):
+            self._remove(oldest)
+        return oldest
+
+    def rank(self, value: float) -> Optional[float]:
+        """查詢值在視窗中的百分位（視窗為空時回傳 None，空值查詢為 0）"""
+        if not self._values:
+            return None
+        below = 0 if math.isnan(value) else self._count_below(value)
+        return below / len(self._values) * 100
+
+    def ranks(self, values: np.ndarray) -> np.ndarray:
+        """批次查詢多個數值的百分位（與逐筆 rank 結果相同）"""
+        if self._array is None:
+            self._array = np.fromiter(chain.from_iterable(self._blocks), dtype=float)
+        values = np.asarray(values, dtype=float)
+        below = np.where(np.isnan(values), 0, np.searchsorted(self._array, values, side='left'))
+        return below / len(self._values) * 100
+
+    def copy(self) -> 'SlidingPercentileIndex':
+        """複製一份可獨立 push 的索引（共用快取中的索引不應直接修改）"""
+        clone = SlidingPercentileIndex.__new__(SlidingPercentileIndex)
+        clone.window = self.window
+        clone._values = deque(self._values)
+        clone._blocks = [list(block) for block in self._blocks]
+        clone._maxes = list(self._maxes)
+        clone._tree = list(self._tree)
+        clone._array = self._array
+        return clone
+
+    def _count_below(self, value: float) -> int:
+        # 定位區塊之前的各區塊最大值都小於 value
+        position = bisect.bisect_left(self._maxes, value)
+        below = self._prefix(position)
+        if position < len(self._blocks):
+            below += bisect.bisect_left(self._blocks[position], value)
+        return below
+
+    def _insert(self, value: float):
+        if not self._blocks:
+            self._blocks.append([value])
+            self._maxes.append(value)
+            self._build_tree()
+            return
+        position = min(bisect.bisect_left(self._maxes, value), len(self._blocks) - 1)
+        block = self._blocks[position]
+        bisect.insort(block, value)
+        self._maxes[position] = block[-1]
+        if len(block) > 2 * BLOCK_SIZE:
+            # 分裂過大的區塊（平均每 BLOCK_SIZE 次插入才重建一次 Fenwick 樹）
+            self._blocks[position:position + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._maxes[position:position + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+            self._build_tree()
+        else:
+            self._add(position, 1)
+
+    def _remove(self, value: float):
+        position = bisect.bisect_left(self._maxes, value)
+        block = self._blocks[position]
+        del block[bisect.bisect_left(block, value)]
+        if block:
+            self._maxes[position] = block[-1]
+            self._add(position, -1)
+        else:
+            del self._blocks[position]
+            del self._maxes[position]
+            self._build_tree()
+
+    def _build_tree(self):
+        """以各區塊筆數建立 Fenwick 樹（O(區塊數)）"""
+        tree = [0] * (len(self._blocks) + 1)
+        for position, block in enumerate(self._blocks, start=1):
+            tree[position] += len(block)
+            parent = position + (position & -position)
+            if parent < len(tree):
+                tree[parent] += tree[position]
+        self._tree = tree
+
+    def _add(self, position: int, delta: int):
+        position += 1
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position += position & -position
+
+    def _prefix(self, position: int) -> int:
+        """前 position 個區塊的總筆數"""
+        total = 0
+        while position > 0:
+            total += self._tree[position]
+            position -= position & -position
+        return total
+
+def benchmark_percentile_index(window: int = 252, ticks: int = 200_000) -> Dict:
+    """量測滑動更新與百分位查詢的吞吐量"""
+    import time
+    rng = np.random.default_rng(0)
+    index = SlidingPercentileIndex(window, rng.uniform(0, 100, window))
+    values = rng.uniform(0, 100, ticks).tolist()
+
+    started = time.perf_counter()
+    for value in values:
+        index.rank(value)
+    rank_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in values:
+        index.push(value)
+    push_seconds = time.perf_counter() - started
+
+    print(f"📐 視窗 {window} 筆：查詢 {round(ticks / rank_seconds):,} 次/秒，滑動更新 {round(ticks / push_seconds):,} 次/秒")
+    return {
+        'window': window,
+        'ticks': ticks,
+        'ranks_per_second': round(ticks / rank_seconds),
+        'pushes_per_second': round(ticks / push_seconds)
+    }
+
+if __name__ == "__main__":
+    benchmark_percentile_index()
@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from historical_database import HistoricalDatabase, _day_bound, _day_numbers, _day_to_string
+
+# 滾動視窗（交易日）
+ROLLING_WINDOWS = (20, 60, 252)
+
+# 與台指比較的來源指數
+SOURCE_SYMBOLS = ('DJI', 'NDX', 'SOXX')
+
+DERIVED_NAME = 'rolling_correlations'
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """以累積和計算每個位置往前 window 筆的總和（不足一個視窗為 NaN）"""
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    result[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return result
+
+def rolling_pair_statistics(source: np.ndarray, target: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """O(n) 計算滾動相關係數與 beta（target 對 source）"""
+    # 先扣除整體平均，降低累積和相減的數值誤差
+    x = source - np.nanmean(source)
+    y = target - np.nanmean(target)
+
+    sum_x = _window_sums(x, window)
+    sum_y = _window_sums(y, window)
+    sum_xx = _window_sums(x * x, window)
+    sum_yy = _window_sums(y * y, window)
+    sum_xy = _window_sums(x * y, window)
+
+    cov = sum_xy - sum_x * sum_y / window
+    var_x = sum_xx - sum_x * sum_x / window
+    var_y = sum_yy - sum_y * sum_y / window
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_x
+    correlation[~np.isfinite(correlation)] = np.nan
+    beta[~np.isfinite(beta)] = np.nan
+    return np.clip(correlation, -1.0, 1.0), beta
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """O(n) 滾動平均"""
+    return _window_sums(values, window) / window
+
+class RollingCorrelationEngine:
+    """一次掃描計算全部歷史的滾動相關性、beta 與價格比例，並持久化供 as-of 查詢"""
+
+    def __init__(self, db: HistoricalDatabase, windows: Tuple[int, ...] = ROLLING_WINDOWS):
+        self.db = db
+        self.windows = tuple(windows)
+
+    def compute(self) -> pd.DataFrame:
+        """計算每個交易日、每個視窗長度的滾動統計（長格式）"""
+        symbols = ['TXF'] + list(SOURCE_SYMBOLS)
+        closes = self.db.get_aligned_history(symbols, '0000-01-01', '9999-12-31')['close']
+        if len(closes) < 2:
+            return pd.DataFrame(columns=['date', 'window', 'symbol', 'correlation', 'beta', 'ratio'])
+
+        dates = closes.index.strftime('%Y-%m-%d').to_numpy()
+        prices = {symbol: closes[symbol].to_numpy() for symbol in symbols}
+        returns = {symbol: np.concatenate(([np.nan], np.diff(values) / values[:-1])) for symbol, values in prices.items()}
+
+        frames = []
+        for window in self.windows:
+            for symbol in SOURCE_SYMBOLS:
+                # 報酬率第一筆為空值，從第二筆開始計算
+                correlation = np.full(len(dates), np.nan)
+                beta = np.full(len(dates), np.nan)
+                correlation[1:], beta[1:] = rolling_pair_statistics(returns[symbol][1:], returns['TXF'][1:], window)
+                ratio = rolling_mean(prices['TXF'] / prices[symbol], window)
+                frames.append(pd.DataFrame({
+                    'date': dates,
+                    'window': window,
+                    'symbol': symbol,
+                    'correlation': correlation,
+                    'beta': beta,
+                    'ratio': ratio
+                }))
+
+        result = pd.concat(frames, ignore_index=True)
+        return result.dropna(subset=['correlation', 'ratio'], how='all')
+
+    def rebuild(self, force: bool = False) -> Dict:
+        """數據版本改變（或 force）時重新計算並寫入 rolling_correlations"""
+        data_version = self.db.get_data_version()
+        if not force and self.db.get_derived_version(DERIVED_NAME) == data_version:
+            return {'rebuilt': False, 'data_version': data_version}
+
+        result = self.compute()
+        rows = zip(
+            _day_numbers(result['date']).tolist(),
+            result['window'].astype(int).tolist(),
+            result['symbol'].tolist(),
+            [None if pd.isna(v) else float(v) for v in result['correlation']],
+            [None if pd.isna(v) else float(v) for v in result['beta']],
+            [None if pd.isna(v) else float(v) for v in result['ratio']]
+        )
+        with self.db._connections.write('rolling_correlations') as conn:
+            conn.execute("DELETE FROM rolling_correlations")
+            conn.executemany('''
+                INSERT INTO rolling_correlations (day, window_size, symbol, correlation, beta, ratio)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self.db._set_derived_version(conn, DERIVED_NAME, data_version)
+
+        print(f"📈 滾動相關性已更新：{len(result):,} 筆（視窗 {', '.join(map(str, self.windows))}）")
+        return {'rebuilt': True, 'data_version': data_version, 'rows': len(result)}
+
+    def get_asof(self, as_of_date: Optional[str] = None, window: int = 252, refresh: bool = True) -> Optional[Dict]:
+        """查詢指定日期（含）之前最近一個交易日的相關性、beta 與比例"""
+        if refresh:
+            self.rebuild()
+        as_of_date = as_of_date or datetime.now().strftime('%Y-%m-%d')
+
+        with self.db._connections.read('rolling_correlations_asof') as conn:
+            rows = conn.execute('''
+                SELECT day, symbol, correlation, beta, ratio FROM rolling_correlations
+                WHERE window_size = ? AND day = (
+                    SELECT MAX(day) FROM rolling_correlations WHERE window_size = ? AND day <= ?
+                )
+            ''', (window, window, _day_bound(as_of_date))).fetchall()
+
+        if not rows:
+            return None
+
+        result = {'as_of': _day_to_string(rows[0][0]), 'window': window}
+        for _, symbol, correlation, beta, ratio in rows:
+            prefix = f"{symbol.lower()}_txf"
+            result[f"{prefix}_correlation"] = correlation
+            result[f"{prefix}_beta"] = beta
+            result[f"{prefix}_ratio"] = ratio
+        return result
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+# 各統計量的回溯K棒數（與預測引擎的歷史視窗一致）
+STAT_WINDOWS = {
+    'volatility': 30,
+    'volume': 30,
+    'rsi': 252,
+    'macd': 60
+}
+
+# rolling_stats 表格的統計欄位
+ROLLING_STAT_COLUMNS = (
+    'volatility',
+    'volume_mean', 'volume_std', 'volume_median',
+    'rsi_q20', 'rsi_q80', 'rsi_median',
+    'macd_mean', 'macd_std'
+)
+
+# 重算某日以後的統計時，需要往前多讀的K棒數（最長視窗扣除當日）
+LOOKBACK_ROWS = max(STAT_WINDOWS.values()) - 1
+
+def compute_rolling_stats(close: np.ndarray, volume: np.ndarray, rsi: np.ndarray,
+                          histogram: np.ndarray) -> Dict[str, np.ndarray]:
+    """計算每根K棒（含）往前固定K棒數的滾動統計
+
+    空值不計入統計，視窗內無有效數值時為 NaN；標準差為樣本標準差。
+    波動度為視窗內收盤價報酬率的年化標準差（30 根收盤價即 29 個報酬率）。
+    """
+    close = pd.Series(close, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = close / close.shift(1) - 1
+    returns[~np.isfinite(returns)] = np.nan
+
+    volume = pd.Series(volume, dtype=float).rolling(STAT_WINDOWS['volume'], min_periods=1)
+    rsi = pd.Series(rsi, dtype=float).rolling(STAT_WINDOWS['rsi'], min_periods=1)
+    histogram = pd.Series(histogram, dtype=float).rolling(STAT_WINDOWS['macd'], min_periods=1)
+
+    stats = {
+        'volatility': returns.rolling(STAT_WINDOWS['volatility'] - 1, min_periods=1).std() * np.sqrt(252),
+        'volume_mean': volume.mean(),
+        'volume_std': volume.std(),
+        'volume_median': volume.median(),
+        'rsi_q20': rsi.quantile(0.2),
+        'rsi_q80': rsi.quantile(0.8),
+        'rsi_median': rsi.median(),
+        'macd_mean': histogram.mean(),
+        'macd_std': histogram.std()
+    }
+    return {column: values.to_numpy() for column, values in stats.items()}
@@ -0,0 +1,201 @@
+import math
+import pandas as pd
+import numpy as np
+from datetime import date
+from typing import Dict, Optional, Tuple
+from historical_database import HistoricalDatabase, _day_numbers, _day_to_string
+from trading_calendar import TradingCalendar
+
+# 季節性分組維度
+DIMENSIONS = ('month', 'weekday', 'days_to_expiry')
+
+# 視為顯著的 t 統計量門檻與最少樣本數
+SIGNIFICANCE_T = 2.0
+MIN_SAMPLES = 20
+
+# 計算季節性效應的指數
+SEASONAL_SYMBOLS = ('TXF',)
+
+DERIVED_NAME = 'seasonal_effects'
+
+def settlement_positions(days: np.ndarray, calendar: TradingCalendar) -> np.ndarray:
+    """各日期對應的台指期結算日在交易日曆中的位置
+
+    結算日為每月第三個星期三（遇休市順延至下一個交易日）；已過當月結算日者對應次月。
+    """
+    days = np.asarray(days, dtype=np.int64)
+    months = days.astype('datetime64[D]').astype('datetime64[M]')
+    this_month = _third_wednesday_position(months, calendar)
+    next_month = _third_wednesday_position(months + 1, calendar)
+    return np.where(np.searchsorted(calendar.days, days, side='left') > this_month, next_month, this_month)
+
+def _third_wednesday_position(months: np.ndarray, calendar: TradingCalendar) -> np.ndarray:
+    first = months.astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 為星期四：(日序 + 3) % 7 得到 星期一=0，星期三=2
+    third_wednesday = first + (2 - (first + 3)) % 7 + 14
+    return np.searchsorted(calendar.days, third_wednesday, side='left')
+
+def seasonal_buckets(days: np.ndarray, calendar: TradingCalendar) -> Dict[str, np.ndarray]:
+    """各日期的月份、星期與距結算日交易日數（結算日當天為0）"""
+    days = np.asarray(days, dtype=np.int64)
+    dates = days.astype('datetime64[D]')
+    return {
+        'month': (dates.astype('datetime64[M]').astype(np.int64) % 12 + 1),
+        'weekday': (days + 3) % 7,
+        'days_to_expiry': settlement_positions(days, calendar) - np.searchsorted(calendar.days, days, side='left')
+    }
+
+def _is_significant(effect: Optional[Dict]) -> bool:
+    """樣本數足夠且 |t| 達門檻的分組才計入調整"""
+    return (
+        effect is not None and effect['t_stat'] is not None
+        and effect['sample_count'] >= MIN_SAMPLES and abs(effect['t_stat']) >= SIGNIFICANCE_T
+    )
+
+def adjustment_points(effects: Dict[Tuple[str, int], Dict], days: np.ndarray, calendar: TradingCalendar) -> np.ndarray:
+    """多個目標交易日的季節性調整點數（與 adjustment 相同的顯著性規則）"""
+    buckets = seasonal_buckets(days, calendar)
+    points = np.zeros(len(np.asarray(days)))
+    for dimension in DIMENSIONS:
+        excess = {bucket: effect['excess_move'] for (name, bucket), effect in effects.items()
+                  if name == dimension and _is_significant(effect)}
+        points += np.array([excess.get(int(bucket), 0.0) for bucket in buckets[dimension]])
+    return points
+
+class SeasonalEffectsEngine:
+    """以完整歷史一次分組計算台指的月份、星期與結算週期效應，持久化後 O(1) 查詢"""
+
+    def __init__(self, db: HistoricalDatabase, symbols: Tuple[str, ...] = SEASONAL_SYMBOLS):
+        self.db = db
+        self.symbols = tuple(symbols)
+
+    def _source_version(self) -> int:
+        return sum(self.db.get_data_version(symbol) for symbol in self.symbols)
+
+    def compute(self, end_date: str = '9999-12-31') -> pd.DataFrame:
+        """計算各維度各分組的平均漲跌點數、相對整體平均的超額點數與顯著性（只使用 end_date 以前的歷史）"""
+        frames = []
+        for symbol in self.symbols:
+            history = self.db.get_historical_data(symbol, '0000-01-01', end_date, '1d')
+            if len(history) < 2:
+                continue
+            days = _day_numbers(history['date'])
+            moves = history['close'].diff().to_numpy()
+            valid = ~np.isnan(moves)
+            buckets = seasonal_buckets(days, self.db.get_trading_calendar(symbol))
+            overall_mean = moves[valid].mean()
+
+            samples = pd.DataFrame({dimension: values[valid] for dimension, values in buckets.items()})
+            samples['move'] = moves[valid]
+            for dimension in DIMENSIONS:
+                grouped = samples.groupby(dimension)['move'].agg(['count', 'mean', 'std']).reset_index()
+                excess = grouped['mean'] - overall_mean
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    t_stat = excess / (grouped['std'] / np.sqrt(grouped['count']))
+                frames.append(pd.DataFrame({
+                    'symbol': symbol,
+                    'dimension': dimension,
+                    'bucket': grouped[dimension].astype(int),
+                    'sample_count': grouped['count'].astype(int),
+                    'mean_move': grouped['mean'],
+                    'std_move': grouped['std'],
+                    'excess_move': excess,
+                    't_stat': t_stat.where(np.isfinite(t_stat))
+                }))
+
+        if not frames:
+            return pd.DataFrame(columns=['symbol', 'dimension', 'bucket', 'sample_count', 'mean_move',
+                                         'std_move', 'excess_move', 't_stat', 'p_value'])
+        result = pd.concat(frames, ignore_index=True)
+        # 雙尾 p 值（樣本數大時以常態近似 t 分佈）
+        result['p_value'] = [None if pd.isna(t) else math.erfc(abs(t) / math.sqrt(2)) for t in result['t_stat']]
+        return result
+
+    def rebuild(self, force: bool = False) -> Dict:
+        """數據版本改變（或 force）時重新計算並寫入 seasonal_effects"""
+        data_version = self._source_version()
+        if not force and self.db.get_derived_version(DERIVED_NAME) == data_version:
+            return {'rebuilt': False, 'data_version': data_version}
+
+        result = self.compute()
+        columns = ['symbol', 'dimension', 'bucket', 'sample_count', 'mean_move', 'std_move', 'excess_move', 't_stat', 'p_value']
+        rows = [
+            tuple(None if pd.isna(value) else value for value in row)
+            for row in result[columns].astype(object).itertuples(index=False)
+        ]
+        with self.db._connections.write('seasonal_effects') as conn:
+            conn.execute("DELETE FROM seasonal_effects")
+            conn.executemany(f'''
+                INSERT INTO seasonal_effects ({', '.join(columns)})
+                VALUES ({', '.join('?' * len(columns))})
+            ''', rows)
+            self.db._set_derived_version(conn, DERIVED_NAME, data_version)
+
+        significant = int((result['t_stat'].abs() >= SIGNIFICANCE_T).sum())
+        print(f"📅 季節性效應已更新：{len(result):,} 個分組（{significant} 個顯著）")
+        return {'rebuilt': True, 'data_version': data_version, 'rows': len(result)}
+
+    def get_effects(self, symbol: str = 'TXF', refresh: bool = True) -> Dict[Tuple[str, int], Dict]:
+        """(維度, 分組) -> 統計 的對照表（依表格的來源數據版本快取；refresh 時過期先重建，否則讀取上次建好的結果）"""
+        symbol = symbol.upper()
+        if refresh:
+            self.rebuild()
+        cache_key = (self.db._cache_namespace, DERIVED_NAME, symbol, self.db.get_derived_version(DERIVED_NAME))
+        effects = self.db._result_cache.get(cache_key)
+        if effects is not None:
+            return effects
+
+        with self.db._connections.read('seasonal_effects') as conn:
+            rows = conn.execute('''
+                SELECT dimension, bucket, sample_count, mean_move, std_move, excess_move, t_stat, p_value
+                FROM seasonal_effects WHERE symbol = ?
+            ''', (symbol,)).fetchall()
+        effects = {
+            (dimension, bucket): {
+                'sample_count': sample_count, 'mean_move': mean_move, 'std_move': std_move,
+                'excess_move': excess_move, 't_stat': t_stat, 'p_value': p_value
+            }
+            for dimension, bucket, sample_count, mean_move, std_move, excess_move, t_stat, p_value in rows
+        }
+        self.db._result_cache.put(cache_key, effects)
+        return effects
+
+    def effects_asof(self, end_date: str, symbol: str = 'TXF') -> Dict[Tuple[str, int], Dict]:
+        """只以 end_date 以前的歷史計算的 (維度, 分組) -> 統計 對照表（重播時避免使用未來數據，不寫入表格）"""
+        symbol = symbol.upper()
+        result = self.compute(end_date)
+        columns = ['sample_count', 'mean_move', 'std_move', 'excess_move', 't_stat', 'p_value']
+        return {
+            (row.dimension, int(row.bucket)): {column: None if pd.isna(getattr(row, column)) else getattr(row, column)
+                                               for column in columns}
+            for row in result[result['symbol'] == symbol].itertuples(index=False)
+        }
+
+    def adjustment(self, target_date: Optional[str] = None, symbol: str = 'TXF', refresh: bool = True) -> Dict:
+        """目標交易日（預設為今天或之後第一個交易日）的季節性調整點數
+
+        各維度的超額點數只有在樣本數足夠且 |t| 達門檻時才計入。
+        """
+        symbol = symbol.upper()
+        calendar = self.db.get_trading_calendar(symbol)
+        target = target_date or date.today().isoformat()
+        if not calendar.is_trading_day(target):
+            target = calendar.shift(target, 1)
+
+        effects = self.get_effects(symbol, refresh)
+        buckets = seasonal_buckets(_day_numbers([target]), calendar)
+        components = {}
+        points = 0.0
+        for dimension in DIMENSIONS:
+            bucket = int(buckets[dimension][0])
+            effect = effects.get((dimension, bucket))
+            significant = _is_significant(effect)
+            if significant:
+                points += effect['excess_move']
+            components[dimension] = {
+                'bucket': bucket,
+                'excess_move': effect['excess_move'] if effect else None,
+                't_stat': effect['t_stat'] if effect else None,
+                'significant': significant
+            }
+        return {'date': _day_to_string(_day_numbers([target])[0]), 'points': points, 'components': components}
@@ -0,0 +1,214 @@
+import time
+import numpy as np
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+# 技術指標參數
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+RSI_PERIOD = 14
+RSI_MA_PERIOD = 9
+ATR_PERIOD = 14
+
+INDICATOR_COLUMNS = ['macd', 'signal', 'histogram', 'rsi', 'rsi_ma']
+
+# 分段閉式EMA的衰減下限（每段內 (1-alpha)^k 不小於此值，避免溢位與精度損失）
+_EMA_BLOCK_FLOOR = 1e-100
+
+@dataclass
+class IndicatorState:
+    """可延續計算的指標狀態（分段匯入與逐筆追加共用）"""
+    last_date: Optional[str] = None
+    last_close: Optional[float] = None
+    ema_fast: Optional[float] = None
+    ema_slow: Optional[float] = None
+    signal: Optional[float] = None
+    avg_gain: Optional[float] = None
+    avg_loss: Optional[float] = None
+    rsi_tail: List[float] = field(default_factory=list)
+    atr: Optional[float] = None
+    bars: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> 'IndicatorState':
+        if not data:
+            return cls()
+        known = {key: value for key, value in data.items() if key in cls.__dataclass_fields__}
+        return cls(**known)
+
+def ema(values: np.ndarray, alpha: float, seed=None) -> np.ndarray:
+    """向量化遞迴EMA：y[t] = (1-alpha)*y[t-1] + alpha*x[t]
+
+    沿第0軸計算，可一次處理多個指數（二維陣列每欄一個指數）。
+    seed 為前一段最後的EMA值；未提供時以第一筆數值起算（同 pandas ewm(adjust=False)）。
+    以分段閉式解 y[t] = d^(t+1)*y0 + alpha*d^t*cumsum(d^-k*x[k]) 取代逐筆Python迴圈。
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.empty_like(values)
+    count = values.shape[0]
+    if count == 0:
+        return result
+
+    decay = 1.0 - alpha
+    if seed is None:
+        previous = values[0].copy() if values.ndim > 1 else float(values[0])
+    else:
+        previous = np.asarray(seed, dtype=float) if values.ndim > 1 else float(seed)
+
+    if decay <= 0:
+        result[:] = values
+        return result
+
+    block = count if decay >= 1 else max(1, min(count, int(np.log(_EMA_BLOCK_FLOOR) / np.log(decay))))
+    steps = np.arange(block, dtype=float)
+    inverse_powers = decay ** -steps
+    powers = decay ** steps
+    if values.ndim > 1:
+        shape = (-1,) + (1,) * (values.ndim - 1)
+        inverse_powers = inverse_powers.reshape(shape)
+        powers = powers.reshape(shape)
+
+    for start in range(0, count, block):
+        chunk = values[start:start + block]
+        length = chunk.shape[0]
+        weighted = np.cumsum(chunk * inverse_powers[:length], axis=0)
+        segment = powers[:length] * (decay * previous + alpha * weighted)
+        result[start:start + length] = segment
+        previous = segment[-1]
+    return result
+
+def rolling_mean(values: np.ndarray, window: int, tail: Optional[np.ndarray] = None) -> np.ndarray:
+    """向量化滾動平均（忽略 NaN，不足視窗時以現有筆數平均），tail 為前一段的尾端數值"""
+    values = np.asarray(values, dtype=float)
+    if tail is not None and len(tail):
+        combined = np.concatenate((np.asarray(tail, dtype=float), values))
+    else:
+        combined = values
+    offset = len(combined) - len(values)
+
+    valid = ~np.isnan(combined)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, combined, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(combined) + 1)
+    begin = np.maximum(end - window, 0)
+    window_sum = sums[end] - sums[begin]
+    window_count = counts[end] - counts[begin]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(window_count > 0, window_sum / np.maximum(window_count, 1), np.nan)
+    return means[offset:]
+
+def macd(close: np.ndarray, state: Optional[IndicatorState] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """MACD、Signal、Histogram（另回傳快慢EMA供延續計算）"""
+    state = state or IndicatorState()
+    ema_fast = ema(close, 2 / (MACD_FAST + 1), state.ema_fast)
+    ema_slow = ema(close, 2 / (MACD_SLOW + 1), state.ema_slow)
+    macd_line = ema_fast - ema_slow
+    signal = ema(macd_line, 2 / (MACD_SIGNAL + 1), state.signal)
+    return macd_line, signal, macd_line - signal, ema_fast, ema_slow
+
+def wilder_rsi(close: np.ndarray, state: Optional[IndicatorState] = None) -> Tuple[np.ndarray, Optional[float], Optional[float]]:
+    """Wilder RSI（沒有前收盤的第一根K棒為 NaN），另回傳最新平均漲跌幅"""
+    state = state or IndicatorState()
+    close = np.asarray(close, dtype=float)
+    previous_close = state.last_close if state.last_close is not None else np.nan
+    change = np.diff(close, prepend=previous_close)
+    rsi = np.full(len(close), np.nan)
+
+    valid = ~np.isnan(change)
+    if not valid.any():
+        return rsi, state.avg_gain, state.avg_loss
+
+    gains = np.clip(change[valid], 0, None)
+    losses = np.clip(-change[valid], 0, None)
+    avg_gain = ema(gains, 1 / RSI_PERIOD, state.avg_gain)
+    avg_loss = ema(losses, 1 / RSI_PERIOD, state.avg_loss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    values = np.where((avg_gain == 0) & (avg_loss == 0), 50.0, values)
+    rsi[valid] = values
+    return rsi, float(avg_gain[-1]), float(avg_loss[-1])
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray,
+        state: Optional[IndicatorState] = None) -> np.ndarray:
+    """Wilder ATR（真實波幅的 1/period 指數平均）"""
+    state = state or IndicatorState()
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    previous_close = np.concatenate(([state.last_close if state.last_close is not None else np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return ema(true_range, 1 / ATR_PERIOD, state.atr)
+
+def compute_indicators(close: np.ndarray, state: Optional[IndicatorState] = None,
+                       high: Optional[np.ndarray] = None, low: Optional[np.ndarray] = None
+                       ) -> Tuple[Dict[str, np.ndarray], IndicatorState]:
+    """由收盤價計算 MACD/Signal/Histogram/RSI/RSI均線（有高低價時另算ATR），並回傳延續用的新狀態"""
+    state = state or IndicatorState()
+    close = np.asarray(close, dtype=float)
+    if len(close) == 0:
+        return {column: np.empty(0) for column in INDICATOR_COLUMNS}, state
+
+    macd_line, signal, histogram, ema_fast, ema_slow = macd(close, state)
+    rsi, avg_gain, avg_loss = wilder_rsi(close, state)
+    tail = np.asarray(state.rsi_tail, dtype=float)
+    rsi_ma = rolling_mean(rsi, RSI_MA_PERIOD, tail)
+
+    result = {
+        'macd': macd_line,
+        'signal': signal,
+        'histogram': histogram,
+        'rsi': rsi,
+        'rsi_ma': rsi_ma
+    }
+    latest_atr = state.atr
+    if high is not None and low is not None:
+        result['atr'] = atr(high, low, close, state)
+        latest_atr = float(result['atr'][-1])
+
+    combined_rsi = np.concatenate((tail, rsi))
+    new_state = IndicatorState(
+        last_date=state.last_date,
+        last_close=float(close[-1]),
+        ema_fast=float(ema_fast[-1]),
+        ema_slow=float(ema_slow[-1]),
+        signal=float(signal[-1]),
+        avg_gain=avg_gain,
+        avg_loss=avg_loss,
+        rsi_tail=[float(v) for v in combined_rsi[-(RSI_MA_PERIOD - 1):]] if RSI_MA_PERIOD > 1 else [],
+        atr=latest_atr,
+        bars=state.bars + len(close)
+    )
+    return result, new_state
+
+def compute_indicator_matrix(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    """一次計算多個指數的 MACD 系列指標（closes 每欄一個指數、已依日期對齊）"""
+    closes = np.asarray(closes, dtype=float)
+    fast = ema(closes, 2 / (MACD_FAST + 1))
+    slow = ema(closes, 2 / (MACD_SLOW + 1))
+    macd_line = fast - slow
+    signal = ema(macd_line, 2 / (MACD_SIGNAL + 1))
+    return {'macd': macd_line, 'signal': signal, 'histogram': macd_line - signal}
+
+def benchmark_indicators(bars: int = 2_000_000, repeat: int = 3) -> Dict:
+    """量測指標計算吞吐量（每秒K棒數）"""
+    rng = np.random.default_rng(0)
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    high = close * 1.005
+    low = close * 0.995
+
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compute_indicators(close, high=high, low=low)
+        best = min(best, time.perf_counter() - started)
+
+    result = {'bars': bars, 'seconds': round(best, 4), 'bars_per_second': round(bars / best)}
+    print(f"⚡ 指標計算 {bars:,} 根K棒，耗時 {best:.3f} 秒（{result['bars_per_second']:,} 根/秒）")
+    return result
+
+if __name__ == "__main__":
+    benchmark_indicators()
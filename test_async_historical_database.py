@@ -0,0 +1,39 @@
+import asyncio
+import time
+from async_historical_database import AsyncHistoricalDatabase
+from historical_database import HistoricalDatabase
+
+# 約需數十秒的遞迴查詢，未被中斷時測試會明顯超時
+SLOW_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c LIMIT 500000000) SELECT COUNT(*) FROM c"
+
+def test_cancelled_read_is_interrupted(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    outcome = {}
+
+    def slow_read():
+        with db._connections.read() as conn:
+            try:
+                return conn.execute(SLOW_QUERY).fetchone()
+            except Exception as e:
+                outcome['error'] = e
+                raise
+
+    async def scenario():
+        # 單一執行緒：取消後的下一個查詢使用同一條讀取連線
+        async with AsyncHistoricalDatabase(db, max_workers=1) as async_db:
+            task = asyncio.create_task(async_db.run(slow_read))
+            await asyncio.sleep(0.2)
+            started = time.perf_counter()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            version = await async_db.get_data_version()
+            connection_busy = await async_db.run(lambda: db._connections.reader().in_transaction)
+            return time.perf_counter() - started, version, connection_busy
+
+    elapsed, version, connection_busy = asyncio.run(scenario())
+    assert 'interrupted' in str(outcome['error'])
+    assert elapsed < 5
+    assert version == 0 and not connection_busy
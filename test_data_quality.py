@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data_quality
+from data_quality import validate_bars
+from historical_database import HistoricalDatabase
+
+# 2025-01-06（星期一）起的五個交易日
+MONDAY = int(np.datetime64('2025-01-06', 'D').astype(np.int64))
+DAYS = MONDAY + np.arange(5)
+
+def _columns(**overrides):
+    columns = {
+        'open': np.full(5, 100.0), 'high': np.full(5, 102.0), 'low': np.full(5, 98.0),
+        'close': np.array([100.0, 101.0, 100.0, 99.0, 100.0]),
+        'volume': np.full(5, 1000.0), 'rsi': np.full(5, 50.0)
+    }
+    for name, (position, value) in overrides.items():
+        columns[name] = columns[name].copy()
+        columns[name][position] = value
+    return columns
+
+def _flags(keys=DAYS, previous_close=None, **overrides):
+    result = validate_bars(keys, _columns(**overrides), previous_close)
+    return result.flags.tolist()
+
+def test_clean_batch_is_accepted():
+    result = validate_bars(DAYS, _columns())
+    assert result.accepted.tolist() == [0, 1, 2, 3, 4]
+    assert result.summary == {'rows': 5, 'accepted': 5, 'rejected': 0, 'by_reason': {}}
+
+def test_duplicate_keeps_last_row():
+    keys = DAYS.copy()
+    keys[3] = keys[1]
+    result = validate_bars(keys, _columns())
+    assert result.flags.tolist() == [0, data_quality.DUPLICATE, 0, 0, 0]
+    assert result.accepted.tolist() == [0, 3, 2, 4]
+
+@pytest.mark.parametrize('value', [np.nan, 0.0, -5.0])
+def test_missing_price(value):
+    assert _flags(close=(2, value))[2] & data_quality.MISSING_PRICE
+
+def test_weekend():
+    keys = DAYS.copy()
+    keys[4] = MONDAY + 5  # 星期六
+    assert _flags(keys) == [0, 0, 0, 0, data_quality.WEEKEND]
+
+def test_negative_volume():
+    assert _flags(volume=(1, -1.0)) == [0, data_quality.NEGATIVE_VOLUME, 0, 0, 0]
+
+def test_rsi_out_of_range():
+    assert _flags(rsi=(0, 101.0)) == [data_quality.RSI_OUT_OF_RANGE, 0, 0, 0, 0]
+
+def test_ohlc_inconsistent():
+    assert _flags(high=(3, 97.0)) == [0, 0, 0, data_quality.OHLC_INCONSISTENT, 0]
+
+def test_price_jump_flags_only_the_spike():
+    # 單根尖刺後回到原水準：只標記尖刺，回落的下一根不算
+    assert _flags(close=(2, 300.0), high=(2, 300.0)) == [0, 0, data_quality.PRICE_JUMP, 0, 0]
+    # 與資料庫中前一筆收盤價比較
+    assert _flags(previous_close=40.0)[0] == data_quality.PRICE_JUMP
+
+def test_rejected_rows_are_quarantined(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range('2025-01-06', periods=5).strftime('%Y-%m-%d').tolist()
+    dates[4] = '2025-01-11'  # 星期六
+    db.append_bars('TXF', {'date': dates, 'close': [100.0, np.nan, 101.0, 102.0, 103.0],
+                           'volume': [1000, 1000, -1, 1000, 1000]})
+
+    assert db.get_historical_data('TXF', '2025-01-01', '2025-01-31')['close'].tolist() == [100.0, 102.0]
+    assert db.get_quarantine_report() == {'TXF': {'missing_price': 1, 'negative_volume': 1, 'weekend': 1}}
@@ -0,0 +1,59 @@
+import threading
+import time
+from db_connection import ConnectionManager
+
+def test_writes_are_serialized_while_readers_see_committed_snapshots(tmp_path):
+    manager = ConnectionManager(str(tmp_path / 'connections.db'))
+    with manager.write() as conn:
+        conn.execute("CREATE TABLE a (v INTEGER)")
+        conn.execute("CREATE TABLE b (v INTEGER)")
+        conn.execute("INSERT INTO a VALUES (0)")
+        conn.execute("INSERT INTO b VALUES (0)")
+
+    active = []
+    overlaps = []
+    torn_reads = []
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        try:
+            for _ in range(25):
+                with manager.write('increment') as conn:
+                    active.append(1)
+                    overlaps.append(len(active))
+                    # 讀取、等待後再寫回：未序列化時會遺失更新
+                    value = conn.execute("SELECT v FROM a").fetchone()[0]
+                    conn.execute("UPDATE a SET v = ?", (value + 1,))
+                    time.sleep(0.001)
+                    conn.execute("UPDATE b SET v = ?", (value + 1,))
+                    active.pop()
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            while not done.is_set():
+                with manager.read() as conn:
+                    a, b = conn.execute("SELECT (SELECT v FROM a), (SELECT v FROM b)").fetchone()
+                if a != b:
+                    torn_reads.append((a, b))
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=writer) for _ in range(4)]
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert max(overlaps) == 1 and torn_reads == []
+    with manager.read() as conn:
+        assert conn.execute("SELECT (SELECT v FROM a), (SELECT v FROM b)").fetchone() == (100, 100)
+    assert manager.get_query_stats()['increment']['count'] == 100
+    manager.close()
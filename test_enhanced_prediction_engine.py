@@ -0,0 +1,37 @@
+import threading
+import numpy as np
+import pandas as pd
+import enhanced_prediction_engine
+from enhanced_prediction_engine import DEFAULT_COMPONENT_ACCURACY, DEFAULT_OPTIMAL_RATIOS, EnhancedPredictionEngine
+from rolling_correlation import DERIVED_NAME as CORRELATION_DERIVED_NAME
+
+def _seed_history(db):
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2024-01-02', '2025-04-17').strftime('%Y-%m-%d')
+    for symbol, start in (('TXF', 20000.0), ('DJI', 38000.0), ('NDX', 17000.0), ('SOXX', 220.0)):
+        db.append_bars(symbol, {'date': dates, 'close': start * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))})
+
+def test_first_prediction_does_not_wait_for_derived_tables(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    release = threading.Event()
+    rebuild = enhanced_prediction_engine.RollingCorrelationEngine.rebuild
+    def blocked_rebuild(self, *args, **kwargs):
+        release.wait(30)
+        return rebuild(self, *args, **kwargs)
+    monkeypatch.setattr(enhanced_prediction_engine.RollingCorrelationEngine, 'rebuild', blocked_rebuild)
+
+    engine = EnhancedPredictionEngine()
+    _seed_history(engine.historical_db)
+
+    # 重建被擋住時仍立即回傳預設值
+    assert engine.optimal_ratios == DEFAULT_OPTIMAL_RATIOS
+    assert engine._get_historical_prediction_accuracy('TXF_SENTIMENT') == DEFAULT_COMPONENT_ACCURACY['TXF_SENTIMENT']
+    assert engine._get_seasonal_adjustment('DJI', 'TXF') == 0
+    assert engine.historical_db.get_derived_version(CORRELATION_DERIVED_NAME) is None
+
+    release.set()
+    assert engine._derived_tables.wait(60)
+    assert engine.historical_db.get_derived_version(CORRELATION_DERIVED_NAME) == engine.historical_db.get_data_version()
+    engine.optimal_ratios  # 相關性表格版本改變，在背景重新載入
+    assert engine._optimal_ratios.wait(30)
+    assert engine.optimal_ratios != DEFAULT_OPTIMAL_RATIOS
@@ -0,0 +1,30 @@
+import numpy as np
+from feature_context import FeatureContext
+from rolling_stats import STAT_WINDOWS
+
+def _context(row_date: str) -> FeatureContext:
+    # TXF 最後一根K棒在 row_date，30日視窗（2025-03-07 起）內沒有數據，252日視窗涵蓋該K棒
+    dates = np.array(['2025-01-02', '2025-01-03'], dtype='datetime64[D]')
+    arrays = {'TXF': {'date': dates, 'close': np.array([100.0, 101.0]), 'volume': np.array([50.0, 70.0]),
+                      'rsi': np.array([40.0, 60.0]), 'histogram': np.array([1.0, -1.0])}}
+    bounds = {('TXF', 30): slice(2, 2), ('TXF', 252): slice(0, 2)}
+    starts = {('TXF', 30): '2025-03-07', ('TXF', 252): '2024-04-12'}
+    rolling = {'TXF': {
+        'date': row_date, 'windows': dict(STAT_WINDOWS), 'volatility': 0.3,
+        'volume_mean': 60.0, 'volume_std': 14.1, 'volume_median': 60.0,
+        'rsi_q20': 44.0, 'rsi_q80': 56.0, 'rsi_median': 50.0, 'macd_mean': 0.0, 'macd_std': 1.4
+    }}
+    return FeatureContext(arrays, bounds, '2025-04-18', 1, rolling, starts)
+
+def test_stale_materialized_row_falls_back():
+    context = _context('2025-01-03')
+    # 統計列早於30日視窗起日：與視窗內無數據時相同，回傳 None
+    assert context.volatility('TXF', 30) is None
+    assert context.volume_stats(30) is None
+    # 252日視窗涵蓋統計列日期，仍使用物化統計
+    assert context.rsi_extremes('TXF', 252) == {'upper_80pct': 56.0, 'lower_20pct': 44.0, 'median': 50.0}
+
+def test_current_materialized_row_is_used():
+    context = _context('2025-04-18')
+    assert context.volatility('TXF', 30) == 0.3
+    assert context.volume_stats(30) == {'mean': 60.0, 'std': 14.1, 'median': 60.0}
@@ -0,0 +1,65 @@
+from historical_csv_importer import UnifiedHistoryImporter
+from historical_database import HistoricalDatabase
+
+HEADER = "date,open,high,low,close,symbol\n"
+
+def _row(day, close):
+    return f"{day},{close - 10:.1f},{close + 20:.1f},{close - 30:.1f},{close:.1f},TXF1\n"
+
+def _closes(db):
+    frame = db.get_historical_data('TXF', '2025-01-01', '2025-12-31')
+    return frame['close'].tolist()
+
+def test_rewritten_file_quarantines_corrected_rows(tmp_path):
+    csv_path = tmp_path / 'unified.csv'
+    csv_path.write_text(HEADER + _row('2025-01-02', 20000.0) + _row('2025-01-03', 20100.0))
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    importer = UnifiedHistoryImporter(db, str(csv_path))
+    summary = importer.run()
+    assert summary['rows_written'] == 2
+    skipped = importer.run()
+    assert skipped['skipped'] and set(skipped) == set(summary)
+
+    # 同樣大小的改寫：更正已匯入的收盤價，並補上一筆新日期
+    original_size = csv_path.stat().st_size
+    csv_path.write_text(HEADER + _row('2025-01-02', 20000.0) + _row('2025-01-03', 20200.0))
+    assert csv_path.stat().st_size == original_size
+    summary = importer.run()
+    assert summary['rows_skipped'] == 1 and summary['rows_quarantined'] == 1
+    assert db.get_quarantine_report() == {'TXF': {'out_of_order': 1}}
+    assert _closes(db) == [20000.0, 20100.0]
+
+    # 只在尾端追加時從上次的列數續傳，新日期照常寫入
+    with open(csv_path, 'a') as f:
+        f.write(_row('2025-01-06', 20150.0))
+    summary = importer.run()
+    assert summary['rows_read'] == 1 and summary['rows_written'] == 1
+    assert _closes(db) == [20000.0, 20100.0, 20150.0]
+    assert importer._load_progress()['byte_offset'] == csv_path.stat().st_size
+
+def test_resume_seeks_to_last_committed_chunk(tmp_path):
+    csv_path = tmp_path / 'unified.csv'
+    days = ['2025-01-02', '2025-01-03', '2025-01-06', '2025-01-07', '2025-01-08']
+    csv_path.write_text(HEADER + ''.join(_row(day, 20000.0 + 10 * i) for i, day in enumerate(days)))
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    importer = UnifiedHistoryImporter(db, str(csv_path), chunk_size=2)
+
+    # 第二段寫入後中斷：進度停在第二段結束的位元組位置
+    chunks = importer._read_chunks
+    def interrupted(rows_done, byte_offset):
+        for number, item in enumerate(chunks(rows_done, byte_offset)):
+            if number == 2:
+                raise KeyboardInterrupt
+            yield item
+    importer._read_chunks = interrupted
+    try:
+        importer.run()
+    except KeyboardInterrupt:
+        pass
+    progress = importer._load_progress()
+    assert progress['rows_done'] == 4 and not progress['completed']
+    assert progress['byte_offset'] == len(b''.join(csv_path.read_bytes().splitlines(keepends=True)[:5]))
+
+    resumed = UnifiedHistoryImporter(db, str(csv_path), chunk_size=2).run()
+    assert resumed['rows_read'] == 1 and resumed['chunks'] == 1
+    assert _closes(db) == [20000.0, 20010.0, 20020.0, 20030.0, 20040.0]
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+import sqlite3
+from historical_database import HistoricalDatabase
+from rolling_correlation import RollingCorrelationEngine
+from technical_indicators import INDICATOR_COLUMNS, compute_indicators
+
+def _columns(dates, start):
+    return {'date': np.array(dates, dtype='datetime64[D]'), 'close': start + np.arange(len(dates), dtype=float)}
+
+def test_bulk_insert_writes_all_symbols_in_one_transaction(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range('2025-01-02', periods=50).strftime('%Y-%m-%d')
+    stats = db.bulk_insert({'TXF': _columns(dates, 20000.0), 'DJI': _columns(dates[:30], 40000.0)})
+
+    assert stats['rows'] == 80
+    assert stats['per_symbol'] == {'TXF': 50, 'DJI': 30}
+    counts = {table: info['record_count'] for table, info in db.get_database_stats().items()}
+    assert counts == {'txf_history': 50, 'dji_history': 30, 'ndx_history': 0, 'soxx_history': 0}
+    assert db.get_historical_data('DJI', '2025-01-01', '2025-12-31')['close'].iloc[-1] == 40029.0
+
+    # after_insert 失敗時整個交易回滾，兩個指數都不寫入
+    def fail(conn):
+        raise RuntimeError("中斷")
+    later = pd.bdate_range('2025-03-14', periods=5).strftime('%Y-%m-%d')
+    with pytest.raises(RuntimeError):
+        db.bulk_insert({'TXF': _columns(later, 20050.0), 'DJI': _columns(later, 40030.0)}, after_insert=fail)
+    counts = {table: info['record_count'] for table, info in db.get_database_stats().items()}
+    assert counts['txf_history'] == 50 and counts['dji_history'] == 30
+
+def test_rolling_correlations_migrate_to_integer_days(tmp_path):
+    path = str(tmp_path / 'history.db')
+    HistoricalDatabase(path)
+    # 還原為版本10的 TEXT 日期表格
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE rolling_correlations")
+        conn.execute('''
+            CREATE TABLE rolling_correlations (
+                date TEXT, window_size INTEGER, symbol TEXT, correlation REAL, beta REAL, ratio REAL,
+                PRIMARY KEY (window_size, symbol, date)
+            ) WITHOUT ROWID
+        ''')
+        conn.executemany("INSERT INTO rolling_correlations VALUES (?, 252, 'DJI', ?, 1.0, 0.5)",
+                         [('2025-04-16', 0.6), ('2025-04-17', 0.7)])
+        conn.execute("PRAGMA user_version = 10")
+
+    db = HistoricalDatabase(path)
+    with sqlite3.connect(path) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(rolling_correlations)")]
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 13
+    assert 'day' in columns and 'date' not in columns
+    ratios = RollingCorrelationEngine(db).get_asof('2025-04-18', refresh=False)
+    assert ratios['as_of'] == '2025-04-17' and ratios['dji_txf_correlation'] == 0.7
+
+def _assert_indicators_match_full_recompute(db):
+    stored = db.get_historical_data('TXF', '2000-01-01', '2099-12-31')
+    expected, _ = compute_indicators(stored['close'].to_numpy())
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(stored[column].to_numpy(dtype=float), expected[column], rtol=1e-9, atol=1e-9,
+                                   err_msg=column)
+
+def test_append_bars_tail_matches_full_recompute(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    rng = np.random.default_rng(9)
+    dates = pd.bdate_range('2024-01-02', periods=260).strftime('%Y-%m-%d')
+    closes = 20000.0 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    assert db.append_bars('TXF', {'date': dates[:200], 'close': closes[:200]})['mode'] == 'full'
+    # 以保存的指標狀態延續：單筆、多筆分批追加
+    for start, end in ((200, 201), (201, 240), (240, 260)):
+        assert db.append_bars('TXF', {'date': dates[start:end], 'close': closes[start:end]})['mode'] == 'tail'
+    _assert_indicators_match_full_recompute(db)
+
+    # 更正舊日期時改以全部歷史重新計算
+    result = db.append_bars('TXF', {'date': [dates[120]], 'close': [closes[120] * 1.02]})
+    assert result['mode'] == 'full' and result['last_date'] == dates[-1]
+    _assert_indicators_match_full_recompute(db)
+    assert db.get_historical_data('TXF', dates[120], dates[120])['close'].iloc[0] == closes[120] * 1.02
+
+def test_write_invalidates_cached_correlation(tmp_path, monkeypatch):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    rng = np.random.default_rng(2)
+    dates = pd.bdate_range('2025-01-02', periods=60).strftime('%Y-%m-%d')
+    for symbol, start in (('TXF', 20000.0), ('DJI', 40000.0), ('NDX', 18000.0), ('SOXX', 220.0)):
+        db.append_bars(symbol, {'date': dates[:-1], 'close': start * np.exp(np.cumsum(rng.normal(0, 0.01, 59)))})
+
+    loads = []
+    aligned_history = db.get_aligned_history
+    def counting(*args, **kwargs):
+        loads.append(args)
+        return aligned_history(*args, **kwargs)
+    monkeypatch.setattr(db, 'get_aligned_history', counting)
+
+    first = db.calculate_correlation_matrix('2025-01-01', '2025-12-31')
+    assert db.calculate_correlation_matrix('2025-01-01', '2025-12-31') == first
+    assert len(loads) == 1 and first['data_points'] == 58
+
+    # 寫入任一指數使數據版本改變，快取的結果失效並以新數據重算
+    for symbol in ('TXF', 'DJI', 'NDX', 'SOXX'):
+        last = db.get_historical_data(symbol, dates[-2], dates[-2])['close'].iloc[0]
+        db.append_bars(symbol, {'date': [dates[-1]], 'close': [last * (1.03 if symbol == 'DJI' else 0.98)]})
+    second = db.calculate_correlation_matrix('2025-01-01', '2025-12-31')
+    assert len(loads) == 2 and second['data_points'] == 59
+    closes = aligned_history(['TXF', 'DJI', 'NDX', 'SOXX'], '2025-01-01', '2025-12-31')['close']
+    expected = closes.pct_change().dropna().corr().loc['DJI', 'TXF']
+    assert abs(second['dji_txf_correlation'] - expected) < 1e-12
+    assert second['dji_txf_correlation'] != first['dji_txf_correlation']
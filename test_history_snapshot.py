@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from historical_database import HistoricalDatabase
+from history_snapshot import read_manifest, write_snapshot
+
+def test_snapshot_rolls_over_on_new_data(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range('2025-01-02', periods=20).strftime('%Y-%m-%d')
+    db.append_bars('TXF', {'date': dates[:15], 'close': 20000.0 + np.arange(15)})
+    first = db.get_snapshot('TXF')
+    assert isinstance(first['close'], np.memmap)
+    assert len(first) == 15 and first.data_version == db.get_data_version('TXF')
+    assert db.get_snapshot('TXF') is first
+
+    db.append_bars('TXF', {'date': dates[15:], 'close': 20015.0 + np.arange(5)})
+    second = db.get_snapshot('TXF')
+    assert second.data_version > first.data_version
+    assert len(second) == 20 and second['close'][-1] == 20019.0
+    symbol_dir = db.snapshot_dir / 'TXF'
+    assert read_manifest(symbol_dir)['directory'] == second.path.name
+    assert not first.path.exists()
+
+    # 較慢的程序晚一步發布舊版本時，manifest 不會倒退
+    stale = pd.DataFrame({'date': pd.to_datetime(dates[:15]), 'close': 20000.0 + np.arange(15)})
+    write_snapshot(db.snapshot_dir, 'TXF', first.data_version, stale, db.database_id)
+    assert read_manifest(symbol_dir)['data_version'] == second.data_version
@@ -0,0 +1,70 @@
+import sqlite3
+import pytest
+from historical_database import HistoricalDatabase
+from ingestion_queue import IngestionQueue, IngestionQueueFull, IngestionWriter
+
+def _bars(dates, start=100.0):
+    return {'date': dates, 'close': [start + i for i in range(len(dates))]}
+
+def _closes(db):
+    frame = db.get_historical_data('TXF', '2025-01-01', '2025-12-31')
+    return frame['close'].tolist()
+
+def test_acknowledged_batches_survive_writer_restart(tmp_path):
+    spool = str(tmp_path / 'spool.db')
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    queue = IngestionQueue(spool)
+    queue.submit_bars('TXF', _bars(['2025-01-02', '2025-01-03']))
+    queue.submit_bars('TXF', _bars(['2025-01-06'], start=110.0))
+
+    # 寫入程序在寫入交易中被終止：交易回滾，批次留在佇列
+    writer = IngestionWriter(db, spool)
+    def killed(generation, batches):
+        raise KeyboardInterrupt
+    writer._apply = killed
+    with pytest.raises(KeyboardInterrupt):
+        writer.run_once()
+    writer.release()
+    assert _closes(db) == []
+    assert queue.pending_rows() == 3
+
+    # 寫入程序在提交後、清除佇列前被終止：重新啟動時不重複寫入
+    writer = IngestionWriter(db, spool)
+    real_apply = writer._apply
+    def killed_after_commit(generation, batches):
+        real_apply(generation, batches)
+        raise KeyboardInterrupt
+    writer._apply = killed_after_commit
+    with pytest.raises(KeyboardInterrupt):
+        writer.run_once()
+    writer.release()
+
+    restarted = IngestionWriter(db, spool)
+    assert restarted.run_once()['batches'] == 0
+    restarted.release()
+    assert _closes(db) == [100.0, 101.0, 110.0]
+    assert queue.pending_rows() == 0
+
+def test_submit_raises_when_queue_full(tmp_path):
+    queue = IngestionQueue(str(tmp_path / 'spool.db'), max_pending_rows=3, timeout=0.1)
+    queue.submit_bars('TXF', _bars(['2025-01-02', '2025-01-03']))
+    with pytest.raises(IngestionQueueFull):
+        queue.submit_bars('TXF', _bars(['2025-01-06', '2025-01-07']))
+    assert queue.pending_rows() == 2
+
+def test_failing_batch_moves_to_failed_batches(tmp_path):
+    spool = str(tmp_path / 'spool.db')
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    queue = IngestionQueue(spool)
+    queue.submit_bars('TXF', _bars(['2025-01-02']))
+    bad_id = queue.submit_bars('TXF', {'date': ['not-a-date'], 'close': [101.0]})  # 日期無法解析
+
+    writer = IngestionWriter(db, spool)
+    result = writer.run_once()
+    writer.release()
+
+    assert result['batches'] == 2 and result['failed'] == 1
+    assert _closes(db) == [100.0]
+    with sqlite3.connect(spool) as conn:
+        assert conn.execute("SELECT id FROM failed_batches").fetchall() == [(bad_id,)]
+    assert queue.pending_rows() == 0
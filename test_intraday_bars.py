@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from historical_database import HistoricalDatabase
+
+def _minute_bars():
+    # 夜盤 15:00 至隔日 05:00（跨越午夜），接著日盤 08:45 至 13:45，隨機缺少部分分K
+    rng = np.random.default_rng(4)
+    stamps = pd.date_range('2025-04-15 15:00', '2025-04-16 05:00', freq='1min').append(
+        pd.date_range('2025-04-16 08:45', '2025-04-16 13:45', freq='1min'))
+    stamps = stamps[rng.random(len(stamps)) > 0.1]
+    close = 20000.0 + np.cumsum(rng.normal(0, 3, len(stamps)))
+    open_ = close + rng.normal(0, 2, len(stamps))
+    return pd.DataFrame({
+        'ts': stamps,
+        'open': open_,
+        'high': np.maximum(open_, close) + rng.uniform(0, 4, len(stamps)),
+        'low': np.minimum(open_, close) - rng.uniform(0, 4, len(stamps)),
+        'close': close,
+        'volume': rng.integers(1, 400, len(stamps))
+    })
+
+@pytest.mark.parametrize('timeframe, rule', [('5m', '5min'), ('15m', '15min'), ('60m', '60min'), ('1d', '1D')])
+def test_sql_resampling_matches_pandas(tmp_path, timeframe, rule):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    bars = _minute_bars()
+    assert db.insert_intraday_bars('TXF', bars) == len(bars)
+
+    resampled = db.get_intraday_bars('TXF', '2025-04-15', '2025-04-16', timeframe)
+    expected = bars.set_index('ts').resample(rule).agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    expected = expected[bars.set_index('ts')['close'].resample(rule).count() > 0]
+
+    assert resampled['date'].tolist() == expected.index.tolist()
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        np.testing.assert_allclose(resampled[column].to_numpy(), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-12, err_msg=column)
+
+def test_date_range_uses_exchange_local_days(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    bars = _minute_bars()
+    db.insert_intraday_bars('TXF', bars)
+    # 當地 4/16 包含午夜後的夜盤與日盤，不含 4/15 15:00 起的夜盤前段
+    daily = db.get_intraday_bars('TXF', '2025-04-16', '2025-04-16', '1d')
+    on_day = bars[bars['ts'] >= '2025-04-16']
+    assert daily['date'].tolist() == [pd.Timestamp('2025-04-16')]
+    assert daily['volume'].iloc[0] == on_day['volume'].sum()
+    assert daily['open'].iloc[0] == on_day['open'].iloc[0]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from enhanced_prediction_engine import DEFAULT_ENGINE_PARAMETERS
+from historical_database import HistoricalDatabase
+from parameter_optimizer import PARAMETER_SPACE, ParameterOptimizer
+
+def _seed_history(db: HistoricalDatabase):
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2023-01-02', '2024-12-31')
+    for symbol, start in (('TXF', 17000.0), ('DJI', 33000.0), ('NDX', 12000.0), ('SOXX', 180.0)):
+        closes = start * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        bars = {'date': dates.strftime('%Y-%m-%d'), 'close': closes}
+        if symbol == 'TXF':
+            bars['volume'] = rng.integers(40000, 120000, len(dates))
+        db.append_bars(symbol, bars)
+
+def test_grid_search_includes_and_ranks_baseline(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    _seed_history(db)
+    baseline = {name: DEFAULT_ENGINE_PARAMETERS[name] for name in PARAMETER_SPACE}
+
+    # 只有基準值的搜尋空間：唯一候選即為基準
+    space = {name: (value,) for name, value in baseline.items()}
+    result = ParameterOptimizer(db, space, processes=1).optimize('grid')
+    assert result['evaluations'] == 1
+    assert result['parameters'] == baseline
+    assert result['baseline']['parameters'] == baseline
+    assert result['baseline']['days'] > 200
+
+    # 兩個候選：基準與關閉台指風氣，排名依每日平均點數由高到低
+    space['txf_impact_scale'] = (0, baseline['txf_impact_scale'])
+    result = ParameterOptimizer(db, space, processes=1).optimize('grid')
+    scores = [entry['score'] for entry in result['ranking']]
+    assert result['evaluations'] == 2 and scores == sorted(scores, reverse=True)
+    assert result['parameters'] == result['ranking'][0]['parameters']
+    assert baseline in [entry['parameters'] for entry in result['ranking']]
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import percentile_index
+from historical_database import HistoricalDatabase
+from ingestion_queue import IngestionQueue, IngestionWriter, _spool_connect, _spool_generation
+from percentile_index import SlidingPercentileIndex
+
+def _brute_rank(window: np.ndarray, value: float) -> float:
+    return 0.0 if np.isnan(value) else (window < value).sum() / len(window) * 100
+
+def test_sliding_updates_match_brute_force(monkeypatch):
+    # 小區塊讓分裂與清空區塊的路徑都會執行
+    monkeypatch.setattr(percentile_index, 'BLOCK_SIZE', 3)
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, 800).astype(float)
+    values[rng.random(len(values)) < 0.1] = np.nan
+    queries = np.array([0.0, 4.5, 10.0, 19.0, 25.0, np.nan])
+
+    index = SlidingPercentileIndex(40, values[:60])
+    for position in range(60, len(values)):
+        index.push(values[position])
+        window = values[position - 39:position + 1]
+        assert [index.rank(query) for query in queries] == [_brute_rank(window, query) for query in queries]
+        assert index.ranks(queries).tolist() == [_brute_rank(window, query) for query in queries]
+
+def test_appended_bars_advance_shared_index(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range('2025-01-02', periods=30).strftime('%Y-%m-%d')
+    db.append_bars('TXF', {'date': dates, 'close': 20000.0 + np.arange(30), 'volume': np.arange(30) * 100})
+    index = db.get_percentile_index('TXF', 'volume', 10)
+
+    db.append_bars('TXF', {'date': ['2025-02-13'], 'close': [20030.0], 'volume': [50]})
+    # 同一個索引以 push 更新，不重新載入
+    assert db.get_percentile_index('TXF', 'volume', 10) is index
+    assert index.values().tolist() == [2100.0 + 100 * i for i in range(9)] + [50.0]
+    assert index.rank(2150.0) == 20.0
+
+def test_rolled_back_queue_batch_does_not_advance_index(tmp_path, monkeypatch):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range('2025-01-02', periods=30).strftime('%Y-%m-%d')
+    db.append_bars('TXF', {'date': dates, 'close': 20000.0 + np.arange(30), 'volume': np.arange(30) * 100})
+    db.get_percentile_index('TXF', 'volume', 10)
+
+    spool = str(tmp_path / 'spool.db')
+    queue = IngestionQueue(spool)
+    queue.submit_bars('TXF', {'date': ['2025-02-13'], 'close': [20030.0], 'volume': [50]})
+    queue.submit_bars('DJI', {'date': ['2025-02-13'], 'close': [40000.0]})
+
+    # 第二組（DJI）寫入失敗：整個交易回滾，TXF 的索引不得推入未提交的K棒
+    append_bars = db.append_bars
+    def fail_on_dji(symbol, bars):
+        if symbol == 'DJI':
+            raise RuntimeError("中斷")
+        return append_bars(symbol, bars)
+    monkeypatch.setattr(db, 'append_bars', fail_on_dji)
+    writer = IngestionWriter(db, spool)
+    conn = _spool_connect(spool)
+    batches = writer._fetch_batches(conn, 0)
+    with pytest.raises(RuntimeError):
+        writer._apply(_spool_generation(conn), batches)
+    conn.close()
+    writer.release()
+
+    # 其他路徑的寫入把數據版本推進到與回滾前相同的版本號後，索引仍與已提交的數據一致
+    db.bulk_insert({'TXF': {'date': np.array(['2025-02-14'], dtype='datetime64[D]'), 'close': np.array([20031.0]),
+                            'volume': np.array([70.0])}})
+    index = db.get_percentile_index('TXF', 'volume', 10)
+    assert index.values().tolist() == [2100.0 + 100 * i for i in range(9)] + [70.0]
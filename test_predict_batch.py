@@ -0,0 +1,94 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+import feature_context
+from enhanced_prediction_engine import DEFAULT_OPTIMAL_RATIOS, EnhancedPredictionEngine, snapshots_to_frame
+from historical_database import HistoricalDatabase
+
+class _HistoryEndDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2025, 4, 18)
+
+# 批次輸出欄位 -> 逐筆結果（to_dict）中的路徑
+SCALAR_PATHS = {
+    'current_price': ('current_price',),
+    'dji_base_prediction': ('dji_based_prediction', 'base_prediction'),
+    'dji_macd_adjustment': ('dji_based_prediction', 'macd_adjustment'),
+    'dji_rsi_adjustment': ('dji_based_prediction', 'rsi_adjustment'),
+    'dji_seasonal_adjustment': ('dji_based_prediction', 'seasonal_adjustment'),
+    'dji_final_prediction': ('dji_based_prediction', 'final_prediction'),
+    'dji_confidence': ('dji_based_prediction', 'confidence'),
+    'us_sentiment_score': ('us_futures_sentiment', 'sentiment_score'),
+    'us_weighted_rsi': ('us_futures_sentiment', 'weighted_rsi'),
+    'us_total_momentum': ('us_futures_sentiment', 'total_momentum'),
+    'us_txf_impact': ('us_futures_sentiment', 'txf_impact'),
+    'us_description': ('us_futures_sentiment', 'description'),
+    'txf_sentiment_score': ('txf_sentiment', 'sentiment_score'),
+    'txf_volume_sentiment': ('txf_sentiment', 'volume_sentiment'),
+    'txf_rsi_sentiment': ('txf_sentiment', 'rsi_sentiment'),
+    'txf_macd_sentiment': ('txf_sentiment', 'macd_sentiment'),
+    'txf_impact': ('txf_sentiment', 'txf_impact'),
+    'txf_description': ('txf_sentiment', 'description'),
+    'volume_z_score': ('txf_sentiment', 'historical_analysis', 'volume_z_score'),
+    'rsi_percentile': ('txf_sentiment', 'historical_analysis', 'rsi_percentile'),
+    'macd_z_score': ('txf_sentiment', 'historical_analysis', 'macd_z_score'),
+    'historical_predicted_move': ('historical_validation', 'predicted_move'),
+    'historical_confidence': ('historical_validation', 'confidence'),
+    'historical_pattern': ('historical_validation', 'pattern_type'),
+    'final_prediction': ('final_prediction',),
+    'prediction_lower': ('prediction_range', 'lower'),
+    'prediction_upper': ('prediction_range', 'upper'),
+    'price_difference': ('price_difference',),
+    'direction': ('recommendation', 'direction'),
+    'recommendation_confidence': ('recommendation', 'confidence'),
+    'entry_strategy': ('recommendation', 'entry_strategy'),
+    'risk_level': ('recommendation', 'risk_level')
+}
+
+def _seed_history(db: HistoricalDatabase):
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range('2024-01-02', '2025-04-17')
+    for symbol, start in (('TXF', 20000.0), ('DJI', 38000.0), ('NDX', 17000.0), ('SOXX', 220.0)):
+        closes = start * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        bars = {'date': dates.strftime('%Y-%m-%d'), 'close': closes}
+        if symbol == 'TXF':
+            bars['volume'] = rng.integers(40000, 120000, len(dates))
+        db.append_bars(symbol, bars)
+
+def _snapshots(count: int):
+    rng = np.random.default_rng(11)
+    snapshots = []
+    for _ in range(count):
+        snapshot = {market: {'close': float(rng.uniform(*close)), 'histogram': float(rng.normal(0, scale)),
+                             'rsi': float(rng.uniform(5, 95)), 'macd': 0.0, 'signal': 0.0, 'rsi_ma': 50.0}
+                    for market, close, scale in (('DJI', (36000, 42000), 60), ('NDX', (16000, 20000), 40),
+                                                 ('SOXX', (180, 260), 3), ('TXF1', (18000, 24000), 30))}
+        snapshot['TXF1']['volume'] = float(rng.integers(20000, 140000))
+        snapshots.append(snapshot)
+    return snapshots
+
+def _lookup(result, path):
+    for key in path:
+        result = result[key]
+    return result
+
+def test_batch_matches_scalar_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(feature_context, 'date', _HistoryEndDate)
+    engine = EnhancedPredictionEngine()
+    _seed_history(engine.historical_db)
+    # 衍生表格在背景建立，建好後再比對（避免兩條路徑之間季節性調整改變）
+    engine._derived_tables.get()
+    assert engine._derived_tables.wait(60)
+    engine.optimal_ratios = dict(DEFAULT_OPTIMAL_RATIOS, dji_txf_correlation=0.62, ndx_txf_correlation=0.55,
+                                 soxx_txf_correlation=0.48)
+
+    snapshots = _snapshots(60)
+    batch = engine.predict_batch(snapshots_to_frame(snapshots))
+    assert list(batch.columns) == list(SCALAR_PATHS)
+
+    for row, snapshot in zip(batch.itertuples(index=False), snapshots):
+        scalar = engine.generate_comprehensive_prediction_enhanced(snapshot)
+        for column, path in SCALAR_PATHS.items():
+            assert getattr(row, column) == _lookup(scalar, path), column
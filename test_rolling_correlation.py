@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from historical_database import HistoricalDatabase
+from rolling_correlation import SOURCE_SYMBOLS, RollingCorrelationEngine
+
+WINDOWS = (5, 20, 60)
+
+def _seed(db):
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range('2023-01-02', periods=320)
+    txf_returns = rng.normal(0, 0.01, len(dates))
+    series = {'TXF': pd.Series(20000.0 * np.exp(np.cumsum(txf_returns)), index=dates)}
+    for symbol, start, beta in (('DJI', 38000.0, 0.8), ('NDX', 17000.0, 1.2), ('SOXX', 220.0, -0.5)):
+        moves = beta * txf_returns + rng.normal(0, 0.008, len(dates))
+        series[symbol] = pd.Series(start * np.exp(np.cumsum(moves)), index=dates)
+    # DJI 少了一段日期（例如美股休市），對齊時這些日期整列剔除
+    series['DJI'] = series['DJI'].drop(dates[100:107])
+    for symbol, closes in series.items():
+        db.append_bars(symbol, {'date': closes.index.strftime('%Y-%m-%d'), 'close': closes.to_numpy()})
+    return pd.concat(series, axis=1, join='inner')
+
+def test_rolling_statistics_match_pandas(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    closes = _seed(db)
+    assert len(closes) == 313
+    returns = closes.pct_change(fill_method=None)
+
+    result = RollingCorrelationEngine(db, WINDOWS).compute()
+    for window in WINDOWS:
+        for symbol in SOURCE_SYMBOLS:
+            rows = result[(result['window'] == window) & (result['symbol'] == symbol)].set_index('date')
+            rows = rows.reindex(closes.index.strftime('%Y-%m-%d'))
+            source, target = returns[symbol].rolling(window), returns['TXF'].rolling(window)
+            expected_correlation = source.corr(returns['TXF']).to_numpy()
+            expected_beta = (target.cov(returns[symbol]) / source.var()).to_numpy()
+            expected_ratio = (closes['TXF'] / closes[symbol]).rolling(window).mean().to_numpy()
+
+            # 視窗邊界：比例在第 window 筆起有值，報酬率少一筆，相關性與 beta 晚一筆
+            assert np.isnan(rows['ratio'].iloc[window - 2]) and not np.isnan(rows['ratio'].iloc[window - 1])
+            assert np.isnan(rows['correlation'].iloc[window - 1]) and not np.isnan(rows['correlation'].iloc[window])
+            np.testing.assert_allclose(rows['correlation'], expected_correlation, rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(rows['beta'], expected_beta, rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(rows['ratio'], expected_ratio, rtol=1e-12)
+
+def test_asof_returns_last_aligned_day(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    closes = _seed(db)
+    engine = RollingCorrelationEngine(db, WINDOWS)
+    engine.rebuild()
+
+    # DJI 缺少的日期不是對齊後的交易日，as-of 回到缺口前最後一個共同日期
+    gap_day = pd.bdate_range('2023-01-02', periods=320)[103].strftime('%Y-%m-%d')
+    as_of = engine.get_asof(gap_day, window=20, refresh=False)
+    assert as_of['as_of'] == closes.index[99].strftime('%Y-%m-%d')
+    returns = closes.pct_change(fill_method=None).iloc[:100]
+    expected = returns['DJI'].rolling(20).corr(returns['TXF']).iloc[-1]
+    assert abs(as_of['dji_txf_correlation'] - expected) < 1e-9
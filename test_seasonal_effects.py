@@ -0,0 +1,57 @@
+import math
+import numpy as np
+import pandas as pd
+from historical_database import HistoricalDatabase, _day_numbers
+from seasonal_effects import SIGNIFICANCE_T, SeasonalEffectsEngine, seasonal_buckets
+
+def _seed(db, moves, dates):
+    db.append_bars('TXF', {'date': dates.strftime('%Y-%m-%d'), 'close': 20000.0 + np.cumsum(moves)})
+
+def _dates():
+    return pd.bdate_range('2015-01-05', '2024-12-31')
+
+def _planted_moves(dates):
+    rng = np.random.default_rng(21)
+    moves = rng.normal(0, 50, len(dates))
+    moves[dates.month == 3] += 40      # 三月偏多
+    moves[dates.weekday == 4] -= 30    # 星期五偏空
+    return moves
+
+def test_planted_effects_are_detected(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = _dates()
+    moves = _planted_moves(dates)
+    _seed(db, moves, dates)
+    engine = SeasonalEffectsEngine(db)
+    engine.rebuild()
+    effects = engine.get_effects('TXF', refresh=False)
+
+    march, friday = effects[('month', 3)], effects[('weekday', 4)]
+    assert march['excess_move'] > 25 and march['t_stat'] > SIGNIFICANCE_T and march['p_value'] < 1e-6
+    assert friday['excess_move'] < -15 and friday['t_stat'] < -SIGNIFICANCE_T and friday['p_value'] < 1e-6
+
+    # 與逐組手算的 t 值與常態近似雙尾 p 值一致（第一筆沒有前收盤，不計入）
+    samples = pd.DataFrame(seasonal_buckets(_day_numbers(dates.strftime('%Y-%m-%d'))[1:],
+                                            db.get_trading_calendar('TXF')))
+    samples['move'] = moves[1:]
+    for dimension in ('month', 'weekday', 'days_to_expiry'):
+        group = samples[samples[dimension] == samples[dimension].iloc[0]]['move']
+        effect = effects[(dimension, int(samples[dimension].iloc[0]))]
+        t_stat = (group.mean() - samples['move'].mean()) / (group.std() / math.sqrt(len(group)))
+        assert effect['sample_count'] == len(group)
+        assert abs(effect['t_stat'] - t_stat) < 1e-9
+        assert abs(effect['p_value'] - math.erfc(abs(t_stat) / math.sqrt(2))) < 1e-12
+
+    adjustment = engine.adjustment('2025-03-14', refresh=False)
+    assert adjustment['components']['month']['significant']
+    assert adjustment['components']['weekday']['significant']
+
+def test_shuffled_control_has_no_month_effect(tmp_path):
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = _dates()
+    moves = np.random.default_rng(8).permutation(_planted_moves(dates))
+    _seed(db, moves, dates)
+    effects = SeasonalEffectsEngine(db).effects_asof('2099-12-31')
+
+    assert abs(effects[('month', 3)]['t_stat']) < SIGNIFICANCE_T
+    assert abs(effects[('weekday', 4)]['t_stat']) < SIGNIFICANCE_T
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+from technical_indicators import INDICATOR_COLUMNS, compute_indicators, ema
+
+def _closes(count=5000):
+    rng = np.random.default_rng(1)
+    return 20000.0 * np.exp(np.cumsum(rng.normal(0, 0.012, count)))
+
+def _reference(close):
+    series = pd.Series(close)
+    macd = series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    change = series.diff()
+    avg_gain = change.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+    avg_loss = (-change).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+    rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return {'macd': macd, 'signal': signal, 'histogram': macd - signal, 'rsi': rsi,
+            'rsi_ma': rsi.rolling(9, min_periods=1).mean()}
+
+@pytest.mark.parametrize('alpha', [2 / 13, 2 / 27, 1 / 14, 0.9])
+def test_blockwise_ema_matches_pandas(alpha):
+    # 5000 筆超過分段閉式解的區塊長度，跨區塊延續也要一致
+    close = _closes()
+    expected = pd.Series(close).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(ema(close, alpha), expected, rtol=1e-9)
+    matrix = np.column_stack((close, close[::-1]))
+    np.testing.assert_allclose(ema(matrix, alpha)[:, 1], pd.Series(close[::-1]).ewm(alpha=alpha, adjust=False).mean(),
+                               rtol=1e-9)
+
+def test_indicators_match_pandas():
+    close = _closes()
+    indicators, _ = compute_indicators(close)
+    expected = _reference(close)
+    assert np.isnan(indicators['rsi'][0])
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(indicators[column], expected[column].to_numpy(), rtol=1e-9, atol=1e-9,
+                                   err_msg=column)
+
+@pytest.mark.parametrize('split', [1, 5, 2500, 4999])
+def test_chunked_continuation_matches_one_pass(split):
+    close = _closes()
+    whole, whole_state = compute_indicators(close)
+    head, state = compute_indicators(close[:split])
+    tail, tail_state = compute_indicators(close[split:], state)
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(np.concatenate((head[column], tail[column])), whole[column],
+                                   rtol=1e-9, atol=1e-9, err_msg=column)
+    assert tail_state.bars == whole_state.bars == len(close)
+    assert tail_state.rsi_tail == pytest.approx(whole_state.rsi_tail, rel=1e-9)
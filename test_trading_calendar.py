@@ -0,0 +1,32 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+from historical_database import HistoricalDatabase
+from trading_calendar import TradingCalendar, taifex_holiday_table
+
+def test_lunar_holidays_from_table():
+    # 數據只到 2025-04-17，之後的春節、端午、中秋休市由休市表補足
+    calendar = TradingCalendar('TAIFEX', observed_days=[20195], end_date='2026-12-31')
+    assert not calendar.is_trading_day('2025-10-06')
+    assert not calendar.is_trading_day('2026-02-17')
+    assert calendar.shift('2026-02-11', 1) == '2026-02-23'
+
+def test_warns_past_holiday_table(capsys):
+    last_year = max(taifex_holiday_table())
+    calendar = TradingCalendar('TAIFEX', end_date=f"{last_year + 1}-12-31")
+    calendar.shift(f"{last_year}-12-01", 1)
+    assert capsys.readouterr().out == ""
+    calendar.shift(f"{last_year + 1}-02-01", 1)
+    calendar.shift(f"{last_year + 1}-03-01", 1)
+    assert capsys.readouterr().out.count("休市表只涵蓋至") == 1
+
+def test_optimal_ratios_use_exact_session_window(tmp_path):
+    # 只取最近10個交易日計算比例，不以日曆天數加倍粗估
+    db = HistoricalDatabase(str(tmp_path / 'history.db'))
+    dates = pd.bdate_range(end=date.today(), periods=40).strftime('%Y-%m-%d')
+    for symbol, step in (('TXF', 1), ('DJI', 2), ('NDX', 3), ('SOXX', 4)):
+        db.append_bars(symbol, {'date': dates, 'close': np.arange(40) * step + 20000.0})
+    ratios = db.get_optimal_prediction_ratios(lookback_days=10)
+    last = np.arange(30, 40)
+    assert ratios['dji_txf_ratio'] == pytest.approx(np.mean((last + 20000.0) / (last * 2 + 20000.0)))
@@ -0,0 +1,45 @@
+from datetime import date, datetime
+from pathlib import Path
+import feature_context
+import ultimate_strategy_executor
+from historical_csv_importer import UNIFIED_CSV_PATH, import_unified_csv
+from historical_database import HistoricalDatabase
+from ultimate_strategy_executor import UltimateStrategyExecutor
+
+class _CsvEndDatetime(datetime):
+    """固定「今天」為統一歷史CSV的最後交易日之後"""
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 4, 18)
+
+class _CsvEndDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2025, 4, 18)
+
+def test_analysis_on_csv_seeded_database(tmp_path, monkeypatch):
+    # 統一歷史CSV沒有成交量欄位，匯入後 txf_history.volume 全為空值
+    csv_path = Path(__file__).parent / UNIFIED_CSV_PATH
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ultimate_strategy_executor, 'datetime', _CsvEndDatetime)
+    # 歷史統計視窗也結束於CSV最後交易日，否則滾動統計早於視窗起日而改用預設值
+    monkeypatch.setattr(feature_context, 'date', _CsvEndDate)
+    db = HistoricalDatabase()
+    import_unified_csv(db, str(csv_path))
+    last = db.get_historical_data('TXF', '2025-04-01', '2025-04-17').iloc[-1]
+    assert last['volume'] != last['volume']  # NaN
+
+    market_data = {
+        "TXF1": {"close": float(last['close']), "volume": 90000, "macd": float(last['macd']),
+                 "signal": float(last['signal']), "histogram": float(last['histogram']),
+                 "rsi": float(last['rsi']), "rsi_ma": float(last['rsi_ma'])},
+        "DJI": {"close": 39700.0, "macd": -150.0, "signal": -120.0, "histogram": -30.0, "rsi": 42.0, "rsi_ma": 45.0},
+        "NDX": {"close": 18200.0, "macd": -100.0, "signal": -90.0, "histogram": -10.0, "rsi": 44.0, "rsi_ma": 46.0},
+        "SOXX": {"close": 170.0, "macd": -3.0, "signal": -2.5, "histogram": -0.5, "rsi": 40.0, "rsi_ma": 43.0}
+    }
+    analysis = UltimateStrategyExecutor().analyze(market_data)
+
+    # 相似歷史情況以價格與RSI比對，不因缺少成交量而退回預設回測
+    assert analysis.backtest.analysis_period == "10年歷史數據"
+    assert analysis.backtest.similar_scenarios > 0
+    assert analysis.prediction.txf_sentiment.volume_z_score == 0
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from walk_forward import MIN_SIGNALS, WalkForwardEvaluator, _direction_hits
+
+def test_nan_prediction_is_not_a_signal():
+    # 預測缺值、預測為 0、實際漲跌缺值都不算命中或失誤
+    predicted = np.array([np.nan, 12.0, -8.0, 0.0, 5.0])
+    realized = np.array([30.0, 4.0, 6.0, -2.0, np.nan])
+    hits = _direction_hits(predicted, realized)
+    assert np.isnan(hits[[0, 3, 4]]).all()
+    assert hits[1] == 1.0 and hits[2] == 0.0
+
+def test_nan_predictions_excluded_from_samples():
+    # 前半段預測全為 NaN（如資料不足的年度），有效訊號數與命中率只由後半段計算
+    days = np.arange(19000, 19000 + 2 * MIN_SIGNALS)
+    predicted = np.concatenate([np.full(MIN_SIGNALS, np.nan), np.full(MIN_SIGNALS, 10.0)])
+    realized = np.full(len(days), 5.0)
+    evaluations = pd.DataFrame({
+        'day': days,
+        'component': 'TXF_SENTIMENT',
+        'predicted_move': predicted,
+        'realized_move': realized,
+        'hit': _direction_hits(predicted, realized),
+        'abs_error': np.abs(predicted - realized)
+    })
+    evaluator = WalkForwardEvaluator(db=None, windows=(len(days),), processes=1)
+    evaluator.replay = lambda: evaluations
+    result = evaluator.compute()
+
+    assert result['samples'].iloc[MIN_SIGNALS - 1] == 0
+    assert result['samples'].iloc[-1] == MIN_SIGNALS
+    assert np.isnan(result['hit_rate'].iloc[-2])
+    assert result['hit_rate'].iloc[-1] == 1.0
@@ -0,0 +1,219 @@
+import json
+import numpy as np
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+DateLike = Union[str, date, datetime, np.datetime64]
+
+# 指數所屬市場
+SYMBOL_MARKETS = {
+    'TXF': 'TAIFEX',
+    'DJI': 'NYSE',
+    'NDX': 'NYSE',
+    'SOXX': 'NYSE'
+}
+
+# 台灣固定日期休市（農曆節日每年不同，歷史部分以資料庫實際交易日為準）
+TAIFEX_FIXED_HOLIDAYS = ((1, 1), (2, 28), (4, 4), (5, 1), (10, 10))
+
+# 期交所公告的各年度休市日（年度 -> 日期清單，含農曆節日、補假與無交易日；每年公告後補上新年度）
+TAIFEX_HOLIDAYS_PATH = str(Path(__file__).resolve().parent / "taifex_holidays.json")
+
+# 紐約證交所臨時休市
+NYSE_SPECIAL_CLOSURES = ('2012-10-29', '2012-10-30', '2018-12-05', '2025-01-09')
+
+# 規則推算的日曆範圍（往後延伸的年數）
+FUTURE_YEARS = 2
+
+def _to_day(value: DateLike) -> int:
+    """日期轉為整數日序（1970-01-01 為 0）"""
+    if isinstance(value, str):
+        return int(np.datetime64(value[:10], 'D').astype(np.int64))
+    if isinstance(value, datetime):
+        value = value.date()
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+def _day_to_string(day: int) -> str:
+    return str(np.datetime64(int(day), 'D'))
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """某月第 n 個星期幾（n 為負數時由月底往前數）"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1))
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+def _easter(year: int) -> date:
+    """西曆復活節（Anonymous Gregorian algorithm）"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(holiday: date) -> Optional[date]:
+    """週末遇假日的補假（週六提前至週五、週日順延至週一）"""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+def nyse_holidays(year: int) -> Set[date]:
+    """紐約證交所全日休市日"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),            # 馬丁路德金恩紀念日
+        _nth_weekday(year, 2, 0, 3),            # 總統日
+        _easter(year) - timedelta(days=2),      # 耶穌受難日
+        _nth_weekday(year, 5, 0, -1),           # 陣亡將士紀念日
+        _observed(date(year, 7, 4)),            # 獨立紀念日
+        _nth_weekday(year, 9, 0, 1),            # 勞動節
+        _nth_weekday(year, 11, 3, 4),           # 感恩節
+        _observed(date(year, 12, 25))           # 聖誕節
+    }
+    # 元旦遇週六時不提前到前一年12/31
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # 六月節
+    holidays.update(
+        datetime.strptime(closure, '%Y-%m-%d').date()
+        for closure in NYSE_SPECIAL_CLOSURES if closure.startswith(str(year))
+    )
+    return holidays
+
+@lru_cache(maxsize=None)
+def taifex_holiday_table(path: str = TAIFEX_HOLIDAYS_PATH) -> Dict[int, Set[date]]:
+    """讀取期交所休市表（檔案不存在時為空表）"""
+    if not Path(path).exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    return {
+        int(year): {datetime.strptime(day, '%Y-%m-%d').date() for day in days}
+        for year, days in table.items()
+    }
+
+def taifex_holidays(year: int) -> Set[date]:
+    """台灣期交所休市日（固定日期加上休市表中該年度的農曆節日與補假）"""
+    return {date(year, month, day) for month, day in TAIFEX_FIXED_HOLIDAYS} | taifex_holiday_table().get(year, set())
+
+MARKET_HOLIDAYS = {
+    'NYSE': nyse_holidays,
+    'TAIFEX': taifex_holidays
+}
+
+# 休市規則無法推算全部假日、需由公告休市表補足的市場
+MARKET_HOLIDAY_TABLES = {
+    'TAIFEX': taifex_holiday_table
+}
+
+class TradingCalendar:
+    """交易日曆索引：O(1) 查詢「往前 N 個交易日」與固定長度的交易日視窗
+
+    observed_days（資料庫中實際有K棒的日序）涵蓋的區間以實際交易日為準（含農曆假期等），
+    區間以外（通常是最新數據之後）以週末與休市規則推算。
+    需要休市表的市場查詢超出休市表與實際交易日涵蓋範圍的日期時，提示交易日可能少算農曆假期。
+    """
+
+    def __init__(self, market: str, observed_days: Optional[Iterable[int]] = None,
+                 start_date: DateLike = '2000-01-01', end_date: Optional[DateLike] = None):
+        if market not in MARKET_HOLIDAYS:
+            raise ValueError(f"不支持的市場: {market}")
+        self.market = market
+
+        start = _to_day(start_date)
+        end = _to_day(end_date) if end_date is not None else _to_day(date.today()) + 366 * FUTURE_YEARS
+        observed = np.unique(np.asarray(list(observed_days) if observed_days is not None else [], dtype=np.int64))
+        if len(observed):
+            start = min(start, int(observed[0]))
+            end = max(end, int(observed[-1]))
+
+        candidates = np.arange(start, end + 1, dtype=np.int64)
+        weekdays = candidates[(candidates + 3) % 7 < 5]
+        holidays = np.array(sorted(
+            _to_day(holiday)
+            for year in range(int(str(np.datetime64(start, 'D'))[:4]), int(str(np.datetime64(end, 'D'))[:4]) + 1)
+            for holiday in MARKET_HOLIDAYS[market](year)
+        ), dtype=np.int64)
+        rule_days = weekdays[~np.isin(weekdays, holidays)]
+
+        if len(observed):
+            outside = (rule_days < observed[0]) | (rule_days > observed[-1])
+            days = np.union1d(observed, rule_days[outside])
+        else:
+            days = rule_days
+
+        self.days = days
+        self.first_day = int(days[0])
+        self.last_day = int(days[-1])
+        # 休市日確定的最後一天（None 表示休市規則完整）
+        self.known_until: Optional[int] = None
+        table = MARKET_HOLIDAY_TABLES.get(market)
+        if table is not None:
+            years = table()
+            known = _to_day(date(max(years), 12, 31)) if years else start - 1
+            self.known_until = max(known, int(observed[-1])) if len(observed) else known
+        self._warned = False
+        # 每個日曆日 -> 當天（含）以前最後一個交易日的位置，查詢為 O(1)
+        marks = np.zeros(self.last_day - self.first_day + 1, dtype=np.int64)
+        marks[days - self.first_day] = 1
+        self._position = np.cumsum(marks) - 1
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def position(self, value: DateLike) -> int:
+        """當天（含）以前最後一個交易日在索引中的位置（早於日曆起點為 -1）"""
+        day = _to_day(value)
+        if self.known_until is not None and day > self.known_until and not self._warned:
+            self._warned = True
+            print(f"⚠️ {self.market} 休市表只涵蓋至 {_day_to_string(self.known_until)}，"
+                  f"之後的交易日以週末與固定假日推算，未計入農曆假期（請更新 {Path(TAIFEX_HOLIDAYS_PATH).name}）")
+        if day < self.first_day:
+            return -1
+        if day > self.last_day:
+            return len(self.days) - 1
+        return int(self._position[day - self.first_day])
+
+    def is_trading_day(self, value: DateLike) -> bool:
+        day = _to_day(value)
+        position = self.position(day)
+        return position >= 0 and int(self.days[position]) == day
+
+    def shift(self, value: DateLike, sessions: int) -> str:
+        """由指定日期（或其前一個交易日）移動 sessions 個交易日"""
+        position = self.position(value) + sessions
+        position = min(max(position, 0), len(self.days) - 1)
+        return _day_to_string(self.days[position])
+
+    def trading_days_back(self, sessions: int, as_of: Optional[DateLike] = None) -> str:
+        """往前數 sessions 個交易日的日期（含 as_of 當天在內共 sessions 個交易日的起點）"""
+        return self.window(sessions, as_of)[0]
+
+    def window(self, sessions: int, as_of: Optional[DateLike] = None) -> Tuple[str, str]:
+        """結束於 as_of（含）以前最後一個交易日、恰好 sessions 個交易日的 (起日, 迄日)"""
+        end = self.position(as_of if as_of is not None else date.today())
+        if end < 0:
+            return _day_to_string(self.first_day), _day_to_string(self.first_day - 1)
+        start = max(end - max(sessions, 1) + 1, 0)
+        return _day_to_string(self.days[start]), _day_to_string(self.days[end])
+
+    def sessions_between(self, start: DateLike, end: DateLike) -> int:
+        """兩日期之間（含頭尾）的交易日數"""
+        return max(self.position(end) - self.position(_to_day(start) - 1), 0)
+
+    def trading_days(self, start: DateLike, end: DateLike) -> List[str]:
+        lower = self.position(_to_day(start) - 1) + 1
+        upper = self.position(end) + 1
+        return [_day_to_string(day) for day in self.days[lower:upper]]
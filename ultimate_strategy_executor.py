@@ -1,5 +1,7 @@
 import json
-from typing import Dict
+from datetime import datetime
+from typing import Dict, List
+from analysis_results import BacktestSummary, PredictionResult, UltimateAnalysis
 from adaptive_range_config import AdaptiveRangeConfig, enhanced_strategy_analysis
 from enhanced_prediction_engine import EnhancedPredictionEngine
 from historical_database import HistoricalDatabase
@@ -18,8 +20,8 @@ class UltimateStrategyExecutor:
         
         print("✅ 終極版策略系統初始化完成")
         
-    def execute_ultimate_analysis(self, market_data: Dict) -> str:
-        """執行終極版綜合分析：區間策略 + 歷史數據增強預測"""
+    def analyze(self, market_data: Dict) -> UltimateAnalysis:
+        """執行終極版綜合分析：區間策略 + 歷史數據增強預測（結構化結果）"""
         
         print("🔍 開始執行終極版策略分析...")
         
@@ -27,17 +29,25 @@ class UltimateStrategyExecutor:
         zone_analysis = enhanced_strategy_analysis(market_data)
         
         # 2. 基於10年歷史數據的增強版預測分析
-        prediction_result = self.prediction_engine.generate_comprehensive_prediction_enhanced(market_data)
+        prediction = self.prediction_engine.predict(market_data)
         
         # 3. 歷史回測驗證
-        historical_backtest = self._perform_historical_backtest(market_data)
-        
-        # 4. 生成終極版綜合報告
-        report = self._generate_ultimate_report(market_data, prediction_result, zone_analysis, historical_backtest)
+        backtest = self._perform_historical_backtest(market_data)
         
-        return report
+        return UltimateAnalysis(
+            market_data=market_data,
+            prediction=prediction,
+            backtest=backtest,
+            zone_analysis=zone_analysis,
+            risk_warnings=self._generate_ultimate_risk_warnings(market_data, prediction, backtest),
+            strategy_summary=self._generate_ultimate_strategy_summary(prediction, backtest)
+        )
+    
+    def execute_ultimate_analysis(self, market_data: Dict) -> str:
+        """執行終極版綜合分析並產生文字報告"""
+        return render_ultimate_report(self.analyze(market_data))
     
-    def _perform_historical_backtest(self, market_data: Dict) -> Dict:
+    def _perform_historical_backtest(self, market_data: Dict) -> BacktestSummary:
         """執行歷史回測驗證"""
         try:
             current_price = market_data["TXF1"]["close"]
@@ -47,36 +57,34 @@ class UltimateStrategyExecutor:
             # 尋找歷史相似情況
             similar_conditions = self._find_similar_historical_conditions(current_price, current_rsi, current_volume)
             
-            return {
-                "similar_scenarios": similar_conditions["count"],
-                "average_next_day_move": similar_conditions["avg_move"],
-                "success_rate": similar_conditions["success_rate"],
-                "max_gain": similar_conditions["max_gain"],
-                "max_loss": similar_conditions["max_loss"],
-                "confidence": similar_conditions["confidence"],
-                "analysis_period": "10年歷史數據"
-            }
+            return BacktestSummary(
+                similar_scenarios=similar_conditions["count"],
+                average_next_day_move=similar_conditions["avg_move"],
+                success_rate=similar_conditions["success_rate"],
+                max_gain=similar_conditions["max_gain"],
+                max_loss=similar_conditions["max_loss"],
+                confidence=similar_conditions["confidence"],
+                analysis_period="10年歷史數據"
+            )
         except Exception as e:
             print(f"⚠️ 歷史回測執行錯誤: {e}")
-            return {
-                "similar_scenarios": 0,
-                "average_next_day_move": 0,
-                "success_rate": 0.5,
-                "max_gain": 0,
-                "max_loss": 0,
-                "confidence": 0.3,
-                "analysis_period": "無法執行"
-            }
+            return BacktestSummary(
+                similar_scenarios=0,
+                average_next_day_move=0,
+                success_rate=0.5,
+                max_gain=0,
+                max_loss=0,
+                confidence=0.3,
+                analysis_period="無法執行"
+            )
     
     def _find_similar_historical_conditions(self, current_price: float, current_rsi: float, current_volume: int) -> Dict:
         """尋找歷史相似市場條件"""
         try:
-            # 獲取過去2年的歷史數據進行比較
-            from datetime import datetime, timedelta
-            end_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=730)).strftime('%Y-%m-%d')
-            
-            historical_data = self.historical_db.get_historical_data('TXF', start_date, end_date)
+            # 獲取過去2年（排除最近一個月）的歷史數據進行比較，以交易日曆取得固定筆數
+            calendar = self.historical_db.get_trading_calendar('TXF')
+            end_date = calendar.shift(datetime.now().date(), -21)
+            historical_data = self.historical_db.get_historical_window('TXF', 480, end_date)
             
             if len(historical_data) < 50:
                 raise ValueError("歷史數據不足")
@@ -88,6 +96,9 @@ class UltimateStrategyExecutor:
             
             similar_days = []
             
+            # 沒有成交量紀錄的日子（如CSV匯入的歷史）只比較價格與RSI
+            volume_known = historical_data['volume'].notna() & bool(current_volume)
+            
             for i, row in historical_data.iterrows():
                 # 檢查是否有下一天數據
                 if i + 1 >= len(historical_data):
@@ -98,7 +109,7 @@ class UltimateStrategyExecutor:
                 # 計算相似度
                 price_diff = abs(row['close'] - current_price) / current_price
                 rsi_diff = abs(row['rsi'] - current_rsi)
-                volume_diff = abs(row['volume'] - current_volume) / current_volume
+                volume_diff = abs(row['volume'] - current_volume) / current_volume if volume_known[i] else 0
                 
                 # 判斷是否相似
                 if (price_diff <= price_tolerance and 
@@ -126,7 +137,7 @@ class UltimateStrategyExecutor:
                     
                     price_diff = abs(row['close'] - current_price) / current_price
                     rsi_diff = abs(row['rsi'] - current_rsi)
-                    volume_diff = abs(row['volume'] - current_volume) / current_volume
+                    volume_diff = abs(row['volume'] - current_volume) / current_volume if volume_known[i] else 0
                     
                     if (price_diff <= price_tolerance and 
                         rsi_diff <= rsi_tolerance and 
@@ -172,165 +183,16 @@ class UltimateStrategyExecutor:
                 "confidence": 0.2
             }
     
-    def _generate_ultimate_report(self, market_data: Dict, prediction: Dict, zone_analysis: str, backtest: Dict) -> str:
-        """生成終極版綜合分析報告"""
-        
-        current_price = market_data["TXF1"]["close"]
-        dji_close = market_data["DJI"]["close"]
-        
-        # 報告標題
-        report_lines = [
-            "=" * 90,
-            "🏆 【台指期貨終極版策略分析報告 - 基於10年歷史數據】",
-            "=" * 90,
-            ""
-        ]
-        
-        # 當前市場狀況
-        report_lines.extend([
-            "📊 【當前市場狀況】",
-            f"台指期貨 TXF1：{current_price:,} 點",
-            f"道瓊指數 DJI：{dji_close:,} 點",
-            f"分析時間：{market_data.get('date', 'N/A')}",
-            f"歷史數據期間：2015-2025 (10年)",
-            ""
-        ])
-        
-        # 道瓊轉換分析（增強版）
-        dji_pred = prediction["dji_based_prediction"]
-        report_lines.extend([
-            "🇺🇸 【增強版道瓊指數轉換分析】",
-            f"基礎轉換點位：{dji_pred['base_prediction']:,} 點",
-            f"MACD調整：{dji_pred['macd_adjustment']:+} 點",
-            f"RSI調整：{dji_pred['rsi_adjustment']:+} 點",
-            f"季節性調整：{dji_pred['seasonal_adjustment']:+} 點",
-            f"最終預測結果：{dji_pred['final_prediction']:,} 點",
-            f"歷史相關性：{dji_pred['historical_correlation']:.3f}",
-            f"波動度因子：{dji_pred['volatility_factor']:.2f}",
-            f"預測信心度：{dji_pred['confidence']:.1%}",
-            ""
-        ])
-        
-        # 美國期貨風氣分析（增強版）
-        us_sentiment = prediction["us_futures_sentiment"]
-        report_lines.extend([
-            "🏛️ 【增強版美國期貨風氣分析】",
-            f"綜合風氣評分：{us_sentiment['sentiment_score']}/10",
-            f"風氣描述：{us_sentiment['description']}",
-            f"加權綜合RSI：{us_sentiment['weighted_rsi']:.2f}",
-            f"加權總動能：{us_sentiment['total_momentum']:+.2f}",
-            f"歷史權重配置：DJI={us_sentiment['historical_weights']['dji_weight']:.3f}, NDX={us_sentiment['historical_weights']['ndx_weight']:.3f}, SOXX={us_sentiment['historical_weights']['soxx_weight']:.3f}",
-            f"波動度調整：{us_sentiment['volatility_adjustment']:.2f}",
-            f"歷史有效性：{us_sentiment['historical_effectiveness']:.1%}",
-            f"對台指影響：{us_sentiment['txf_impact']:+} 點",
-            ""
-        ])
-        
-        # 台指期貨風氣分析（增強版）
-        txf_sentiment = prediction["txf_sentiment"]
-        hist_analysis = txf_sentiment["historical_analysis"]
-        report_lines.extend([
-            "🇹🇼 【增強版台指期貨風氣分析】",
-            f"綜合風氣評分：{txf_sentiment['sentiment_score']}/10",
-            f"風氣描述：{txf_sentiment['description']}",
-            f"成交量：{txf_sentiment['volume']:,} 口",
-            f"成交量Z分數：{hist_analysis['volume_z_score']:.2f}",
-            f"RSI歷史百分位：{hist_analysis['rsi_percentile']:.1f}%",
-            f"MACD Z分數：{hist_analysis['macd_z_score']:.2f}",
-            f"歷史模型有效性：{hist_analysis['effectiveness']:.1%}",
-            f"風氣點位影響：{txf_sentiment['txf_impact']:+} 點",
-            ""
-        ])
-        
-        # 歷史回測驗證
-        report_lines.extend([
-            "📈 【歷史回測驗證分析】",
-            f"相似歷史情況：{backtest['similar_scenarios']} 次",
-            f"平均次日變動：{backtest['average_next_day_move']:+.1f} 點",
-            f"歷史成功率：{backtest['success_rate']:.1%}",
-            f"最大獲利：{backtest['max_gain']:+.1f} 點",
-            f"最大虧損：{backtest['max_loss']:+.1f} 點",
-            f"回測信心度：{backtest['confidence']:.1%}",
-            f"分析期間：{backtest['analysis_period']}",
-            ""
-        ])
-        
-        # 歷史模式驗證
-        historical_val = prediction["historical_validation"]
-        report_lines.extend([
-            "🔍 【歷史模式匹配】",
-            f"識別模式：{historical_val['pattern_type']}",
-            f"預測變動：{historical_val['predicted_move']:+} 點",
-            f"模式信心度：{historical_val['confidence']:.1%}",
-            f"歷史匹配數：{historical_val['historical_matches']} 次",
-            ""
-        ])
-        
-        # 綜合預測結果
-        recommendation = prediction["recommendation"]
-        confidence_metrics = prediction["confidence_metrics"]
-        report_lines.extend([
-            "🎯 【終極版綜合預測結果】",
-            f"最終預測點位：{prediction['final_prediction']:,} 點",
-            f"預測區間：{prediction['prediction_range']['lower']:,} - {prediction['prediction_range']['upper']:,} 點",
-            f"與當前價差：{prediction['price_difference']:+} 點",
-            "",
-            "📈 【終極交易建議】",
-            f"建議方向：{recommendation['direction']}",
-            f"信心等級：{recommendation['confidence']}",
-            f"進場策略：{recommendation['entry_strategy']}",
-            f"預期移動：{recommendation['expected_move']}",
-            f"風險等級：{recommendation['risk_level']}",
-            f"歷史支撐：{recommendation['historical_support']}",
-            f"歷史信心：{recommendation['historical_confidence']}",
-            "",
-            "📊 【信心度指標】",
-            f"歷史準確性：{confidence_metrics['historical_accuracy']:.1%}",
-            f"相關性強度：{confidence_metrics['correlation_strength']:.3f}",
-            f"波動度調整：{confidence_metrics['volatility_adjustment']:.2f}",
-            ""
-        ])
-        
-        # 區間策略分析
-        report_lines.extend([
-            "🎪 【自適應區間策略分析】",
-            zone_analysis.replace("🎯 【台指期貨策略分析】\n", ""),
-            ""
-        ])
-        
-        # 風險提醒
-        report_lines.extend([
-            "⚠️ 【綜合風險評估】",
-            self._generate_ultimate_risk_warnings(market_data, prediction, backtest),
-            ""
-        ])
-        
-        # 終極建議
-        report_lines.extend([
-            "💎 【終極策略建議】",
-            self._generate_ultimate_strategy_summary(prediction, recommendation, backtest),
-            "",
-            "📋 【系統特色說明】",
-            "✅ 基於10年歷史數據的智能分析",
-            "✅ 動態相關性權重調整",
-            "✅ 歷史模式匹配驗證",
-            "✅ 多維度風險控制",
-            "✅ 自適應區間策略",
-            "✅ 季節性效應調整",
-            "=" * 90
-        ])
-        
-        return "\n".join(report_lines)
-    
-    def _generate_ultimate_risk_warnings(self, market_data: Dict, prediction: Dict, backtest: Dict) -> str:
+    def _generate_ultimate_risk_warnings(self, market_data: Dict, prediction: PredictionResult,
+                                         backtest: BacktestSummary) -> List[str]:
         """生成終極版風險警告"""
         warnings = []
         
         txf_rsi = market_data["TXF1"]["rsi"]
-        us_sentiment = prediction["us_futures_sentiment"]["sentiment_score"]
-        txf_sentiment = prediction["txf_sentiment"]["sentiment_score"]
-        price_diff = abs(prediction["price_difference"])
-        success_rate = backtest["success_rate"]
+        us_sentiment = prediction.us_sentiment.sentiment_score
+        txf_sentiment = prediction.txf_sentiment.sentiment_score
+        price_diff = abs(prediction.price_difference)
+        success_rate = backtest.success_rate
         
         # RSI風險
         if txf_rsi > 80:
@@ -360,20 +222,20 @@ class UltimateStrategyExecutor:
             warnings.append("🔴 預測價差過大(>200點)，注意跳空及流動性風險")
         
         # 歷史數據稀少風險
-        if backtest["similar_scenarios"] < 5:
+        if backtest.similar_scenarios < 5:
             warnings.append("🟡 相似歷史情況樣本較少，預測可信度下降")
             
         if not warnings:
             warnings.append("🟢 當前風險等級在歷史統計範圍內，但仍需謹慎操作")
             
-        return "\n".join([f"• {warning}" for warning in warnings])
+        return warnings
     
-    def _generate_ultimate_strategy_summary(self, prediction: Dict, recommendation: Dict, backtest: Dict) -> str:
+    def _generate_ultimate_strategy_summary(self, prediction: PredictionResult, backtest: BacktestSummary) -> str:
         """生成終極策略總結"""
-        direction = recommendation["direction"]
-        confidence = recommendation["confidence"]
-        price_diff = prediction["price_difference"]
-        success_rate = backtest["success_rate"]
+        direction = prediction.recommendation.direction
+        confidence = prediction.recommendation.confidence
+        price_diff = prediction.price_difference
+        success_rate = backtest.success_rate
         
         if direction in ["做多", "偏多"]:
             if price_diff > 100 and success_rate > 0.6:
@@ -392,6 +254,157 @@ class UltimateStrategyExecutor:
         else:
             return f"【建議觀望】歷史數據方向不明確，成功率{success_rate:.1%}，等待更清晰信號再操作"
 
+def render_ultimate_report(analysis: UltimateAnalysis) -> str:
+    """將終極版分析結果排版成文字報告"""
+    market_data = analysis.market_data
+    prediction = analysis.prediction
+    backtest = analysis.backtest
+    
+    current_price = market_data["TXF1"]["close"]
+    dji_close = market_data["DJI"]["close"]
+    
+    # 報告標題
+    report_lines = [
+        "=" * 90,
+        "🏆 【台指期貨終極版策略分析報告 - 基於10年歷史數據】",
+        "=" * 90,
+        ""
+    ]
+    
+    # 當前市場狀況
+    report_lines.extend([
+        "📊 【當前市場狀況】",
+        f"台指期貨 TXF1：{current_price:,} 點",
+        f"道瓊指數 DJI：{dji_close:,} 點",
+        f"分析時間：{market_data.get('date', 'N/A')}",
+        f"歷史數據期間：2015-2025 (10年)",
+        ""
+    ])
+    
+    # 道瓊轉換分析（增強版）
+    dji_pred = prediction.dji
+    report_lines.extend([
+        "🇺🇸 【增強版道瓊指數轉換分析】",
+        f"基礎轉換點位：{dji_pred.base_prediction:,} 點",
+        f"MACD調整：{dji_pred.macd_adjustment:+} 點",
+        f"RSI調整：{dji_pred.rsi_adjustment:+} 點",
+        f"季節性調整：{dji_pred.seasonal_adjustment:+} 點",
+        f"最終預測結果：{dji_pred.final_prediction:,} 點",
+        f"歷史相關性：{dji_pred.historical_correlation:.3f}",
+        f"波動度因子：{dji_pred.volatility_factor:.2f}",
+        f"預測信心度：{dji_pred.confidence:.1%}",
+        ""
+    ])
+    
+    # 美國期貨風氣分析（增強版）
+    us_sentiment = prediction.us_sentiment
+    report_lines.extend([
+        "🏛️ 【增強版美國期貨風氣分析】",
+        f"綜合風氣評分：{us_sentiment.sentiment_score}/10",
+        f"風氣描述：{us_sentiment.description}",
+        f"加權綜合RSI：{us_sentiment.weighted_rsi:.2f}",
+        f"加權總動能：{us_sentiment.total_momentum:+.2f}",
+        f"歷史權重配置：DJI={us_sentiment.dji_weight:.3f}, NDX={us_sentiment.ndx_weight:.3f}, SOXX={us_sentiment.soxx_weight:.3f}",
+        f"波動度調整：{us_sentiment.volatility_adjustment:.2f}",
+        f"歷史有效性：{us_sentiment.historical_effectiveness:.1%}",
+        f"對台指影響：{us_sentiment.txf_impact:+} 點",
+        ""
+    ])
+    
+    # 台指期貨風氣分析（增強版）
+    txf_sentiment = prediction.txf_sentiment
+    report_lines.extend([
+        "🇹🇼 【增強版台指期貨風氣分析】",
+        f"綜合風氣評分：{txf_sentiment.sentiment_score}/10",
+        f"風氣描述：{txf_sentiment.description}",
+        f"成交量：{txf_sentiment.volume:,} 口",
+        f"成交量Z分數：{txf_sentiment.volume_z_score:.2f}",
+        f"RSI歷史百分位：{txf_sentiment.rsi_percentile:.1f}%",
+        f"MACD Z分數：{txf_sentiment.macd_z_score:.2f}",
+        f"歷史模型有效性：{txf_sentiment.effectiveness:.1%}",
+        f"風氣點位影響：{txf_sentiment.txf_impact:+} 點",
+        ""
+    ])
+    
+    # 歷史回測驗證
+    report_lines.extend([
+        "📈 【歷史回測驗證分析】",
+        f"相似歷史情況：{backtest.similar_scenarios} 次",
+        f"平均次日變動：{backtest.average_next_day_move:+.1f} 點",
+        f"歷史成功率：{backtest.success_rate:.1%}",
+        f"最大獲利：{backtest.max_gain:+.1f} 點",
+        f"最大虧損：{backtest.max_loss:+.1f} 點",
+        f"回測信心度：{backtest.confidence:.1%}",
+        f"分析期間：{backtest.analysis_period}",
+        ""
+    ])
+    
+    # 歷史模式驗證
+    historical_val = prediction.historical_validation
+    report_lines.extend([
+        "🔍 【歷史模式匹配】",
+        f"識別模式：{historical_val.pattern_type}",
+        f"預測變動：{historical_val.predicted_move:+} 點",
+        f"模式信心度：{historical_val.confidence:.1%}",
+        f"歷史匹配數：{historical_val.historical_matches} 次",
+        ""
+    ])
+    
+    # 綜合預測結果
+    recommendation = prediction.recommendation
+    report_lines.extend([
+        "🎯 【終極版綜合預測結果】",
+        f"最終預測點位：{prediction.final_prediction:,} 點",
+        f"預測區間：{prediction.prediction_lower:,} - {prediction.prediction_upper:,} 點",
+        f"與當前價差：{prediction.price_difference:+} 點",
+        "",
+        "📈 【終極交易建議】",
+        f"建議方向：{recommendation.direction}",
+        f"信心等級：{recommendation.confidence}",
+        f"進場策略：{recommendation.entry_strategy}",
+        f"預期移動：{recommendation.expected_move}",
+        f"風險等級：{recommendation.risk_level}",
+        f"歷史支撐：{recommendation.historical_support}",
+        f"歷史信心：{recommendation.historical_confidence}",
+        "",
+        "📊 【信心度指標】",
+        f"歷史準確性：{historical_val.confidence:.1%}",
+        f"相關性強度：{dji_pred.historical_correlation:.3f}",
+        f"波動度調整：{us_sentiment.volatility_adjustment:.2f}",
+        ""
+    ])
+    
+    # 區間策略分析
+    report_lines.extend([
+        "🎪 【自適應區間策略分析】",
+        analysis.zone_analysis.replace("🎯 【台指期貨策略分析】\n", ""),
+        ""
+    ])
+    
+    # 風險提醒
+    report_lines.extend([
+        "⚠️ 【綜合風險評估】",
+        "\n".join(f"• {warning}" for warning in analysis.risk_warnings),
+        ""
+    ])
+    
+    # 終極建議
+    report_lines.extend([
+        "💎 【終極策略建議】",
+        analysis.strategy_summary,
+        "",
+        "📋 【系統特色說明】",
+        "✅ 基於10年歷史數據的智能分析",
+        "✅ 動態相關性權重調整",
+        "✅ 歷史模式匹配驗證",
+        "✅ 多維度風險控制",
+        "✅ 自適應區間策略",
+        "✅ 季節性效應調整",
+        "=" * 90
+    ])
+    
+    return "\n".join(report_lines)
+
 def run_ultimate_strategy(data_path: str = "data/sample_input.json") -> str:
     """執行終極版策略分析"""
     try:
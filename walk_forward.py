@@ -0,0 +1,268 @@
+import multiprocessing
+import os
+import time
+import pandas as pd
+import numpy as np
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from historical_database import HistoricalDatabase, _day_bound, _day_numbers, _day_to_string
+from rolling_correlation import RollingCorrelationEngine
+from seasonal_effects import SeasonalEffectsEngine, adjustment_points
+
+# 重播的預測元件 -> (批次預測輸出欄位, 是否為點位預測（否則為相對目前價格的漲跌點數）)
+COMPONENTS = {
+    'DJI_CONVERSION': ('dji_final_prediction', True),
+    'US_SENTIMENT': ('us_txf_impact', False),
+    'TXF_SENTIMENT': ('txf_impact', False),
+    'PATTERN_VALIDATION': ('historical_predicted_move', False)
+}
+
+# 命中率與誤差的滾動視窗（評估筆數）
+EFFECTIVENESS_WINDOWS = (60, 252)
+
+# 滾動視窗內最少需要的有方向訊號筆數
+MIN_SIGNALS = 20
+
+DERIVED_NAME = 'component_effectiveness'
+
+def year_inputs(db: HistoricalDatabase, year: int) -> Optional[Dict]:
+    """單一年度的重播輸入：每個交易日前一日的市場快照、年初（前一年底）已知的批次預測參數與實際收盤
+
+    回傳 {'snapshots', 'parameters', 'realized_close', 'days'}，年度沒有可重播的交易日時回傳 None。
+    """
+    # 延遲匯入，避免與預測引擎互相匯入
+    from enhanced_prediction_engine import DEFAULT_ENGINE_PARAMETERS, DEFAULT_OPTIMAL_RATIOS
+
+    as_of = f"{year - 1}-12-31"
+    symbols = ['TXF', 'DJI', 'NDX', 'SOXX']
+    # 多取年初前幾天，讓年度第一個交易日也有前一日的市場快照
+    aligned = db.get_aligned_history(symbols, f"{year - 1}-12-01", f"{year}-12-31", ('close', 'rsi', 'histogram'))
+    if len(aligned) < 2:
+        return None
+    txf = db.get_historical_data('TXF', f"{year - 1}-12-01", f"{year}-12-31", '1d').set_index('date')
+
+    snapshots = pd.DataFrame(index=aligned.index)
+    for symbol, market in (('DJI', 'DJI'), ('NDX', 'NDX'), ('SOXX', 'SOXX'), ('TXF', 'TXF1')):
+        for column in ('close', 'rsi', 'histogram'):
+            snapshots[f"{market}_{column}"] = aligned[column][symbol]
+    snapshots['TXF1_volume'] = pd.to_numeric(txf['volume'].reindex(aligned.index), errors='coerce')
+
+    # 第 t 列的快照預測第 t+1 個交易日的台指收盤
+    realized_close = aligned['close']['TXF'].shift(-1)
+    target_dates = aligned.index.to_series().shift(-1)
+    keep = (target_dates.dt.year == year).to_numpy()
+    snapshots = snapshots[keep]
+    if snapshots.empty:
+        return None
+    days = _day_numbers(target_dates[keep])
+
+    ratios = RollingCorrelationEngine(db).get_asof(as_of, window=252, refresh=False) or {}
+    optimal_ratios = {key: ratios.get(key) if ratios.get(key) is not None else default
+                      for key, default in DEFAULT_OPTIMAL_RATIOS.items()}
+    stats = {symbol: db.get_rolling_stats(symbol, as_of) for symbol in symbols}
+    volatility = {
+        symbol: stats[symbol]['volatility'] if stats[symbol] and not np.isnan(stats[symbol]['volatility']) else 0.02
+        for symbol in symbols
+    }
+    txf_stats = stats['TXF']
+    parameters = {
+        'optimal_ratios': optimal_ratios,
+        'dji_volatility_factor': min(volatility['DJI'] / 0.02, 2.0),
+        'us_volatility_multiplier': min(np.mean([volatility[symbol] for symbol in ('DJI', 'NDX', 'SOXX')]) / 0.02, 2.0),
+        # 各目標交易日的季節性調整，效應只以年初以前的歷史計算
+        'seasonal_adjustment': adjustment_points(SeasonalEffectsEngine(db).effects_asof(as_of), days,
+                                                 db.get_trading_calendar('TXF')),
+        # 以未縮放的影響點數評估方向
+        'us_effectiveness': 1.0,
+        'txf_effectiveness': 1.0,
+        'volume_stats': {'mean': txf_stats['volume_mean'], 'std': txf_stats['volume_std'], 'median': txf_stats['volume_median']}
+        if txf_stats else {'mean': 60000, 'std': 15000, 'median': 60000},
+        'rsi_extremes': {'upper_80pct': txf_stats['rsi_q80'], 'lower_20pct': txf_stats['rsi_q20'], 'median': txf_stats['rsi_median']}
+        if txf_stats else {'upper_80pct': 75, 'lower_20pct': 25, 'median': 50},
+        'macd_stats': {'mean': txf_stats['macd_mean'], 'std': txf_stats['macd_std']}
+        if txf_stats else {'mean': 0, 'std': 20},
+        'rsi_index': None,
+        **DEFAULT_ENGINE_PARAMETERS
+    }
+    return {
+        'snapshots': snapshots,
+        'parameters': parameters,
+        'realized_close': realized_close[keep].to_numpy(),
+        'days': days
+    }
+
+def _direction_hits(predicted_move: np.ndarray, realized_move: np.ndarray) -> np.ndarray:
+    """逐日方向命中（1.0/0.0）；預測缺值或為 0、實際漲跌缺值時視為無訊號（NaN），不計入有效訊號數"""
+    direction = np.sign(predicted_move)
+    no_signal = np.isnan(predicted_move) | (direction == 0) | np.isnan(realized_move)
+    return np.where(no_signal, np.nan, (direction == np.sign(realized_move)).astype(float))
+
+def _evaluate_year(db_path: str, year: int) -> pd.DataFrame:
+    """重播單一年度：以年初已知的參數逐日預測下一個台指交易日，回傳每日各元件的訊號與實際漲跌"""
+    from enhanced_prediction_engine import predict_snapshots
+
+    inputs = year_inputs(HistoricalDatabase(db_path), year)
+    if inputs is None:
+        return pd.DataFrame()
+    snapshots = inputs['snapshots']
+    predictions = predict_snapshots(snapshots, inputs['parameters'])
+
+    current = snapshots['TXF1_close'].to_numpy()
+    realized_move = inputs['realized_close'] - current
+    days = inputs['days']
+
+    frames = []
+    for component, (column, is_level) in COMPONENTS.items():
+        output = predictions[column].to_numpy(dtype=float)
+        predicted_move = output - current if is_level else output
+        frames.append(pd.DataFrame({
+            'day': days,
+            'component': component,
+            'predicted_move': predicted_move,
+            'realized_move': realized_move,
+            'hit': _direction_hits(predicted_move, realized_move),
+            'abs_error': np.abs(predicted_move - realized_move)
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+class WalkForwardEvaluator:
+    """逐年重播各預測元件，量測滾動視窗的方向命中率與誤差，持久化供 as-of 查詢
+
+    每個年度只使用年初以前已知的參數（滾動相關性、滾動統計、季節性效應），年度間以程序池平行計算；
+    processes=1 時在目前程序逐年計算（日線規模下子程序啟動成本高於單年計算量）。
+    """
+
+    def __init__(self, db: HistoricalDatabase, windows: Tuple[int, ...] = EFFECTIVENESS_WINDOWS,
+                 processes: Optional[int] = None):
+        self.db = db
+        self.windows = tuple(windows)
+        self.processes = processes or min(os.cpu_count() or 1, 8)
+
+    def _years(self) -> List[int]:
+        with self.db._connections.read('walk_forward_years') as conn:
+            row = conn.execute(
+                "SELECT min_key, max_key FROM history_metadata WHERE table_name = 'txf_history'"
+            ).fetchone()
+        if row is None or row[0] is None:
+            return []
+        return list(range(int(_day_to_string(row[0])[:4]), int(_day_to_string(row[1])[:4]) + 1))
+
+    def replay(self) -> pd.DataFrame:
+        """平行重播所有年度，回傳每日各元件的訊號、實際漲跌、命中與誤差"""
+        years = self._years()
+        if not years:
+            return pd.DataFrame()
+        # 相關性在主程序先更新，各年度只讀取
+        RollingCorrelationEngine(self.db).rebuild()
+
+        db_path = str(self.db.db_path)
+        if self.processes > 1 and len(years) > 1:
+            try:
+                # 以 spawn 啟動，避免子程序繼承父程序的 SQLite 連線
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=min(self.processes, len(years)), mp_context=context) as executor:
+                    results = list(executor.map(_evaluate_year, [db_path] * len(years), years))
+            except (OSError, NotImplementedError, BrokenExecutor) as e:
+                print(f"⚠️ 無法啟動程序池，改為逐年計算: {e}")
+                results = [_evaluate_year(db_path, year) for year in years]
+        else:
+            results = [_evaluate_year(db_path, year) for year in years]
+
+        results = [result for result in results if not result.empty]
+        if not results:
+            return pd.DataFrame()
+        return pd.concat(results, ignore_index=True).sort_values(['component', 'day'], kind='stable')
+
+    def compute(self) -> pd.DataFrame:
+        """各元件每日結束時的滾動命中率、平均絕對誤差與有效訊號數（長格式）"""
+        evaluations = self.replay()
+        if evaluations.empty:
+            return pd.DataFrame(columns=['component', 'window_size', 'day', 'samples', 'hit_rate', 'mean_abs_error'])
+
+        frames = []
+        for component, group in evaluations.groupby('component', sort=False):
+            signals = group['hit'].notna().astype(float)
+            for window in self.windows:
+                samples = signals.rolling(window, min_periods=1).sum()
+                hit_rate = group['hit'].rolling(window, min_periods=1).mean().where(samples >= MIN_SIGNALS)
+                mean_abs_error = group['abs_error'].rolling(window, min_periods=1).mean()
+                frames.append(pd.DataFrame({
+                    'component': component,
+                    'window_size': window,
+                    'day': group['day'].to_numpy(),
+                    'samples': samples.astype(int).to_numpy(),
+                    'hit_rate': hit_rate.to_numpy(),
+                    'mean_abs_error': mean_abs_error.to_numpy()
+                }))
+        return pd.concat(frames, ignore_index=True)
+
+    def rebuild(self, force: bool = False) -> Dict:
+        """數據版本改變（或 force）時重新重播並寫入 component_effectiveness"""
+        data_version = self.db.get_data_version()
+        if not force and self.db.get_derived_version(DERIVED_NAME) == data_version:
+            return {'rebuilt': False, 'data_version': data_version}
+
+        started = time.perf_counter()
+        result = self.compute()
+        rows = zip(
+            result['component'].tolist(),
+            result['window_size'].astype(int).tolist(),
+            result['day'].astype(int).tolist(),
+            result['samples'].astype(int).tolist(),
+            [None if pd.isna(v) else float(v) for v in result['hit_rate']],
+            [None if pd.isna(v) else float(v) for v in result['mean_abs_error']]
+        )
+        with self.db._connections.write('component_effectiveness') as conn:
+            conn.execute("DELETE FROM component_effectiveness")
+            conn.executemany('''
+                INSERT INTO component_effectiveness (component, window_size, day, samples, hit_rate, mean_abs_error)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self.db._set_derived_version(conn, DERIVED_NAME, data_version)
+
+        elapsed = time.perf_counter() - started
+        print(f"🔁 Walk-forward 回測已更新：{len(result):,} 筆（{elapsed:.2f} 秒）")
+        return {'rebuilt': True, 'data_version': data_version, 'rows': len(result), 'seconds': round(elapsed, 3)}
+
+    def get_asof(self, component: str, as_of_date: Optional[str] = None, window: int = 252,
+                 refresh: bool = True) -> Optional[Dict]:
+        """查詢指定日期（含）以前最近一次評估的命中率與誤差（依表格的來源數據版本與日期快取）
+
+        refresh=False 時不重新回測，直接讀取上次建好的結果。
+        """
+        as_of_date = as_of_date or datetime.now().strftime('%Y-%m-%d')
+        if refresh:
+            self.rebuild()
+        cache_key = (self.db._cache_namespace, DERIVED_NAME, self.db.get_derived_version(DERIVED_NAME),
+                     component, window, as_of_date)
+        cached = self.db._result_cache.get(cache_key)
+        if cached is not None:
+            return cached or None
+
+        with self.db._connections.read('component_effectiveness_asof') as conn:
+            row = conn.execute('''
+                SELECT day, samples, hit_rate, mean_abs_error FROM component_effectiveness
+                WHERE component = ? AND window_size = ? AND day <= ?
+                ORDER BY day DESC LIMIT 1
+            ''', (component, window, _day_bound(as_of_date))).fetchone()
+
+        result = {}
+        if row is not None:
+            day, samples, hit_rate, mean_abs_error = row
+            result = {
+                'date': _day_to_string(day),
+                'component': component,
+                'window': window,
+                'samples': samples,
+                'hit_rate': hit_rate,
+                'mean_abs_error': mean_abs_error
+            }
+        self.db._result_cache.put(cache_key, result)
+        return result or None
+
+if __name__ == "__main__":
+    evaluator = WalkForwardEvaluator(HistoricalDatabase())
+    evaluator.rebuild(force=True)
+    for name in COMPONENTS:
+        print(name, evaluator.get_asof(name, refresh=False))
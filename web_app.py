@@ -9,6 +9,10 @@ import time
 from datetime import datetime, timedelta
 import requests
 from typing import Dict, List
+from analysis_results import PredictionSummary
+
+# 交易方向的顯示圖示
+DIRECTION_COLORS = {"做多": "🟢", "偏多": "🟢", "觀望": "⚪", "偏空": "🔴", "做空": "🔴"}
 
 # 導入我們的分析模組
 try:
@@ -76,6 +80,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_historical_database() -> "HistoricalDatabase":
+    """整個網站程序共用一個歷史資料庫物件（每次重新執行不再重做結構檢查與建立連線管理器）"""
+    return HistoricalDatabase()
+
 class MarketDataFetcher:
     """市場數據獲取器（模擬實時數據）"""
     
@@ -141,6 +150,16 @@ class MarketDataFetcher:
             }
         }
         
+        # 以資料庫保存的指標狀態延續計算即時技術指標（失敗時保留模擬數值）
+        if MODULES_AVAILABLE:
+            try:
+                db = get_historical_database()
+                for key, symbol in (("TXF1", "TXF"), ("DJI", "DJI"), ("NDX", "NDX"), ("SOXX", "SOXX")):
+                    if db.load_indicator_state(symbol).bars:
+                        market_data[key].update(db.compute_live_indicators(symbol, market_data[key]["close"]))
+            except Exception as e:
+                print(f"⚠️ 即時技術指標計算失敗，使用模擬數值: {e}")
+        
         self.cached_data = market_data
         self.last_update = now
         return market_data
@@ -296,39 +315,16 @@ class WebInterface:
         
         with st.spinner("🧠 AI分析中..."):
             try:
-                # 執行策略分析
-                analysis_result = self.strategy_executor.execute_ultimate_analysis(market_data)
-                
-                # 解析分析結果（簡化版）
-                prediction_data = self.parse_analysis_result(analysis_result, market_data)
+                # 執行策略分析（結構化結果，直接顯示引擎的預測）
+                analysis = self.strategy_executor.analyze(market_data)
                 
                 # 顯示預測結果
-                self.display_prediction_results(prediction_data, market_data)
+                self.display_prediction_results(analysis.summary(), analysis.risk_warnings)
                 
             except Exception as e:
                 st.error(f"❌ 分析執行失敗: {e}")
     
-    def parse_analysis_result(self, analysis_text: str, market_data: Dict) -> Dict:
-        """解析分析結果（簡化版）"""
-        current_price = market_data['TXF1']['close']
-        
-        # 模擬預測結果（實際版本會解析真實分析結果）
-        predicted_price = current_price + np.random.normal(0, 100)
-        confidence = np.random.uniform(0.6, 0.95)
-        
-        direction = "做多" if predicted_price > current_price else "做空"
-        price_diff = predicted_price - current_price
-        
-        return {
-            "current_price": current_price,
-            "predicted_price": predicted_price,
-            "price_difference": price_diff,
-            "direction": direction,
-            "confidence": confidence,
-            "risk_level": "高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低"
-        }
-    
-    def display_prediction_results(self, prediction: Dict, market_data: Dict):
+    def display_prediction_results(self, prediction: PredictionSummary, risk_warnings: List[str]):
         """顯示預測結果"""
         # 主要預測結果
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -337,19 +333,20 @@ class WebInterface:
             st.markdown(f"""
             <div class="prediction-box">
                 <h3>🎯 AI預測結果</h3>
-                <h2>{prediction['predicted_price']:,.0f} 點</h2>
-                <p>預期變動: {prediction['price_difference']:+.0f} 點</p>
-                <p>信心度: {prediction['confidence']:.1%}</p>
+                <h2>{prediction.predicted_price:,.0f} 點</h2>
+                <p>預測區間: {prediction.prediction_lower:,.0f} - {prediction.prediction_upper:,.0f} 點</p>
+                <p>預期變動: {prediction.price_difference:+.0f} 點</p>
+                <p>信心度: {prediction.confidence:.1%}</p>
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
             # 方向指示
-            direction_color = "🟢" if prediction['direction'] == "做多" else "🔴"
+            direction_color = DIRECTION_COLORS.get(prediction.direction, "⚪")
             st.markdown(f"""
             <div class="metric-card">
                 <h4>📈 交易方向</h4>
-                <h2>{direction_color} {prediction['direction']}</h2>
+                <h2>{direction_color} {prediction.direction}</h2>
             </div>
             """, unsafe_allow_html=True)
         
@@ -359,23 +356,23 @@ class WebInterface:
             st.markdown(f"""
             <div class="metric-card">
                 <h4>⚠️ 風險等級</h4>
-                <h2>{risk_color.get(prediction['risk_level'], '🟡')} {prediction['risk_level']}</h2>
+                <h2>{risk_color.get(prediction.risk_level, '🟡')} {prediction.risk_level}</h2>
             </div>
             """, unsafe_allow_html=True)
         
         # 價格走勢圖
-        self.render_price_chart(prediction, market_data)
+        self.render_price_chart(prediction)
         
         # 風險警告
-        self.render_risk_warnings(prediction, market_data)
+        self.render_risk_warnings(risk_warnings)
     
-    def render_price_chart(self, prediction: Dict, market_data: Dict):
+    def render_price_chart(self, prediction: PredictionSummary):
         """渲染價格走勢圖"""
         st.markdown("### 📊 價格預測視覺化")
         
         # 模擬歷史價格數據
         dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
-        current_price = prediction['current_price']
+        current_price = prediction.current_price
         
         # 生成模擬歷史價格
         historical_prices = []
@@ -387,7 +384,7 @@ class WebInterface:
         
         # 預測價格
         future_dates = pd.date_range(start=datetime.now() + timedelta(days=1), periods=5, freq='D')
-        predicted_prices = [prediction['predicted_price']] * 5
+        predicted_prices = [prediction.predicted_price] * 5
         
         # 創建圖表
         fig = go.Figure()
@@ -429,30 +426,10 @@ class WebInterface:
         
         st.plotly_chart(fig, use_container_width=True)
     
-    def render_risk_warnings(self, prediction: Dict, market_data: Dict):
-        """渲染風險警告"""
+    def render_risk_warnings(self, warnings: List[str]):
+        """渲染風險警告（策略分析產生的風險評估）"""
         st.markdown("### ⚠️ 風險評估與建議")
         
-        warnings = []
-        
-        # RSI風險檢查
-        rsi = market_data['TXF1']['rsi']
-        if rsi > 80:
-            warnings.append("🔴 RSI極度超買，注意回調風險")
-        elif rsi < 20:
-            warnings.append("🟢 RSI極度超賣，可能反彈機會")
-        
-        # 價差風險檢查
-        if abs(prediction['price_difference']) > 200:
-            warnings.append("🔴 預測價差過大，注意跳空風險")
-        
-        # 信心度檢查
-        if prediction['confidence'] < 0.7:
-            warnings.append("🟡 預測信心度偏低，建議謹慎操作")
-        
-        if not warnings:
-            warnings.append("🟢 當前風險在可控範圍內")
-        
         for warning in warnings:
             st.markdown(f"""
             <div class="risk-warning">
@@ -469,7 +446,7 @@ class WebInterface:
             return
         
         try:
-            db = HistoricalDatabase()
+            db = get_historical_database()
             stats = db.get_database_stats()
             
             col1, col2 = st.columns(2)
@@ -490,6 +467,7 @@ class WebInterface:
                 st.metric("道瓊-台指相關性", f"{correlation['dji_txf_correlation']:.3f}")
                 st.metric("納指-台指相關性", f"{correlation['ndx_txf_correlation']:.3f}")
                 st.metric("半導體-台指相關性", f"{correlation['soxx_txf_correlation']:.3f}")
+                st.caption(f"共同交易日對齊資料點：{correlation['data_points']:,} 筆")
         
         except Exception as e:
             st.error(f"歷史數據載入失敗: {e}")
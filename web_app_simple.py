@@ -5,7 +5,11 @@ import plotly.graph_objects as go
 import plotly.express as px
 import json
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, List, Optional
+from analysis_results import PredictionSummary
+
+# 交易方向的顯示圖示
+DIRECTION_COLORS = {"做多": "🟢", "偏多": "🟢", "觀望": "⚪", "偏空": "🔴", "做空": "🔴"}
 
 # 導入我們的分析模組
 try:
@@ -255,21 +259,24 @@ def render_prediction_analysis(market_data: Dict, analysis_mode: str):
         st.warning("⚠️ 分析模組未完全載入，使用模擬預測")
         # 使用模擬預測
         prediction_data = generate_mock_prediction(market_data)
+        risk_warnings = None
     else:
         with st.spinner("🧠 AI分析中..."):
             try:
-                # 執行真實策略分析
+                # 執行真實策略分析（結構化結果，直接顯示引擎的預測）
                 executor = UltimateStrategyExecutor()
-                analysis_result = executor.execute_ultimate_analysis(market_data)
-                prediction_data = parse_real_analysis(analysis_result, market_data)
+                analysis = executor.analyze(market_data)
+                prediction_data = analysis.summary()
+                risk_warnings = analysis.risk_warnings
             except Exception as e:
                 st.error(f"❌ 分析執行失敗: {e}")
                 prediction_data = generate_mock_prediction(market_data)
+                risk_warnings = None
     
     # 顯示預測結果
-    display_prediction_results(prediction_data, market_data)
+    display_prediction_results(prediction_data, market_data, risk_warnings)
 
-def generate_mock_prediction(market_data: Dict) -> Dict:
+def generate_mock_prediction(market_data: Dict) -> PredictionSummary:
     """生成模擬預測結果"""
     current_price = market_data['TXF1']['close']
     predicted_price = current_price + np.random.normal(0, 80)
@@ -278,40 +285,19 @@ def generate_mock_prediction(market_data: Dict) -> Dict:
     direction = "做多" if predicted_price > current_price else "做空"
     price_diff = predicted_price - current_price
     
-    return {
-        "current_price": current_price,
-        "predicted_price": predicted_price,
-        "price_difference": price_diff,
-        "direction": direction,
-        "confidence": confidence,
-        "risk_level": "高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低"
-    }
-
-def parse_real_analysis(analysis_text: str, market_data: Dict) -> Dict:
-    """解析真實分析結果"""
-    # 簡化版解析（實際部署時可以更詳細）
-    current_price = market_data['TXF1']['close']
-    
-    # 嘗試從分析文本中提取關鍵信息
-    if "最終預測點位" in analysis_text:
-        # 簡單的文本解析
-        predicted_price = current_price + np.random.normal(0, 80)  # 暫時用隨機數
-    else:
-        predicted_price = current_price + np.random.normal(0, 80)
-    
-    direction = "做多" if predicted_price > current_price else "做空"
-    price_diff = predicted_price - current_price
-    
-    return {
-        "current_price": current_price,
-        "predicted_price": predicted_price,
-        "price_difference": price_diff,
-        "direction": direction,
-        "confidence": 0.85,
-        "risk_level": "高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低"
-    }
+    return PredictionSummary(
+        current_price=current_price,
+        predicted_price=predicted_price,
+        prediction_lower=predicted_price - 100,
+        prediction_upper=predicted_price + 100,
+        price_difference=price_diff,
+        direction=direction,
+        confidence=confidence,
+        risk_level="高" if abs(price_diff) > 100 else "中" if abs(price_diff) > 50 else "低"
+    )
 
-def display_prediction_results(prediction: Dict, market_data: Dict):
+def display_prediction_results(prediction: PredictionSummary, market_data: Dict,
+                               risk_warnings: Optional[List[str]] = None):
     """顯示預測結果"""
     # 主要預測結果
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -320,19 +306,20 @@ def display_prediction_results(prediction: Dict, market_data: Dict):
         st.markdown(f"""
         <div class="prediction-box">
             <h3>🎯 AI預測結果</h3>
-            <h2>{prediction['predicted_price']:,.0f} 點</h2>
-            <p>預期變動: {prediction['price_difference']:+.0f} 點</p>
-            <p>信心度: {prediction['confidence']:.1%}</p>
+            <h2>{prediction.predicted_price:,.0f} 點</h2>
+            <p>預測區間: {prediction.prediction_lower:,.0f} - {prediction.prediction_upper:,.0f} 點</p>
+            <p>預期變動: {prediction.price_difference:+.0f} 點</p>
+            <p>信心度: {prediction.confidence:.1%}</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
         # 方向指示
-        direction_color = "🟢" if prediction['direction'] == "做多" else "🔴"
+        direction_color = DIRECTION_COLORS.get(prediction.direction, "⚪")
         st.markdown(f"""
         <div class="metric-card">
             <h4>📈 交易方向</h4>
-            <h2>{direction_color} {prediction['direction']}</h2>
+            <h2>{direction_color} {prediction.direction}</h2>
         </div>
         """, unsafe_allow_html=True)
     
@@ -342,7 +329,7 @@ def display_prediction_results(prediction: Dict, market_data: Dict):
         st.markdown(f"""
         <div class="metric-card">
             <h4>⚠️ 風險等級</h4>
-            <h2>{risk_color.get(prediction['risk_level'], '🟡')} {prediction['risk_level']}</h2>
+            <h2>{risk_color.get(prediction.risk_level, '🟡')} {prediction.risk_level}</h2>
         </div>
         """, unsafe_allow_html=True)
     
@@ -350,15 +337,15 @@ def display_prediction_results(prediction: Dict, market_data: Dict):
     render_price_chart(prediction, market_data)
     
     # 風險警告
-    render_risk_warnings(prediction, market_data)
+    render_risk_warnings(prediction, market_data, risk_warnings)
 
-def render_price_chart(prediction: Dict, market_data: Dict):
+def render_price_chart(prediction: PredictionSummary, market_data: Dict):
     """渲染價格走勢圖"""
     st.markdown("### 📊 價格預測視覺化")
     
     # 模擬歷史價格數據
     dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
-    current_price = prediction['current_price']
+    current_price = prediction.current_price
     
     # 生成模擬歷史價格
     historical_prices = []
@@ -370,7 +357,7 @@ def render_price_chart(prediction: Dict, market_data: Dict):
     
     # 預測價格
     future_dates = pd.date_range(start=datetime.now() + timedelta(days=1), periods=5, freq='D')
-    predicted_prices = [prediction['predicted_price']] * 5
+    predicted_prices = [prediction.predicted_price] * 5
     
     # 創建圖表
     fig = go.Figure()
@@ -412,29 +399,30 @@ def render_price_chart(prediction: Dict, market_data: Dict):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def render_risk_warnings(prediction: Dict, market_data: Dict):
-    """渲染風險警告"""
+def render_risk_warnings(prediction: PredictionSummary, market_data: Dict, warnings: Optional[List[str]] = None):
+    """渲染風險警告（有策略分析結果時直接顯示其風險評估，模擬預測時以簡易規則檢查）"""
     st.markdown("### ⚠️ 風險評估與建議")
     
-    warnings = []
-    
-    # RSI風險檢查
-    rsi = market_data['TXF1']['rsi']
-    if rsi > 80:
-        warnings.append("🔴 RSI極度超買，注意回調風險")
-    elif rsi < 20:
-        warnings.append("🟢 RSI極度超賣，可能反彈機會")
-    
-    # 價差風險檢查
-    if abs(prediction['price_difference']) > 200:
-        warnings.append("🔴 預測價差過大，注意跳空風險")
-    
-    # 信心度檢查
-    if prediction['confidence'] < 0.7:
-        warnings.append("🟡 預測信心度偏低，建議謹慎操作")
-    
     if not warnings:
-        warnings.append("🟢 當前風險在可控範圍內")
+        warnings = []
+        
+        # RSI風險檢查
+        rsi = market_data['TXF1']['rsi']
+        if rsi > 80:
+            warnings.append("🔴 RSI極度超買，注意回調風險")
+        elif rsi < 20:
+            warnings.append("🟢 RSI極度超賣，可能反彈機會")
+        
+        # 價差風險檢查
+        if abs(prediction.price_difference) > 200:
+            warnings.append("🔴 預測價差過大，注意跳空風險")
+        
+        # 信心度檢查
+        if prediction.confidence < 0.7:
+            warnings.append("🟡 預測信心度偏低，建議謹慎操作")
+        
+        if not warnings:
+            warnings.append("🟢 當前風險在可控範圍內")
     
     for warning in warnings:
         st.markdown(f"""
@@ -493,6 +481,7 @@ def render_historical_analysis():
             st.metric("道瓊-台指相關性", f"{correlation['dji_txf_correlation']:.3f}")
             st.metric("納指-台指相關性", f"{correlation['ndx_txf_correlation']:.3f}")
             st.metric("半導體-台指相關性", f"{correlation['soxx_txf_correlation']:.3f}")
+            st.caption(f"共同交易日對齊資料點：{correlation['data_points']:,} 筆")
     
     except Exception as e:
         st.error(f"歷史數據載入失敗: {e}")